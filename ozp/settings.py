@@ -71,6 +71,7 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'ozpcenter.middleware.RequestCacheMiddleware',
 )
 
 ROOT_URLCONF = 'ozp.urls'
@@ -265,6 +266,11 @@ DEFAULT_AGENCY = ''
 # Number of seconds to cache data
 GLOBAL_SECONDS_TO_CACHE_DATA = 60 * 60 * 24  # 24 Hours
 
+# In-process cache in front of the cache for hot lookups (ozpcenter.local_cache)
+LOCAL_CACHE_MAX_SIZE = 10000  # Max number of entries for each local cache
+LOCAL_CACHE_SECONDS = 60  # Number of seconds to keep an entry
+LOCAL_CACHE_VERSION_CHECK_SECONDS = 2  # Max number of seconds for an invalidation to reach other processes
+
 # Boolean to enable/disable the use Elasticsearch use
 ES_ENABLED = bool(os.getenv('ES_ENABLED', False))  # This needs to be false for unit test to pass
 ES_INDEX_NAME = 'appsmall'
@@ -273,6 +279,13 @@ ES_ID_FIELD = 'id'
 ES_RECOMMEND_USER = 'es_recommend_user'
 ES_RECOMMEND_CONTENT = 'es_recommend_content'
 ES_RECOMMEND_TYPE = 'recommend'
+ES_RECOMMEND_MSEARCH_BATCH_SIZE = int(os.getenv('ES_RECOMMEND_MSEARCH_BATCH_SIZE', 100))  # Profiles per _msearch request
+ES_RECOMMEND_MSEARCH_THREADS = int(os.getenv('ES_RECOMMEND_MSEARCH_THREADS', 4))  # Concurrent _msearch requests
+ES_SEARCH_CACHE_SECONDS = int(os.getenv('ES_SEARCH_CACHE_SECONDS', 30))  # Seconds search/suggest results are cached
+ES_REINDEX_CHUNK_SIZE = int(os.getenv('ES_REINDEX_CHUNK_SIZE', 500))  # Listings serialized and sent per _bulk request by bulk_reindex
+ES_REINDEX_MAX_CHUNK_BYTES = int(os.getenv('ES_REINDEX_MAX_CHUNK_BYTES', 10 * 1024 * 1024))  # Max size of a bulk_reindex _bulk request
+ES_INDEX_OUTBOX_BATCH_SIZE = int(os.getenv('ES_INDEX_OUTBOX_BATCH_SIZE', 500))  # Listing index operations per _bulk request
+ES_INDEX_OUTBOX_SECONDS = float(os.getenv('ES_INDEX_OUTBOX_SECONDS', 1))  # Seconds between listing index worker runs (index refresh interval)
 
 ES_NUMBER_OF_SHARDS = 1
 ES_NUMBER_OF_REPLICAS = 0
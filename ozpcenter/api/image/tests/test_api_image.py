@@ -6,6 +6,7 @@ from rest_framework import status
 from rest_framework.test import APITestCase
 
 from ozpcenter import model_access as generic_model_access
+from ozpcenter import models
 from ozpcenter.scripts import sample_data_generator as data_gen
 
 
@@ -41,3 +42,10 @@ class ImageApiTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue('id' in response.data)
         self.assertTrue('security_marking' in response.data)
+
+    def test_images_for_user(self):
+        user_context = models.get_user_context('wsmith')
+        image_ids = sorted(models.Image.objects.for_user('wsmith').values_list('id', flat=True))
+
+        self.assertTrue(image_ids)
+        self.assertEqual(sorted(models.Image.objects.for_user(user_context).values_list('id', flat=True)), image_ids)
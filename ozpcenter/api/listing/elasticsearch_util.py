@@ -153,6 +153,12 @@ def get_mapping_setting_obj(number_of_shards=None, number_of_replicas=None):
             "keyword_lowercase_analyzer": {
               "tokenizer": "keyword",
               "filter": ["lowercase"]
+            },
+            # Type-ahead queries are not n-grammed, they match the prefixes indexed with autocomplete
+            "autocomplete_search": {
+              "type": "custom",
+              "tokenizer": "standard",
+              "filter": ["lowercase"]
             }
           }
         }
@@ -182,6 +188,17 @@ def get_mapping_setting_obj(number_of_shards=None, number_of_replicas=None):
                     }
                 }
             },
+            # title_suggest, tags_suggest are used for type-ahead suggestions (edge n-grams of title and tag names)
+            "title_suggest": {
+              "type": "string",
+              "analyzer": "autocomplete",
+              "search_analyzer": "autocomplete_search"
+            },
+            "tags_suggest": {
+              "type": "string",
+              "analyzer": "autocomplete",
+              "search_analyzer": "autocomplete_search"
+            },
             # description is used for searching
             "description": {
               "type": "string",
@@ -378,79 +395,6 @@ def get_mapping_setting_obj(number_of_shards=None, number_of_replicas=None):
     return data
 
 
-def update_es_listing(current_listing_id, record, is_new):
-    """
-    Update Listing Record in Elasticsearch
-
-    Args:
-        current_listing_id: Lisitng Id
-        record(dict): serialized listing
-        is_new: backend is new
-    """
-    # Create ES client
-    es_client = elasticsearch_factory.get_client()
-
-    if settings.ES_ENABLED is False:
-        logger.warn('Elasticsearch Service Not Enabled')
-    elif not es_client.ping():
-        logger.warn('Elasticsearch Service Unavailable')
-        # raise errors.ElasticsearchServiceUnavailable()
-    else:
-        # If the index does not exist in Elasticsearch, create index so that adding records work
-        if not es_client.indices.exists(settings.ES_INDEX_NAME):
-            request_body = get_mapping_setting_obj()
-
-            logger.info('Creating [{}] index...'.format(settings.ES_INDEX_NAME))
-            res = es_client.indices.create(index=settings.ES_INDEX_NAME, body=request_body)
-            logger.info('Create Index Acknowledged: {}'.format(res.get('acknowledged', False)))
-
-            es_client.cluster.health(wait_for_status='yellow', request_timeout=20)
-
-        es_record_exist = es_client.exists(
-            index=settings.ES_INDEX_NAME,
-            doc_type=settings.ES_TYPE_NAME,
-            id=current_listing_id,
-            refresh=True
-        )
-
-        record_clean_obj = prepare_clean_listing_record(record)
-        if is_new is not None:
-            if es_record_exist:
-                es_client.update(
-                    index=settings.ES_INDEX_NAME,
-                    doc_type=settings.ES_TYPE_NAME,
-                    id=current_listing_id,
-                    refresh=True,
-                    body={"doc": record_clean_obj}
-                )
-            else:
-                es_client.create(
-                    index=settings.ES_INDEX_NAME,
-                    doc_type=settings.ES_TYPE_NAME,
-                    id=current_listing_id,
-                    refresh=True,
-                    body=record_clean_obj
-                )
-        else:
-            if es_record_exist:
-                es_client.update(
-                    index=settings.ES_INDEX_NAME,
-                    doc_type=settings.ES_TYPE_NAME,
-                    id=current_listing_id,
-                    refresh=True,
-                    body={"doc": record_clean_obj}
-                )
-            else:
-                # Ensure if doc exist in es, then update
-                es_client.create(
-                    index=settings.ES_INDEX_NAME,
-                    doc_type=settings.ES_TYPE_NAME,
-                    id=current_listing_id,
-                    refresh=True,
-                    body=record_clean_obj
-                )
-
-
 def encode_special_characters(user_string):
     """
     Encode Special Characters for user's search Strings
@@ -478,43 +422,23 @@ def encode_special_characters(user_string):
     return "".join(output_list)
 
 
-def make_search_query_obj(search_param_parser, exclude_agencies=None):
+def make_search_filter_obj(search_param_parser, exclude_agencies=None, security_markings=None):
     """
-    Function is used to make elasticsearch query for searching
+    Function is used to make the elasticsearch filters shared by the search and suggest queries
 
     Args:
-        search_param_parser(SearchParamParser): Object with search parameters
-            search(str): Search Keyword
-            user_offset(int): Offset
-            user_limit(int): Limit
-            categories([str,str,..]): List category Strings
-            agencies([str,str,..]): List agencies Strings
-            listing_types([str,str,..]): List listing types Strings
-            minscore(float): Minscore Float
-            ordering([str,str,str]): List of fields to order
-    """
-    user_string = encode_special_characters(search_param_parser.search_string)
-
-    # Pagination
-    user_offset = search_param_parser.offset
-    user_limit = search_param_parser.limit  # Size
-    # user_limit_set = filter_params.get('limit_set', False)
+        search_param_parser(SearchParamParser): Object with search parameters (tags, categories, agencies, listing_types)
+        exclude_agencies([str,str,..]): Agency short names whose private listings are excluded
+        security_markings([str,str,..]): Security markings the user has access to (no security marking filter if None)
 
+    Returns:
+        list of filters
+    """
     # Filtering
     tags = search_param_parser.tags
     categories = search_param_parser.categories
     agencies = search_param_parser.agencies
     listing_types = search_param_parser.listing_types
-    # Ordering
-    ordering = search_param_parser.ordering
-
-    # Boost
-    boost_title = search_param_parser.boost_title
-    boost_description = search_param_parser.boost_description
-    boost_description_short = search_param_parser.boost_description_short
-    boost_tags = search_param_parser.boost_tags
-
-    min_score = search_param_parser.min_score
 
     # Exclude_agencies
     exclude_agencies = exclude_agencies or []
@@ -595,6 +519,14 @@ def make_search_query_obj(search_param_parser, exclude_agencies=None):
 
         filter_data.append(agencies_query_data)
 
+    # Security markings the user has access to, an empty list matches no listing
+    if security_markings is not None:
+        filter_data.append({
+            "terms": {
+                "security_marking": sorted(security_markings)
+            }
+        })
+
     # Listing Types to filter
     if listing_types:
         listing_types_temp = []
@@ -668,6 +600,46 @@ def make_search_query_obj(search_param_parser, exclude_agencies=None):
 
         filter_data.append(categories_data)
 
+    return filter_data
+
+
+def make_search_query_obj(search_param_parser, exclude_agencies=None, security_markings=None):
+    """
+    Function is used to make elasticsearch query for searching
+
+    Args:
+        search_param_parser(SearchParamParser): Object with search parameters
+            search(str): Search Keyword
+            user_offset(int): Offset
+            user_limit(int): Limit
+            categories([str,str,..]): List category Strings
+            agencies([str,str,..]): List agencies Strings
+            listing_types([str,str,..]): List listing types Strings
+            minscore(float): Minscore Float
+            ordering([str,str,str]): List of fields to order
+        exclude_agencies([str,str,..]): Agency short names whose private listings are excluded
+        security_markings([str,str,..]): Security markings the user has access to (no security marking filter if None)
+    """
+    user_string = encode_special_characters(search_param_parser.search_string)
+
+    # Pagination
+    user_offset = search_param_parser.offset
+    user_limit = search_param_parser.limit  # Size
+    # user_limit_set = filter_params.get('limit_set', False)
+
+    # Ordering
+    ordering = search_param_parser.ordering
+
+    # Boost
+    boost_title = search_param_parser.boost_title
+    boost_description = search_param_parser.boost_description
+    boost_description_short = search_param_parser.boost_description_short
+    boost_tags = search_param_parser.boost_tags
+
+    min_score = search_param_parser.min_score
+
+    filter_data = make_search_filter_obj(search_param_parser, exclude_agencies, security_markings)
+
     temp_should = []
 
     if user_string:
@@ -757,6 +729,45 @@ def make_search_query_obj(search_param_parser, exclude_agencies=None):
     return search_query
 
 
+def make_suggest_query_obj(search_param_parser, exclude_agencies=None, security_markings=None):
+    """
+    Function is used to make elasticsearch query for type-ahead suggestions
+
+    Only matches the title_suggest / tags_suggest edge n-gram fields (prefixes are indexed, the query is
+    not n-grammed) and only returns id and title, so it is much cheaper than the search query
+
+    Args:
+        search_param_parser(SearchParamParser): Object with search parameters
+        exclude_agencies([str,str,..]): Agency short names whose private listings are excluded
+        security_markings([str,str,..]): Security markings the user has access to (no security marking filter if None)
+    """
+    if search_param_parser.search_string:
+        suggest_match = {
+            "multi_match": {
+              "query": search_param_parser.search_string,
+              "fields": ["title_suggest^" + str(search_param_parser.boost_title), "tags_suggest^" + str(search_param_parser.boost_tags)],
+              "operator": "and"
+            }
+        }
+    else:
+        suggest_match = {"match_all": {}}
+
+    search_query = {
+      "size": search_param_parser.limit,
+      "_source": ["id", "title"],
+      "query": {
+        "bool": {
+          "must": suggest_match,
+          "filter": make_search_filter_obj(search_param_parser, exclude_agencies, security_markings)
+        }
+      }
+    }
+
+    if search_param_parser.offset:
+        search_query['from'] = search_param_parser.offset
+    return search_query
+
+
 def prepare_clean_listing_record(listing_serializer_record):
     """
     Clean Record
@@ -847,8 +858,9 @@ def prepare_clean_listing_record(listing_serializer_record):
 
     record_clean_obj = json.loads(json.dumps(listing_serializer_record))
 
-    # title_suggest = {"input": [ record_clean_obj['title'] ] }
-    # record_clean_obj['title_suggest'] =title_suggest
+    # Type-ahead fields (make_suggest_query_obj)
+    record_clean_obj['title_suggest'] = record_clean_obj['title']
+    record_clean_obj['tags_suggest'] = [tag_entry['name'] for tag_entry in record_clean_obj['tags']]
 
     # Flatten Agency Obj - Makes the search query easier
     record_clean_obj['agency_id'] = record_clean_obj['agency']['id']
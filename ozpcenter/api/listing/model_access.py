@@ -47,9 +47,21 @@ Check for the listings that has been approved more than once
    - {action: APPROVED, author: khaleesi, description: null}
 
 """
+import hashlib
 import logging
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import Count
+from django.db.models import F
+from django.db.models import IntegerField
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.sql.datastructures import EmptyResultSet
 
 from ozpcenter import models
 from ozpcenter import constants
@@ -317,43 +329,126 @@ def get_all_screenshots():
     return models.Screenshot.objects.all()
 
 
-def _update_rating(username, listing):
+# Listing rating counters maintained by _update_rating
+RATING_COUNT_FIELDS = ['total_rate1', 'total_rate2', 'total_rate3', 'total_rate4', 'total_rate5',
+                       'total_votes', 'total_reviews', 'total_review_responses']
+
+
+def get_review_rating_counts(review, include_responses=False):
     """
-    Invoked each time a review is created, deleted, or updated
+    Get the contribution of a review to the rating counters of its listing
+
+    Args:
+        review (models.Review): review
+        include_responses (bool): count the responses of the review (deleted with it)
+
+    Returns:
+        {rating counter field: count}
     """
-    reviews = models.Review.objects.filter(listing=listing, review_parent__isnull=True)
-    review_responses = models.Review.objects.filter(listing=listing, review_parent__isnull=False)
-    rate1 = reviews.filter(rate=1).count()
-    rate2 = reviews.filter(rate=2).count()
-    rate3 = reviews.filter(rate=3).count()
-    rate4 = reviews.filter(rate=4).count()
-    rate5 = reviews.filter(rate=5).count()
-    total_votes = reviews.count()
-    total_reviews = total_votes - reviews.filter(text=None).count()
-    total_review_responses = review_responses.count()
-
-    # calculate weighted average
-    if total_votes == 0:
-        avg_rate = 0
-    else:
-        avg_rate = (5 * rate5 + 4 * rate4 + 3 * rate3 + 2 * rate2 + rate1) / total_votes
-        avg_rate = float('{0:.1f}'.format(avg_rate))
-
-    # update listing
-    listing.total_rate1 = rate1
-    listing.total_rate2 = rate2
-    listing.total_rate3 = rate3
-    listing.total_rate4 = rate4
-    listing.total_rate5 = rate5
-    listing.total_votes = total_votes
-    listing.total_reviews = total_reviews
-    listing.total_review_responses = total_review_responses
-    listing.avg_rate = avg_rate
-    listing.edited_date = utils.get_now_utc()
-    listing.save()
+    if review.review_parent_id is not None:
+        return {'total_review_responses': 1}
+
+    rating_counts = {'total_votes': 1, 'total_rate{0}'.format(review.rate): 1}
+    if review.text is not None:
+        rating_counts['total_reviews'] = 1
+    if include_responses:
+        rating_counts['total_review_responses'] = models.Review.objects.filter(review_parent=review).count()
+    return rating_counts
+
+
+def calculate_avg_rate(rating_counts):
+    """
+    Weighted average (5*total_rate5 + 4*total_rate4 + ...) / total_votes, rounded to one decimal
+    """
+    total_votes = rating_counts['total_votes']
+    if not total_votes:
+        return 0
+
+    avg_rate = sum(rate * rating_counts['total_rate{0}'.format(rate)] for rate in range(1, 6)) / total_votes
+    return float('{0:.1f}'.format(avg_rate))
+
+
+def _update_rating(username, listing, old_rating_counts=None, new_rating_counts=None):
+    """
+    Invoked each time a review is created, deleted, or updated
+
+    The rating counters are changed by the difference of the review contributions (get_review_rating_counts)
+    in a single F() expression update, the listing row stays locked until the end of the transaction while
+    avg_rate is computed from the updated counters. reconcile_listing_ratings recomputes every listing.
+
+    Args:
+        username (str): username of the user making the change
+        listing (models.Listing): listing of the review
+        old_rating_counts: contribution of the review before the change (None for a new review)
+        new_rating_counts: contribution of the review after the change (None for a deleted review)
+    """
+    deltas = {}
+    for rating_field, count in (new_rating_counts or {}).items():
+        deltas[rating_field] = deltas.get(rating_field, 0) + count
+    for rating_field, count in (old_rating_counts or {}).items():
+        deltas[rating_field] = deltas.get(rating_field, 0) - count
+
+    with transaction.atomic():
+        update_values = {rating_field: F(rating_field) + delta for rating_field, delta in deltas.items() if delta}
+        if update_values:
+            models.Listing.objects.filter(pk=listing.pk).update(**update_values)
+
+        rating_counts = models.Listing.objects.filter(pk=listing.pk).values(*RATING_COUNT_FIELDS).get()
+        for rating_field, count in rating_counts.items():
+            setattr(listing, rating_field, count)
+
+        # update listing
+        listing.avg_rate = calculate_avg_rate(rating_counts)
+        listing.edited_date = utils.get_now_utc()
+        listing.save(update_fields=RATING_COUNT_FIELDS + ['avg_rate', 'edited_date'])
     return listing
 
 
+def reconcile_listing_ratings():
+    """
+    Recompute the rating counters of every listing from the reviews (single grouped query)
+    and fix the listings whose counters drifted
+
+    Returns:
+        Number of listings fixed
+    """
+    def count_when(**conditions):
+        return Sum(Case(When(then=Value(1), **conditions), default=Value(0), output_field=IntegerField()))
+
+    review_counts = models.Review.objects.order_by().values('listing_id').annotate(
+        total_rate1=count_when(review_parent__isnull=True, rate=1),
+        total_rate2=count_when(review_parent__isnull=True, rate=2),
+        total_rate3=count_when(review_parent__isnull=True, rate=3),
+        total_rate4=count_when(review_parent__isnull=True, rate=4),
+        total_rate5=count_when(review_parent__isnull=True, rate=5),
+        total_votes=count_when(review_parent__isnull=True),
+        total_reviews=count_when(review_parent__isnull=True, text__isnull=False),
+        total_review_responses=count_when(review_parent__isnull=False))
+
+    empty_rating_counts = {rating_field: 0 for rating_field in RATING_COUNT_FIELDS}
+    expected_rating_counts = {}
+    for row in review_counts:
+        expected_rating_counts[row.pop('listing_id')] = row
+
+    fixed_count = 0
+    for listing_values in models.Listing.objects.order_by().values('id', 'avg_rate', *RATING_COUNT_FIELDS):
+        listing_id = listing_values.pop('id')
+        avg_rate = listing_values.pop('avg_rate')
+        rating_counts = expected_rating_counts.get(listing_id, empty_rating_counts)
+
+        if listing_values != rating_counts or avg_rate != calculate_avg_rate(rating_counts):
+            logger.info('Listing {0} rating counters {1} do not match reviews {2}'.format(listing_id, listing_values, rating_counts))
+            # Saved like _update_rating (signals, Elasticsearch)
+            with transaction.atomic():
+                listing = models.Listing.objects.select_for_update().get(pk=listing_id)
+                for rating_field, count in rating_counts.items():
+                    setattr(listing, rating_field, count)
+                listing.avg_rate = calculate_avg_rate(rating_counts)
+                listing.save(update_fields=RATING_COUNT_FIELDS + ['avg_rate'])
+            fixed_count = fixed_count + 1
+    return fixed_count
+
+
 def get_rejection_listings(username):
     """
     Get Rejection Listings for a user
@@ -614,7 +709,7 @@ def create_listing_review(username, listing, rating, text=None, review_parent=No
     review.save()
 
     # update this listing's rating
-    _update_rating(username, listing)
+    _update_rating(username, listing, new_rating_counts=get_review_rating_counts(review))
 
     #resp = {
     #    "rate": rating,
@@ -663,12 +758,13 @@ def edit_listing_review(username, review, rate, text=None):
     listing = _add_listing_activity(user, listing, models.ListingActivity.REVIEW_EDITED,
         change_details=change_details)
 
+    old_rating_counts = get_review_rating_counts(review)
     review.rate = rate
     review.text = text
     review.edited_date = utils.get_now_utc()
     review.save()
 
-    _update_rating(username, listing)
+    _update_rating(username, listing, old_rating_counts, get_review_rating_counts(review))
 
     dispatcher.publish('listing_review_changed', listing=listing, profile=user, rating=rate, text=text)
     return review
@@ -690,7 +786,7 @@ def delete_listing_review(username, review):
     # steward or apps mall steward
     priv_roles = ['APPS_MALL_STEWARD', 'ORG_STEWARD']
 
-    if profile.highest_role() in priv_roles:
+    if models.get_user_context(profile).highest_role in priv_roles:
         pass
     elif review.author.user.username != username:
         raise errors.PermissionDenied('Cannot update another user\'s review')
@@ -713,10 +809,11 @@ def delete_listing_review(username, review):
     listing = _add_listing_activity(profile, listing,
         models.ListingActivity.REVIEW_DELETED, change_details=change_details)
 
-    # delete the review
+    # delete the review (and its responses)
+    old_rating_counts = get_review_rating_counts(review, include_responses=True)
     review.delete()
     # update this listing's rating
-    _update_rating(username, listing)
+    _update_rating(username, listing, old_rating_counts=old_rating_counts)
     return listing
 
 
@@ -736,7 +833,7 @@ def delete_listing(username, listing):
         raise errors.PermissionDenied('Current profile has does not have delete permissions')
 
     priv_roles = ['APPS_MALL_STEWARD', 'ORG_STEWARD']
-    if profile.highest_role() in priv_roles or listing.approval_status == 'IN_PROGRESS':
+    if models.get_user_context(profile).highest_role in priv_roles or listing.approval_status == 'IN_PROGRESS':
         pass
     else:
         raise errors.PermissionDenied('Only Org Stewards and admins can delete listings')
@@ -784,59 +881,44 @@ def put_counts_in_listings_endpoint(queryset):
             "APPROVED": <int>,
             "DELETED": <int>
         }
+
+    Counts are computed with one grouped query over (approval_status, is_enabled, agency) and cached per
+    queryset SQL (and listing data version)
     """
     # TODO: Take in account 2pki user (rivera-20160908)
+    if queryset.query.annotations:
+        # Aggregate annotations (ex: owners__display_name ordering) would be part of the GROUP BY
+        queryset = models.Listing.objects.filter(pk__in=queryset.order_by().values('pk'))
 
-    data = {}
+    try:
+        queryset_sql = str(queryset.query)
+    except EmptyResultSet:
+        queryset_sql = None
+
+    listing_version = utils.get_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+    cache_key = 'listing_counts-{0}-{1}'.format(listing_version, hashlib.md5(str(queryset_sql).encode('utf-8')).hexdigest())
+    data = cache.get(cache_key)
+    if data is not None:
+        return data
 
-    # Number of total listings
-    num_total = queryset.count()
-    # Number of listing that is Enabled
-    num_enabled = queryset.filter(is_enabled=True).count()
-
-    # Number of listing that is IN_PROGRESS
-    num_in_progress = queryset.filter(
-        approval_status=models.Listing.IN_PROGRESS).count()
-
-    # Number of listing that is PENDING
-    num_pending = queryset.filter(
-        approval_status=models.Listing.PENDING).count()
-
-    # Number of listing that is REJECTED
-    num_rejected = queryset.filter(
-        approval_status=models.Listing.REJECTED).count()
-
-    # Number of listing that is APPROVED_ORG
-    num_approved_org = queryset.filter(
-        approval_status=models.Listing.APPROVED_ORG).count()
-
-    # Number of listing that is APPROVED
-    num_approved = queryset.filter(
-        approval_status=models.Listing.APPROVED).count()
-
-    # Number of listing that is DELETED
-    num_deleted = queryset.filter(
-        approval_status=models.Listing.DELETED).count()
-
-    # Number of listing that is PENDING_DELETION
-    num_pending_deletion = queryset.filter(
-        approval_status=models.Listing.PENDING_DELETION).count()
-
-    data['total'] = num_total
-    data['enabled'] = num_enabled
-    data['organizations'] = {}
-    data[models.Listing.IN_PROGRESS] = num_in_progress
-    data[models.Listing.PENDING] = num_pending
-    data[models.Listing.REJECTED] = num_rejected
-    data[models.Listing.APPROVED_ORG] = num_approved_org
-    data[models.Listing.APPROVED] = num_approved
-    data[models.Listing.DELETED] = num_deleted
-    data[models.Listing.PENDING_DELETION] = num_pending_deletion
-
-    orgs = models.Agency.objects.all()
-    for i in orgs:
-        data['organizations'][str(i.id)] = queryset.filter(
-            agency__id=i.id).count()
+    data = {}
+    data['total'] = 0
+    data['enabled'] = 0
+    data['organizations'] = {str(agency_id): 0 for agency_id in models.Agency.objects.values_list('id', flat=True)}
+    for approval_status, _ in models.Listing.APPROVAL_STATUS_CHOICES:
+        data[approval_status] = 0
+
+    if queryset_sql is not None:
+        counts = queryset.order_by().values('approval_status', 'is_enabled', 'agency').annotate(count=Count('pk', distinct=True))
+        for row in counts:
+            data['total'] += row['count']
+            if row['is_enabled']:
+                data['enabled'] += row['count']
+            data[row['approval_status']] = data.get(row['approval_status'], 0) + row['count']
+            agency_key = str(row['agency'])
+            data['organizations'][agency_key] = data['organizations'].get(agency_key, 0) + row['count']
+
+    cache.set(cache_key, data, timeout=settings.GLOBAL_SECONDS_TO_CACHE_DATA)
     return data
 
 
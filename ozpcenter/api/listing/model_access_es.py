@@ -4,22 +4,32 @@ Listing Model Access For Elasticsearch
 Code was developed to work with Elasticsearch 2.4.*
 TODO: Refactor Elasticsearch Code
 """
+import datetime
+import hashlib
 import json
 import logging
+import time
 
 from django.conf import settings
+from django.core.cache import cache
+from elasticsearch import helpers
 from django.http.request import QueryDict
 from rest_framework import serializers
 
 from ozpcenter import models
 from ozpcenter import constants
-from plugins_util.plugin_manager import system_has_access_control
+from ozpcenter import utils
+from plugins_util.plugin_manager import system_allowed_security_markings
 from ozpcenter.api.listing import elasticsearch_util
 from ozpcenter.api.listing.elasticsearch_util import elasticsearch_factory
 
 # Get an instance of a logger
 logger = logging.getLogger('ozp-center.' + str(__name__))
 
+# Name of the index being built by bulk_reindex, the listing index worker also writes to it
+REINDEX_TARGET_CACHE_KEY = 'es_listing_reindex_target'
+REINDEX_TARGET_TIMEOUT = 60 * 60 * 6
+
 
 class SearchParamParser(object):
     """
@@ -96,6 +106,28 @@ class SearchParamParser(object):
         except:
             self.boost_tags = constants.ES_BOOST_TAGS
 
+    def get_normalized_params(self):
+        """
+        Search parameters normalized for caching, parsers with the same normalized parameters get the same results
+
+        Filters are matched case insensitive in Elasticsearch, they are lowercased and sorted. The search string
+        is kept as is: query_string operators (AND, OR, NOT) are case sensitive and the next/previous links
+        of the cached response contain it
+        """
+        return {
+            'base_url': self.base_url,
+            'search': self.search_string or '',
+            'offset': self.offset,
+            'limit': self.limit,
+            'tags': sorted(tag.lower() for tag in self.tags),
+            'categories': sorted(category.lower() for category in self.categories),
+            'agencies': sorted(agency.lower() for agency in self.agencies),
+            'listing_types': sorted(listing_type.lower() for listing_type in self.listing_types),
+            'ordering': self.ordering,
+            'min_score': self.min_score,
+            'boosts': [self.boost_title, self.boost_description, self.boost_description_short, self.boost_tags]
+        }
+
     def __str__(self):
         """
         Convert SearchParamParser Object into JSON String Representation
@@ -104,12 +136,61 @@ class SearchParamParser(object):
         return json.dumps(temp_dict)
 
 
+def get_new_index_name():
+    """
+    Name of a new timestamped listing index (appsmall-20170101120000000000), searches use the ES_INDEX_NAME alias
+    """
+    return '{}-{}'.format(settings.ES_INDEX_NAME, datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S%f'))
+
+
+def create_index(es_client, index_name):
+    """
+    Create a listing index with mapping
+    """
+    logger.info('Creating [{}] index...'.format(index_name))
+    res = es_client.indices.create(index=index_name, body=elasticsearch_util.get_mapping_setting_obj())
+    logger.info('Create Index Acknowledged: {}'.format(res.get('acknowledged', False)))
+    es_client.cluster.health(wait_for_status='yellow', request_timeout=20)
+
+
+def swap_index_alias(es_client, index_name):
+    """
+    Atomically point the ES_INDEX_NAME alias to index_name, then delete the indices it pointed to before
+    """
+    alias_name = settings.ES_INDEX_NAME
+    old_index_names = []
+    if es_client.indices.exists_alias(name=alias_name):
+        old_index_names = list(es_client.indices.get_alias(name=alias_name).keys())
+    elif es_client.indices.exists(alias_name):
+        # Index created before the listing index was behind an alias, it has to be deleted before adding the alias
+        logger.warn('Deleting [{}] index to replace it with an alias'.format(alias_name))
+        es_client.indices.delete(index=alias_name)
+
+    actions = [{'remove': {'index': old_index_name, 'alias': alias_name}} for old_index_name in old_index_names]
+    actions.append({'add': {'index': index_name, 'alias': alias_name}})
+    es_client.indices.update_aliases(body={'actions': actions})
+    logger.info('Alias [{}] now points to [{}]'.format(alias_name, index_name))
+    bump_index_generation()
+
+    for old_index_name in old_index_names:
+        if old_index_name != index_name:
+            logger.info('Deleting [{}] index...'.format(old_index_name))
+            es_client.indices.delete(index=old_index_name)
+
+
 def recreate_index_mapping():
     """
-    Recreate Index Mapping
+    Recreate Index Mapping (replace the listing index with an empty index)
     """
-    index_mapping = elasticsearch_util.get_mapping_setting_obj()
-    elasticsearch_factory.recreate_index_mapping(settings.ES_INDEX_NAME, index_mapping)
+    if not settings.ES_ENABLED:
+        logger.debug('Elasticsearch is not enabled')
+        return
+
+    elasticsearch_factory.check_elasticsearch()
+    es_client = elasticsearch_factory.get_client()
+    index_name = get_new_index_name()
+    create_index(es_client, index_name)
+    swap_index_alias(es_client, index_name)
 
 
 class ReadOnlyListingSerializer(serializers.ModelSerializer):
@@ -121,87 +202,305 @@ class ReadOnlyListingSerializer(serializers.ModelSerializer):
         depth = 2
 
 
+def generate_listing_records(listing_ids=None):
+    """
+    Generator of listing records for elasticsearch (ReadOnlyListingSerializer + prepare_clean_listing_record)
+
+    Listings are read, prefetched and serialized ES_REINDEX_CHUNK_SIZE at a time so memory use does not grow
+    with the number of listings
+
+    Args:
+        listing_ids: Only these listings (all listings if None)
+    """
+    queryset = models.Listing.objects.order_by('id').select_related(
+        'agency', 'listing_type', 'small_icon', 'large_icon', 'banner_icon', 'large_banner_icon',
+        'required_listings', 'last_activity', 'current_rejection'
+    ).prefetch_related(
+        'contacts', 'contacts__contact_type', 'owners', 'owners__user', 'owners__organizations',
+        'owners__stewarded_organizations', 'categories', 'tags', 'intents'
+    )
+    if listing_ids is not None:
+        queryset = queryset.filter(id__in=listing_ids)
+
+    last_id = 0
+    while True:
+        listings = list(queryset.filter(id__gt=last_id)[:settings.ES_REINDEX_CHUNK_SIZE])
+        if not listings:
+            return
+
+        for record in ReadOnlyListingSerializer(listings, many=True).data:
+            # Transform Serializer records into records for elasticsearch
+            yield elasticsearch_util.prepare_clean_listing_record(record)
+        last_id = listings[-1].id
+
+
 def bulk_reindex():
     """
-    Reindex Listing Data into an Elasticsearch Index
+    Reindex Listing Data into a new Elasticsearch Index, then swap the ES_INDEX_NAME alias to it
 
     Steps:
         Checks to see if elasticsearch connection is good
-        Removes the index if it already exist
-        Creates the index with mapping
-        Reindex data
+        Creates a new timestamped index with mapping
+        Streams the listings into size-bounded bulk requests (ES_REINDEX_CHUNK_SIZE / ES_REINDEX_MAX_CHUNK_BYTES)
+        Atomically swaps the alias to the new index and deletes the old index
         Wait for the cluster health to turn yellow
 
+    Searches keep using the old index until the swap. While the new index is built the listing index worker
+    writes listing changes to both indices. The reindex only creates documents, so a document the worker already
+    wrote (409 conflict) is newer than the reindex snapshot and is kept. A listing deleted after it was read
+    by the reindex can be created from the snapshot after the worker deleted it, so the created listings that no
+    longer exist are deleted from the new index before the swap. If any listing fails to index, the new index is
+    deleted and the alias is left as it was.
+
     To check index in elasticsearch:
         http://127.0.0.1:9200/appsmall/_search?size=10000&pretty
+
+    Returns:
+        True if the alias was swapped to the new index
     """
     # Create ES client
     es_client = elasticsearch_factory.get_client()
 
     logger.info('Starting Indexing Process')
     elasticsearch_factory.check_elasticsearch()
-    recreate_index_mapping()
-    # Convert Listing Objects into Python Objects
-    all_listings = models.Listing.objects.all()
-    serializer = ReadOnlyListingSerializer(all_listings, many=True)
-    serializer_results = serializer.data
+    index_name = get_new_index_name()
+    create_index(es_client, index_name)
+    cache.set(REINDEX_TARGET_CACHE_KEY, index_name, REINDEX_TARGET_TIMEOUT)
+
+    try:
+        logger.info('Bulk indexing listings...')
+        indexed_count = 0
+        error_count = 0
+        created_ids = set()
+        actions = ({'_op_type': 'create',
+                    '_index': index_name,
+                    '_type': settings.ES_TYPE_NAME,
+                    '_id': record[settings.ES_ID_FIELD],
+                    '_source': record} for record in generate_listing_records())
+
+        for is_success, item in helpers.streaming_bulk(es_client,
+                                                       actions,
+                                                       chunk_size=settings.ES_REINDEX_CHUNK_SIZE,
+                                                       max_chunk_bytes=settings.ES_REINDEX_MAX_CHUNK_BYTES,
+                                                       raise_on_error=False):
+            if is_success:
+                indexed_count = indexed_count + 1
+                created_ids.add(int(item['create']['_id']))
+            elif item['create'].get('status') == 409:
+                # Already written by the listing index worker
+                indexed_count = indexed_count + 1
+            else:
+                error_count = error_count + 1
+                logger.error('Error Bulk Indexing: {}'.format(item))
+
+        # Listings deleted while the reindex was running (the worker delete may have run before the create)
+        deleted_ids = created_ids - set(models.Listing.objects.values_list('id', flat=True))
+        if deleted_ids:
+            delete_actions = ({'_op_type': 'delete',
+                               '_index': index_name,
+                               '_type': settings.ES_TYPE_NAME,
+                               '_id': listing_id} for listing_id in sorted(deleted_ids))
+            for is_success, item in helpers.streaming_bulk(es_client, delete_actions, raise_on_error=False):
+                if not is_success and item['delete'].get('status') != 404:
+                    error_count = error_count + 1
+                    logger.error('Error Bulk Indexing, deleting listing: {}'.format(item))
+            logger.info('Bulk Indexing: removed {} listings deleted during the reindex'.format(len(deleted_ids)))
+
+        if error_count:
+            logger.error('Bulk Indexing: {} indexed, {} errors, keeping the current index'.format(indexed_count, error_count))
+            # Stop the listing index worker from writing to the new index before deleting it
+            cache.delete(REINDEX_TARGET_CACHE_KEY)
+            es_client.indices.delete(index=index_name)
+            return False
+
+        es_client.indices.refresh(index=index_name)
+        swap_index_alias(es_client, index_name)
+        logger.info('Bulk Indexing Successful: {} indexed'.format(indexed_count))
+    finally:
+        cache.delete(REINDEX_TARGET_CACHE_KEY)
+
+    logger.debug('Waiting for cluster to turn yellow')
+    es_client.cluster.health(wait_for_status='yellow', request_timeout=20)
+    logger.debug('Finish waiting for cluster to turn yellow')
+    return True
+
+
+def ensure_index_exists(es_client):
+    """
+    Create the listing index (and alias) if it does not exist yet
+    """
+    if not es_client.indices.exists(settings.ES_INDEX_NAME):
+        index_name = get_new_index_name()
+        create_index(es_client, index_name)
+        swap_index_alias(es_client, index_name)
+
 
-    bulk_data = []
+def get_listing_write_index_names():
+    """
+    Indices listing changes are written to: the alias, plus the index being built by bulk_reindex
+    """
+    index_names = [settings.ES_INDEX_NAME]
+    reindex_target = cache.get(REINDEX_TARGET_CACHE_KEY)
+    if reindex_target:
+        index_names.append(reindex_target)
+    return index_names
 
-    for record in serializer_results:
-        # Transform Serializer records into records for elasticsearch
-        record_clean_obj = elasticsearch_util.prepare_clean_listing_record(record)
 
-        op_dict = {
-            'index': {
-                '_index': settings.ES_INDEX_NAME,
+def generate_listing_index_actions(listing_ids):
+    """
+    Generator of bulk actions for listing ids:
+        index action for the listings that exist, delete action for the others
+    """
+    index_names = get_listing_write_index_names()
+
+    indexed_ids = set()
+    for record in generate_listing_records(listing_ids):
+        indexed_ids.add(record[settings.ES_ID_FIELD])
+        for index_name in index_names:
+            yield {
+                '_op_type': 'index',
+                '_index': index_name,
                 '_type': settings.ES_TYPE_NAME,
-                '_id': record_clean_obj[settings.ES_ID_FIELD]
+                '_id': record[settings.ES_ID_FIELD],
+                '_source': record
             }
-        }
 
-        bulk_data.append(op_dict)
-        bulk_data.append(record_clean_obj)
+    for listing_id in listing_ids:
+        if listing_id not in indexed_ids:
+            for index_name in index_names:
+                yield {
+                    '_op_type': 'delete',
+                    '_index': index_name,
+                    '_type': settings.ES_TYPE_NAME,
+                    '_id': listing_id
+                }
 
-    # Bulk index the data
-    logger.info('Bulk indexing listings...')
-    res = es_client.bulk(index=settings.ES_INDEX_NAME, body=bulk_data, refresh=True)
 
-    if res.get('errors', True):
-        logger.error('Error Bulk Indexing')
-    else:
-        logger.info('Bulk Indexing Successful')
+def process_listing_index_outbox(batch_size=None):
+    """
+    Drain one batch of the listing index outbox (ListingIndexOutboxEntry) into Elasticsearch
 
-    logger.debug('Waiting for cluster to turn yellow')
-    es_client.cluster.health(wait_for_status='yellow', request_timeout=20)
-    logger.debug('Finish waiting for cluster to turn yellow')
+    Steps:
+        Read the oldest outbox entries
+        Deduplicate by listing id (a listing saved many times is indexed once)
+        Send index/delete actions in one _bulk request
+        Refresh the index once for the whole batch
+        Delete the outbox entries of the listings indexed in every target index
 
+    Entries of listings that failed to index (Elasticsearch unavailable, document rejected by the mapping, ...)
+    stay in the outbox and are retried by the next run
 
-def get_user_exclude_orgs(username):
+    Returns:
+        Number of outbox entries processed (deleted from the outbox)
     """
-    Get User's Orgs to exclude
+    batch_size = batch_size or settings.ES_INDEX_OUTBOX_BATCH_SIZE
+    entries = list(models.ListingIndexOutboxEntry.objects.order_by('id').values_list('id', 'listing_id')[:batch_size])
+    if not entries:
+        return 0
+
+    listing_ids = sorted(set(listing_id for entry_id, listing_id in entries))
+
+    es_client = elasticsearch_factory.get_client()
+    ensure_index_exists(es_client)
+
+    failed_listing_ids = set()
+    for is_success, item in helpers.streaming_bulk(es_client,
+                                                   generate_listing_index_actions(listing_ids),
+                                                   chunk_size=batch_size,
+                                                   raise_on_error=False):
+        if is_success or item.get('delete', {}).get('status') == 404:
+            continue
+        # item: {'index': {'_index': 'appsmall-...', '_id': '12', 'status': 400, 'error': {...}}}
+        for op_result in item.values():
+            failed_listing_ids.add(int(op_result['_id']))
+        logger.error('Error Listing Outbox Indexing: {}'.format(item))
+
+    es_client.indices.refresh(index=settings.ES_INDEX_NAME)
+    bump_index_generation()
+
+    entry_ids = [entry_id for entry_id, listing_id in entries if listing_id not in failed_listing_ids]
+    models.ListingIndexOutboxEntry.objects.filter(id__in=entry_ids).delete()
+
+    logger.info('Listing Outbox Indexing: {} entries, {} listings, {} failed listings'.format(
+        len(entry_ids), len(listing_ids) - len(failed_listing_ids), len(failed_listing_ids)))
+    return len(entry_ids)
+
+
+def run_listing_index_worker(run_once=False):
+    """
+    Drain the listing index outbox forever, every ES_INDEX_OUTBOX_SECONDS seconds
+
+    New listing changes show up in search results within ES_INDEX_OUTBOX_SECONDS (+ indexing time)
     """
-    exclude_orgs = None
+    elasticsearch_factory.check_elasticsearch()
+    while True:
+        try:
+            processed_count = process_listing_index_outbox()
+            # Keep draining without waiting while the outbox has full batches
+            while processed_count >= settings.ES_INDEX_OUTBOX_BATCH_SIZE:
+                processed_count = process_listing_index_outbox()
+        except Exception:
+            logger.exception('Listing index worker failed, retrying in {} seconds'.format(settings.ES_INDEX_OUTBOX_SECONDS))
+
+        if run_once:
+            return
+        time.sleep(settings.ES_INDEX_OUTBOX_SECONDS)
 
-    user = models.Profile.objects.get(user__username=username)
 
+def get_user_exclude_orgs(username):
+    """
+    Get User's Orgs to exclude
+    """
     # Filter out private listings - private apps (apps only from user's agency) requirement
-    if user.highest_role() == 'APPS_MALL_STEWARD':
-        exclude_orgs = []
-    elif user.highest_role() == 'ORG_STEWARD':
-        user_orgs = user.stewarded_organizations.all()
-        user_orgs = [i.title for i in user_orgs]
-        exclude_orgs_obj = models.Agency.objects.exclude(title__in=user_orgs)
-        exclude_orgs = [agency.short_name for agency in exclude_orgs_obj]
-    else:
-        user_orgs = user.organizations.all()
-        user_orgs = [i.title for i in user_orgs]
-        exclude_orgs_obj = models.Agency.objects.exclude(title__in=user_orgs)
-        exclude_orgs = [agency.short_name for agency in exclude_orgs_obj]
+    user_context = models.get_user_context(username)
+    exclude_orgs = [agency.short_name for agency in user_context.exclude_organizations]
 
     return exclude_orgs
 
 
+def get_listing_security_markings():
+    """
+    Get the distinct security markings of the listings, cached until a listing changes
+    """
+    listing_version = utils.get_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+    key = 'listing_security_markings-{0!s}'.format(listing_version)
+    security_markings = cache.get(key)
+    if security_markings is None:
+        security_markings = list(models.Listing.objects.exclude(security_marking__isnull=True).exclude(
+            security_marking='').order_by().values_list('security_marking', flat=True).distinct())
+        cache.set(key, security_markings, timeout=settings.GLOBAL_SECONDS_TO_CACHE_DATA)
+    return security_markings
+
+
+def get_user_security_markings(username):
+    """
+    Get the listing security markings the user has access to, used as a terms filter in the search query
+    (listings without a security marking are never returned)
+    """
+    return sorted(system_allowed_security_markings(username, get_listing_security_markings()))
+
+
+def bump_index_generation():
+    """
+    Invalidate the cached search results, called whenever the listing index changes
+    """
+    utils.bump_cache_version(constants.ES_LISTING_INDEX_GENERATION_KEY)
+
+
+def get_search_cache_key(prefix, search_param_parser, user_exclude_orgs, user_security_markings):
+    """
+    Get the cache key of search results
+
+    Users with the same excluded organizations and security markings (visibility class) see the same results,
+    so the key is built from the normalized search parameters and the visibility class. The listing index
+    generation counter is part of the key so that a change to the index invalidates every entry
+    """
+    index_generation = utils.get_cache_version(constants.ES_LISTING_INDEX_GENERATION_KEY)
+    key_data = [search_param_parser.get_normalized_params(), sorted(user_exclude_orgs), sorted(user_security_markings)]
+    key_hash = hashlib.md5(json.dumps(key_data, sort_keys=True).encode('utf-8')).hexdigest()
+    return '{0}-{1}-{2}'.format(prefix, index_generation, key_hash)
+
+
 def suggest(request_username, search_param_parser):
     """
     Suggest
@@ -217,23 +516,37 @@ def suggest(request_username, search_param_parser):
     Returns:
         listing titles in a list
     """
-    # Create ES client
-    es_client = elasticsearch_factory.get_client()
-
-    elasticsearch_factory.check_elasticsearch()
-
     if search_param_parser.search_string is None:
         return []
 
     user_exclude_orgs = get_user_exclude_orgs(request_username)
+    user_security_markings = get_user_security_markings(request_username)
 
     # Override Limit - Only 15 results should come if limit was not set
     if search_param_parser.limit_set is False:
         search_param_parser.limit = constants.ES_SUGGEST_LIMIT
 
-    search_query = elasticsearch_util.make_search_query_obj(search_param_parser, exclude_agencies=user_exclude_orgs)
-    # Only Retrieve ['title', 'security_marking', 'id'] fields from Elasticsearch for suggestions
-    search_query['_source'] = ['title', 'security_marking', 'id']
+    # Type-ahead requests repeat the same short prefixes, results are shared by users with the same visibility
+    cache_key = get_search_cache_key('es_suggest', search_param_parser, user_exclude_orgs, user_security_markings)
+    hit_titles = cache.get(cache_key)
+    if hit_titles is None:
+        hit_titles = suggest_listings(search_param_parser, user_exclude_orgs, user_security_markings)
+        cache.set(cache_key, hit_titles, timeout=settings.ES_SEARCH_CACHE_SECONDS)
+    return hit_titles
+
+
+def suggest_listings(search_param_parser, user_exclude_orgs, user_security_markings):
+    """
+    Run the suggest query in Elasticsearch (see suggest)
+    """
+    # Create ES client
+    es_client = elasticsearch_factory.get_client()
+
+    elasticsearch_factory.check_elasticsearch()
+
+    search_query = elasticsearch_util.make_suggest_query_obj(search_param_parser,
+                                                             exclude_agencies=user_exclude_orgs,
+                                                             security_markings=user_security_markings)
 
     # print(json.dumps(search_query, indent=4))  #  Print statement for debugging output
     res = es_client.search(index=settings.ES_INDEX_NAME, body=search_query)
@@ -242,23 +555,7 @@ def suggest(request_username, search_param_parser):
     if not hits:
         return []
 
-    hit_titles = []
-
-    for hit in hits:
-        source = hit.get('_source')
-
-        exclude_bool = False
-        if not source.get('security_marking'):
-            exclude_bool = True
-            logger.debug('Listing {0!s} has no security_marking'.format(source.get('title')))
-        if not system_has_access_control(request_username, source.get('security_marking')):
-            exclude_bool = True
-
-        if exclude_bool is False:
-            temp = {'title': source['title'], 'id': source['id']}
-            hit_titles.append(temp)
-
-    return hit_titles
+    return [{'title': hit['_source']['title'], 'id': hit['_source']['id']} for hit in hits]
 
 
 def generate_link(search_param_parser, offset_prediction):
@@ -287,7 +584,9 @@ def generate_link(search_param_parser, offset_prediction):
 def search(request_username, search_param_parser):
     """
     Filter Listings
-    Too many variations to cache results
+
+    Results are cached for ES_SEARCH_CACHE_SECONDS by normalized search parameters and visibility
+    (see get_search_cache_key), any change to the listing index invalidates them
 
     Users shall be able to search for listings'
      - title
@@ -326,12 +625,28 @@ def search(request_username, search_param_parser):
         username(str): username
         search_param_parser(SearchParamParser): parameters
     """
+    user_exclude_orgs = get_user_exclude_orgs(request_username)
+    user_security_markings = get_user_security_markings(request_username)
+
+    cache_key = get_search_cache_key('es_search', search_param_parser, user_exclude_orgs, user_security_markings)
+    final_results = cache.get(cache_key)
+    if final_results is None:
+        final_results = search_listings(search_param_parser, user_exclude_orgs, user_security_markings)
+        cache.set(cache_key, final_results, timeout=settings.ES_SEARCH_CACHE_SECONDS)
+    return final_results
+
+
+def search_listings(search_param_parser, user_exclude_orgs, user_security_markings):
+    """
+    Run the search query in Elasticsearch (see search)
+    """
     elasticsearch_factory.check_elasticsearch()
     # Create ES client
     es_client = elasticsearch_factory.get_client()
 
-    user_exclude_orgs = get_user_exclude_orgs(request_username)
-    search_query = elasticsearch_util.make_search_query_obj(search_param_parser, exclude_agencies=user_exclude_orgs)
+    search_query = elasticsearch_util.make_search_query_obj(search_param_parser,
+                                                            exclude_agencies=user_exclude_orgs,
+                                                            security_markings=user_security_markings)
 
     # print(json.dumps(search_query, indent=4))
     res = es_client.search(index=settings.ES_INDEX_NAME, body=search_query)
@@ -343,8 +658,6 @@ def search(request_username, search_param_parser):
 
     hit_titles = []
 
-    excluded_count = 0
-
     for current_innter_hit in inner_hits:
         source = current_innter_hit.get('_source')
         source['_score'] = current_innter_hit.get('_score')
@@ -362,36 +675,19 @@ def search(request_username, search_param_parser):
                 else:
                     source[image_key]['url'] = '/api/image/{!s}/'.format(source[image_key]['id'])
 
-        exclude_bool = False
-        if not source.get('security_marking'):
-            exclude_bool = True
-            logger.debug('Listing {0!s} has no security_marking'.format(source.get('title')))
-        if not system_has_access_control(request_username, source.get('security_marking')):
-            exclude_bool = True
+        hit_titles.append(source)
 
-        if exclude_bool is False:
-            hit_titles.append(source)
-        else:
-            excluded_count = excluded_count + 1
-
-    # Total Records in Elasticsearch
+    # Total Records in Elasticsearch (security markings and private listings are filtered in the query)
     final_count = hits.get('total')
-    # Total Records minus what the user does not have access to see, this count should never be below zero
-    # TODO: Figure out smarter logic for excluded_count compensation (rivera 11/14/2016)
-    final_count_with_excluded = final_count - excluded_count
 
     final_results = {
-        'count': final_count_with_excluded,
+        'count': final_count,
         'results': hit_titles
     }
 
     final_results['previous'] = None
     final_results['next'] = None
 
-    # if final_count_with_excluded < 0 then previous and next should be None
-    if final_count_with_excluded < 0:
-        return final_results
-
     previous_offset_prediction = search_param_parser.offset - search_param_parser.limit
     next_offset_prediction = search_param_parser.offset + search_param_parser.limit
 
@@ -402,7 +698,7 @@ def search(request_username, search_param_parser):
         final_results['previous'] = generate_link(search_param_parser, previous_offset_prediction)
 
     # Next URL
-    if next_offset_prediction <= final_count_with_excluded:
+    if next_offset_prediction < final_count:
         final_results['next'] = generate_link(search_param_parser, next_offset_prediction)
 
     return final_results
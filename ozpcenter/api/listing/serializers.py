@@ -719,8 +719,9 @@ class ListingSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         # logger.debug('inside ListingSerializer.update', extra={'request':self.context.get('request')})
         user = generic_model_access.get_profile(self.context['request'].user.username)
+        highest_role = models.get_user_context(user).highest_role
 
-        if user.highest_role() not in ['APPS_MALL_STEWARD', 'ORG_STEWARD']:
+        if highest_role not in ['APPS_MALL_STEWARD', 'ORG_STEWARD']:
             if user not in instance.owners.all():
                 raise errors.PermissionDenied(
                     'User ({0!s}) is not an owner of this listing'.format(user.username))
@@ -767,7 +768,7 @@ class ListingSerializer(serializers.ModelSerializer):
                                    is_private=validated_data['is_private'])
 
         if validated_data['is_featured'] != instance.is_featured:
-            if user.highest_role() not in ['APPS_MALL_STEWARD', 'ORG_STEWARD']:
+            if highest_role not in ['APPS_MALL_STEWARD', 'ORG_STEWARD']:
                 raise errors.PermissionDenied('Only stewards can change is_featured setting of a listing')
             change_details.append({'old_value': model_access.bool_to_string(instance.is_featured),
                     'new_value': model_access.bool_to_string(validated_data['is_featured']), 'field_name': 'is_featured'})
@@ -776,9 +777,9 @@ class ListingSerializer(serializers.ModelSerializer):
         s = validated_data['approval_status']
         if s and s != instance.approval_status:  # Check to see if approval_status has changed
             old_approval_status = instance.approval_status
-            if s == models.Listing.APPROVED and user.highest_role() != 'APPS_MALL_STEWARD':
+            if s == models.Listing.APPROVED and highest_role != 'APPS_MALL_STEWARD':
                 raise errors.PermissionDenied('Only an APPS_MALL_STEWARD can mark a listing as APPROVED')
-            if s == models.Listing.APPROVED_ORG and user.highest_role() not in ['APPS_MALL_STEWARD', 'ORG_STEWARD']:
+            if s == models.Listing.APPROVED_ORG and highest_role not in ['APPS_MALL_STEWARD', 'ORG_STEWARD']:
                 raise errors.PermissionDenied('Only stewards can mark a listing as APPROVED_ORG')
             if s == models.Listing.PENDING:
                 model_access.submit_listing(user, instance)
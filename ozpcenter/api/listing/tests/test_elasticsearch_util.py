@@ -7,9 +7,13 @@ python manage.py test ozpcenter.api.listing.tests.test_elasticsearch_util
 from django.test import override_settings
 from unittest import skip
 from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
 
+from ozpcenter import models
 from ozpcenter.scripts import sample_data_generator as data_gen
 from ozpcenter.api.listing import elasticsearch_util
+from ozpcenter.api.listing import model_access_es
 
 
 @override_settings(ES_ENABLED=False)
@@ -191,3 +195,23 @@ class ElasticsearchUtilTest(TestCase):
         self.assertTrue('size' in expected)
 
     # TODO Add more test
+
+    def test_make_suggest_query_obj(self):
+        search_param_parser = model_access_es.SearchParamParser(Request(APIRequestFactory().get(
+            '/api/listings/essearch/suggest/?search=air m&category=Books')))
+        search_query = elasticsearch_util.make_suggest_query_obj(search_param_parser,
+                                                                 exclude_agencies=['Minitrue'],
+                                                                 security_markings=['UNCLASSIFIED'])
+        self.assertEqual(search_query['_source'], ['id', 'title'])
+        self.assertEqual(search_query['query']['bool']['must']['multi_match']['query'], 'air m')
+        self.assertEqual(search_query['query']['bool']['filter'],
+                         elasticsearch_util.make_search_filter_obj(search_param_parser, ['Minitrue'], ['UNCLASSIFIED']))
+        self.assertIn({'terms': {'security_marking': ['UNCLASSIFIED']}}, search_query['query']['bool']['filter'])
+
+        # Suggest fields are part of the mapping (dynamic mapping is strict)
+        mapping_properties = elasticsearch_util.get_mapping_setting_obj()['mappings']['listings']['properties']
+        record = next(model_access_es.generate_listing_records([models.Listing.objects.get(title='Air Mail').id]))
+        self.assertEqual(record['title_suggest'], 'Air Mail')
+        self.assertEqual(record['tags_suggest'], [tag['name'] for tag in record['tags']])
+        for key in record:
+            self.assertIn(key, mapping_properties)
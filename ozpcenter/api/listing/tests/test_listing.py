@@ -1,15 +1,22 @@
 """
 Listing tests
 """
+from unittest.mock import patch
+
+from django.core.cache import cache
 from django.test import override_settings
 from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
 
 from ozpcenter.scripts import sample_data_generator as data_gen
 import ozpcenter.api.listing.model_access as model_access
+from ozpcenter.api.listing import model_access_es
 from ozpcenter import errors
 import ozpcenter.model_access as generic_model_access
 from ozpcenter import models
 from ozpcenter.tests.helper import ListingFile
+from plugins_util.plugin_manager import system_has_access_control
 
 
 @override_settings(ES_ENABLED=False)
@@ -377,3 +384,198 @@ class ListingTest(TestCase):
         self.assertTrue(data['APPROVED_ORG'] >= 0)
         self.assertTrue(data['APPROVED'] >= 0)
         self.assertTrue(data['DELETED'] >= 0)
+
+    def test_put_counts_in_listings_endpoint_grouped(self):
+        queryset = models.Listing.objects.filter(is_private=False)
+        data = model_access.put_counts_in_listings_endpoint(queryset)
+
+        self.assertEqual(data['total'], queryset.count())
+        self.assertEqual(data['enabled'], queryset.filter(is_enabled=True).count())
+        for approval_status, _ in models.Listing.APPROVAL_STATUS_CHOICES:
+            self.assertEqual(data[approval_status], queryset.filter(approval_status=approval_status).count())
+        for agency in models.Agency.objects.all():
+            self.assertEqual(data['organizations'][str(agency.id)], queryset.filter(agency=agency).count())
+
+        # Cached per queryset
+        with self.assertNumQueries(0):
+            self.assertEqual(model_access.put_counts_in_listings_endpoint(queryset), data)
+
+        data = model_access.put_counts_in_listings_endpoint(models.Listing.objects.filter(id__in=[]))
+        self.assertEqual(data['total'], 0)
+
+    def test_update_rating_incremental(self):
+        listing = models.Listing.objects.get(title='Air Mail')
+        review = model_access.create_listing_review('jones', listing, 5, text='Great')
+        model_access.create_listing_review('jones', listing, 4, review_parent=review)
+        review = model_access.edit_listing_review('jones', review, 2, text=None)
+
+        listing = models.Listing.objects.get(title='Air Mail')
+        rating_counts = {rating_field: getattr(listing, rating_field) for rating_field in model_access.RATING_COUNT_FIELDS}
+
+        # Incremental counters match the recomputed counters
+        self.assertEqual(model_access.reconcile_listing_ratings(), 0)
+
+        model_access.delete_listing_review('jones', review)
+        listing = models.Listing.objects.get(title='Air Mail')
+        self.assertEqual(listing.total_votes, rating_counts['total_votes'] - 1)
+        self.assertEqual(listing.total_rate2, rating_counts['total_rate2'] - 1)
+        self.assertEqual(listing.total_review_responses, rating_counts['total_review_responses'] - 1)
+        self.assertEqual(model_access.reconcile_listing_ratings(), 0)
+
+        models.Listing.objects.filter(title='Air Mail').update(total_votes=0, total_rate5=0, avg_rate=0)
+        self.assertEqual(model_access.reconcile_listing_ratings(), 1)
+        listing = models.Listing.objects.get(title='Air Mail')
+        self.assertEqual(listing.total_votes, rating_counts['total_votes'] - 1)
+        self.assertEqual(listing.avg_rate, model_access.calculate_avg_rate(
+            {rating_field: getattr(listing, rating_field) for rating_field in model_access.RATING_COUNT_FIELDS}))
+
+    def test_listing_index_outbox(self):
+        listing = models.Listing.objects.get(title='Air Mail')
+        models.ListingIndexOutboxEntry.objects.all().delete()
+
+        # Listing saves only write to the outbox when Elasticsearch is disabled
+        listing.save()
+        self.assertEqual(models.ListingIndexOutboxEntry.objects.count(), 0)
+
+        with override_settings(ES_ENABLED=True):
+            listing.save()
+            listing.save()
+        self.assertEqual(list(models.ListingIndexOutboxEntry.objects.values_list('listing_id', flat=True)),
+                         [listing.id, listing.id])
+
+        missing_listing_id = models.Listing.objects.order_by('-id').first().id + 1
+        actions = list(model_access_es.generate_listing_index_actions([listing.id, missing_listing_id]))
+        self.assertEqual([(action['_op_type'], action['_id']) for action in actions],
+                         [('index', listing.id), ('delete', missing_listing_id)])
+        self.assertEqual(actions[0]['_source']['title'], 'Air Mail')
+
+    def test_generate_listing_records_chunked(self):
+        records = list(model_access_es.generate_listing_records())
+        self.assertEqual([record['id'] for record in records],
+                         list(models.Listing.objects.order_by('id').values_list('id', flat=True)))
+
+        with override_settings(ES_REINDEX_CHUNK_SIZE=3):
+            chunked_records = list(model_access_es.generate_listing_records())
+        self.assertEqual(chunked_records, records)
+
+    def test_get_user_security_markings(self):
+        listing_security_markings = model_access_es.get_listing_security_markings()
+        self.assertEqual(sorted(listing_security_markings),
+                         sorted(set(models.Listing.objects.values_list('security_marking', flat=True))))
+
+        for username in ['bigbrother', 'jones', 'wsmith']:
+            user_security_markings = model_access_es.get_user_security_markings(username)
+            self.assertEqual(user_security_markings,
+                             sorted(marking for marking in listing_security_markings if system_has_access_control(username, marking)))
+
+    def test_search_cache_key(self):
+        request_factory = APIRequestFactory()
+
+        def get_cache_key(url, user_exclude_orgs=None, user_security_markings=None):
+            search_param_parser = model_access_es.SearchParamParser(Request(request_factory.get(url)))
+            return model_access_es.get_search_cache_key('es_search', search_param_parser,
+                                                        user_exclude_orgs or [], user_security_markings or ['UNCLASSIFIED'])
+
+        cache_key = get_cache_key('/api/listings/essearch/?search=Air&category=Books&category=Tools')
+        self.assertEqual(get_cache_key('/api/listings/essearch/?search=Air&category=tools&category=books'), cache_key)
+        self.assertNotEqual(get_cache_key('/api/listings/essearch/?search=air&category=tools&category=books'), cache_key)
+        self.assertNotEqual(get_cache_key('/api/listings/essearch/?search=Air&category=tools&category=books&offset=10'), cache_key)
+        # query_string operators are case sensitive
+        self.assertNotEqual(get_cache_key('/api/listings/essearch/?search=air or mail'),
+                            get_cache_key('/api/listings/essearch/?search=air OR mail'))
+        self.assertNotEqual(get_cache_key('/api/listings/essearch/?search=Air&category=Books&category=Tools', ['Minitrue']), cache_key)
+
+        model_access_es.bump_index_generation()
+        self.assertNotEqual(get_cache_key('/api/listings/essearch/?search=Air&category=Books&category=Tools'), cache_key)
+
+    @patch('ozpcenter.api.listing.model_access_es.ensure_index_exists')
+    @patch('ozpcenter.api.listing.model_access_es.elasticsearch_factory')
+    def test_listing_index_outbox_keeps_failed_entries(self, mock_elasticsearch_factory, mock_ensure_index_exists):
+        air_mail = models.Listing.objects.get(title='Air Mail')
+        bread_basket = models.Listing.objects.get(title='Bread Basket')
+        models.ListingIndexOutboxEntry.objects.all().delete()
+        models.ListingIndexOutboxEntry.enqueue(air_mail.id)
+        models.ListingIndexOutboxEntry.enqueue(bread_basket.id)
+        models.ListingIndexOutboxEntry.enqueue(air_mail.id)
+
+        def streaming_bulk(client, actions, **kwargs):
+            for action in actions:
+                if action['_id'] == bread_basket.id:
+                    yield False, {'index': {'_id': str(action['_id']), 'status': 400, 'error': {'type': 'strict_dynamic_mapping_exception'}}}
+                else:
+                    yield True, {action['_op_type']: {'_id': str(action['_id']), 'status': 200}}
+
+        with patch('ozpcenter.api.listing.model_access_es.helpers.streaming_bulk', side_effect=streaming_bulk):
+            self.assertEqual(model_access_es.process_listing_index_outbox(), 2)
+
+        # Failed listing stays in the outbox to be retried
+        self.assertEqual(list(models.ListingIndexOutboxEntry.objects.values_list('listing_id', flat=True)), [bread_basket.id])
+
+    @patch('ozpcenter.api.listing.model_access_es.swap_index_alias')
+    @patch('ozpcenter.api.listing.model_access_es.create_index')
+    @patch('ozpcenter.api.listing.model_access_es.elasticsearch_factory')
+    def test_bulk_reindex_keeps_worker_documents(self, mock_elasticsearch_factory, mock_create_index, mock_swap_index_alias):
+        bread_basket = models.Listing.objects.get(title='Bread Basket')
+
+        def streaming_bulk(client, actions, **kwargs):
+            for action in actions:
+                self.assertEqual(action['_op_type'], 'create')
+                if action['_id'] == bread_basket.id:
+                    # Written by the listing index worker during the reindex
+                    yield False, {'create': {'_id': str(action['_id']), 'status': 409, 'error': {'type': 'version_conflict_engine_exception'}}}
+                else:
+                    yield True, {'create': {'_id': str(action['_id']), 'status': 201}}
+
+        with patch('ozpcenter.api.listing.model_access_es.helpers.streaming_bulk', side_effect=streaming_bulk):
+            self.assertTrue(model_access_es.bulk_reindex())
+
+        mock_swap_index_alias.assert_called_once_with(mock_elasticsearch_factory.get_client(), mock_create_index.call_args[0][1])
+        self.assertIsNone(cache.get(model_access_es.REINDEX_TARGET_CACHE_KEY))
+
+    @patch('ozpcenter.api.listing.model_access_es.swap_index_alias')
+    @patch('ozpcenter.api.listing.model_access_es.create_index')
+    @patch('ozpcenter.api.listing.model_access_es.elasticsearch_factory')
+    def test_bulk_reindex_removes_listings_deleted_during_reindex(self, mock_elasticsearch_factory, mock_create_index, mock_swap_index_alias):
+        deleted_listing_id = models.Listing.objects.order_by('-id').first().id + 1
+        bulk_actions = []
+
+        def streaming_bulk(client, actions, **kwargs):
+            for action in actions:
+                bulk_actions.append(action)
+                if action['_op_type'] == 'create':
+                    yield True, {'create': {'_id': str(action['_id']), 'status': 201}}
+                else:
+                    yield True, {'delete': {'_id': str(action['_id']), 'status': 200}}
+            if bulk_actions[-1]['_op_type'] == 'create':
+                # Listing read by the reindex, deleted (and removed by the listing index worker) before its create
+                yield True, {'create': {'_id': str(deleted_listing_id), 'status': 201}}
+
+        with patch('ozpcenter.api.listing.model_access_es.helpers.streaming_bulk', side_effect=streaming_bulk):
+            self.assertTrue(model_access_es.bulk_reindex())
+
+        delete_actions = [action for action in bulk_actions if action['_op_type'] == 'delete']
+        self.assertEqual([action['_id'] for action in delete_actions], [deleted_listing_id])
+        self.assertEqual(delete_actions[0]['_index'], mock_create_index.call_args[0][1])
+        self.assertTrue(mock_swap_index_alias.called)
+
+    @patch('ozpcenter.api.listing.model_access_es.swap_index_alias')
+    @patch('ozpcenter.api.listing.model_access_es.create_index')
+    @patch('ozpcenter.api.listing.model_access_es.elasticsearch_factory')
+    def test_bulk_reindex_failure_stops_worker_writes(self, mock_elasticsearch_factory, mock_create_index, mock_swap_index_alias):
+        es_client = mock_elasticsearch_factory.get_client()
+
+        def streaming_bulk(client, actions, **kwargs):
+            for action in actions:
+                yield False, {'create': {'_id': str(action['_id']), 'status': 400, 'error': {'type': 'mapper_parsing_exception'}}}
+
+        def delete_index(index):
+            # The listing index worker must no longer target the index being deleted
+            self.assertIsNone(cache.get(model_access_es.REINDEX_TARGET_CACHE_KEY))
+
+        es_client.indices.delete.side_effect = delete_index
+
+        with patch('ozpcenter.api.listing.model_access_es.helpers.streaming_bulk', side_effect=streaming_bulk):
+            self.assertFalse(model_access_es.bulk_reindex())
+
+        es_client.indices.delete.assert_called_once_with(index=mock_create_index.call_args[0][1])
+        self.assertFalse(mock_swap_index_alias.called)
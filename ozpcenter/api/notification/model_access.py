@@ -69,6 +69,7 @@ from ozpcenter.models import Profile
 from ozpcenter.models import Listing
 from ozpcenter.models import ApplicationLibraryEntry
 from ozpcenter.models import Subscription
+from ozpcenter.models import get_user_context
 
 
 import ozpcenter.model_access as generic_model_access
@@ -159,7 +160,7 @@ def check_notification_permission(profile_instance, action, notification_type):
     Return:
         True or PermissionDenied Exception
     """
-    profile_role = profile_instance.highest_role()
+    profile_role = get_user_context(profile_instance).highest_role
     assert (profile_role in permission_dict), 'Profile group {} not found in permissions'.format(profile_role)
 
     user_action = '{}_{}_notification'.format(action, notification_type)
@@ -354,7 +355,7 @@ class ListingNotification(NotificationBase):
         return Profile.objects.filter(id__in=owner_id_list, listing_notification_flag=True).all()
 
     def check_local_permission(self, entity):
-        if self.sender_profile.highest_role() in ['APPS_MALL_STEWARD', 'ORG_STEWARD']:
+        if get_user_context(self.sender_profile).highest_role in ['APPS_MALL_STEWARD', 'ORG_STEWARD']:
             return True
 
         if self.sender_profile not in entity.owners.all():
@@ -478,7 +479,7 @@ class ListingPrivateStatusNotification(NotificationBase):
         return Profile.objects.filter(id__in=owner_id_list, listing_notification_flag=True).all()
 
     def check_local_permission(self, entity):
-        if self.sender_profile.highest_role() in ['APPS_MALL_STEWARD', 'ORG_STEWARD']:
+        if get_user_context(self.sender_profile).highest_role in ['APPS_MALL_STEWARD', 'ORG_STEWARD']:
             return True
 
         if self.sender_profile not in entity.owners.all():
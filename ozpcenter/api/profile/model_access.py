@@ -7,7 +7,6 @@ from ozpcenter import models
 from django.contrib import auth
 import ozpcenter.model_access as generic_model_access
 
-from plugins_util.plugin_manager import system_has_access_control
 
 # Get an instance of a logger
 logger = logging.getLogger('ozp-center.' + str(__name__))
@@ -65,13 +64,7 @@ def get_all_listings_for_profile_by_id(current_request_username, profile_id, lis
         listings = models.Listing.objects.filter(owners__id=profile_instance.id)
         listings = listings.exclude(is_private=True)
         # filter out listings by user's access level
-        titles_to_exclude = []
-        for i in listings:
-            if not i.security_marking:
-                logger.debug('Listing {0!s} has no security_marking'.format(i.title))
-            if not system_has_access_control(current_request_username, i.security_marking):
-                titles_to_exclude.append(i.title)
-        listings = listings.exclude(title__in=titles_to_exclude)  # TODO: Base it on ids
+        listings = models.filter_security_markings(current_request_username, listings)
 
         if listing_id:
             filtered_listing = listings.get(id=listing_id)
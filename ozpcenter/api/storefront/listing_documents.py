@@ -0,0 +1,374 @@
+"""
+Storefront Listing Documents
+
+The storefront needs every enabled, approved listing with its agency, icons, categories, tags, contacts,
+owners and intents. get_sql_statement joins all of them into a wide row set (one row per m2m combination),
+build_listing_documents folds those rows into one listing dictionary per listing.
+
+The folded dictionaries are stored as JSON in models.StorefrontListingDocument (one row per listing,
+see models.refresh_storefront_listing_documents), the storefront reads them back with a single indexed scan.
+
+This module does not import ozpcenter.models (it is used by the models signals)
+"""
+import json
+
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+
+
+DATETIME_FIELDS = ['approved_date', 'edited_date']
+# Listing fields read by get_sql_statement, saving other fields does not change the document
+LISTING_FIELDS = frozenset([
+    'title', 'approved_date', 'edited_date', 'description', 'launch_url', 'version_name', 'unique_name',
+    'what_is_new', 'requirements', 'description_short', 'approval_status', 'is_enabled', 'is_featured',
+    'avg_rate', 'total_rate1', 'total_rate2', 'total_rate3', 'total_rate4', 'total_rate5', 'total_votes',
+    'total_reviews', 'iframe_compatible', 'security_marking', 'is_private', 'current_rejection', 'last_activity',
+    'listing_type', 'required_listings', 'is_deleted', 'agency', 'small_icon', 'large_icon', 'banner_icon',
+    'large_banner_icon'])
+ICON_FIELDS = ['small_icon', 'large_icon', 'banner_icon', 'large_banner_icon']
+
+
+def dictfetchall(cursor):
+    "Returns all rows from a cursor as a dict"
+    desc = cursor.description
+    return [
+        dict(zip([col[0] for col in desc], row))
+        for row in cursor.fetchall()
+    ]
+
+
+def get_sql_statement(listing_ids=None):
+    """
+    Get the SQL statement of the enabled, approved, not deleted listings (one row per listing and m2m combination)
+
+    Args:
+        listing_ids: only include these listing ids, None for all listings
+    """
+    schema_class_str = str(connection.SchemaEditorClass)
+    is_deleted = None
+    is_enabled = None
+
+    if 'sqlite' in schema_class_str:
+        is_deleted = '0'
+        is_enabled = '1'
+    elif 'postgres' in schema_class_str:
+        is_deleted = 'False'
+        is_enabled = 'True'
+    else:
+        raise Exception('Get SQL Statment ENGINE Error')
+
+    listing_ids_filter = ''
+    if listing_ids is not None:
+        listing_ids_filter = 'AND ozpcenter_listing.id IN ({})'.format(', '.join(str(int(listing_id)) for listing_id in listing_ids) or 'NULL')
+
+    sql_statement = '''
+SELECT DISTINCT
+  ozpcenter_listing.id,
+  ozpcenter_listing.title,
+  ozpcenter_listing.approved_date,
+  ozpcenter_listing.edited_date,
+  ozpcenter_listing.description,
+  ozpcenter_listing.launch_url,
+  ozpcenter_listing.version_name,
+  ozpcenter_listing.unique_name,
+  ozpcenter_listing.what_is_new,
+  ozpcenter_listing.requirements,
+  ozpcenter_listing.description_short,
+  ozpcenter_listing.approval_status,
+  ozpcenter_listing.is_enabled,
+  ozpcenter_listing.is_featured,
+  ozpcenter_listing.avg_rate,
+  ozpcenter_listing.total_rate1,
+  ozpcenter_listing.total_rate2,
+  ozpcenter_listing.total_rate3,
+  ozpcenter_listing.total_rate4,
+  ozpcenter_listing.total_rate5,
+  ozpcenter_listing.total_votes,
+  ozpcenter_listing.total_reviews,
+  ozpcenter_listing.iframe_compatible,
+  ozpcenter_listing.security_marking,
+  ozpcenter_listing.is_private,
+  ozpcenter_listing.current_rejection_id,
+  ozpcenter_listing.last_activity_id,
+  ozpcenter_listing.listing_type_id,
+  ozpcenter_listing.required_listings_id,
+  ozpcenter_listing.is_deleted,
+
+  /* One to Many */
+  ozpcenter_listing.listing_type_id,
+  ozpcenter_listingtype.title listing_type_title,
+
+  /* One to Many Images*/
+  ozpcenter_listing.agency_id agency_id,
+  ozpcenter_agency.title agency_title,
+  ozpcenter_agency.short_name agency_short_name,
+
+  ozpcenter_listing.small_icon_id,
+  small_icon.security_marking small_icon_security_marking,
+
+  ozpcenter_listing.large_icon_id,
+  large_icon.security_marking large_icon_security_marking,
+
+  ozpcenter_listing.banner_icon_id,
+  banner_icon.security_marking banner_icon_security_marking,
+
+  ozpcenter_listing.large_banner_icon_id,
+  large_banner_icon.security_marking large_banner_icon_security_marking,
+
+  /* Many to Many */
+  /* Category */
+  category_listing.category_id,
+  ozpcenter_category.title category_title,
+  ozpcenter_category.description category_description,
+
+  /* Contact */
+  contact_listing.contact_id contact_id,
+  ozpcenter_contact.contact_type_id contact_type_id, /* Check to see if contact_id and contact_type_id is correct*/
+  ozpcenter_contacttype.name contact_type_name,
+  ozpcenter_contact.secure_phone contact_secure_phone,
+  ozpcenter_contact.unsecure_phone contact_unsecure_phone,
+  ozpcenter_contact.email contact_email,
+  ozpcenter_contact.name contact_name,
+  ozpcenter_contact.organization contact_organization,
+
+  /* Tags */
+  tag_listing.tag_id,
+  ozpcenter_tag.name tag_name,
+
+  /* Owners */
+  owners.profile_id,
+  owner_profile.display_name owner_display_name,
+  owner_profile.user_id owner_user_id,
+  owner_user.username owner_username,
+
+  /* Intents */
+  intent_listing.intent_id,
+  ozpcenter_intent.action intent_action
+FROM
+  ozpcenter_listing
+/* One to Many Joins */
+JOIN ozpcenter_agency ON (ozpcenter_listing.agency_id = ozpcenter_agency.id)
+JOIN ozpcenter_listingtype ON (ozpcenter_listingtype.id = ozpcenter_listing.listing_type_id)
+JOIN ozpcenter_image small_icon ON (small_icon.id = ozpcenter_listing.small_icon_id)
+JOIN ozpcenter_image large_icon ON (large_icon.id = ozpcenter_listing.small_icon_id)
+JOIN ozpcenter_image banner_icon ON (banner_icon.id = ozpcenter_listing.small_icon_id)
+JOIN ozpcenter_image large_banner_icon ON (large_banner_icon.id = ozpcenter_listing.small_icon_id)
+/* Many to Many Joins */
+
+/* Categories */
+LEFT JOIN category_listing ON (category_listing.listing_id = ozpcenter_listing.id)
+LEFT JOIN ozpcenter_category on (category_listing.category_id = ozpcenter_category.id)
+
+/* Contacts */
+LEFT JOIN contact_listing ON (contact_listing.listing_id = ozpcenter_listing.id)
+LEFT JOIN ozpcenter_contact on (contact_listing.contact_id = ozpcenter_contact.id)
+LEFT JOIN ozpcenter_contacttype on (ozpcenter_contact.contact_type_id = ozpcenter_contacttype.id)
+
+/* Tags */
+LEFT JOIN tag_listing ON (tag_listing.listing_id = ozpcenter_listing.id)
+LEFT JOIN ozpcenter_tag ON (tag_listing.tag_id = ozpcenter_tag.id)
+
+/* Owners */
+LEFT JOIN profile_listing owners ON (owners.listing_id = ozpcenter_listing.id)
+LEFT JOIN ozpcenter_profile owner_profile ON (owners.profile_id = owner_profile.id)
+LEFT JOIN auth_user owner_user ON (owner_profile.user_id = owner_user.id)
+
+/* Intent */
+LEFT JOIN intent_listing ON (intent_listing.listing_id = ozpcenter_listing.id)
+LEFT JOIN ozpcenter_intent ON (intent_listing.intent_id = ozpcenter_intent.id)
+
+/*
+Get Listings that are enabled, not deleted, and approved
+*/
+WHERE ozpcenter_listing.is_enabled = {} AND
+      ozpcenter_listing.is_deleted = {} AND
+      ozpcenter_listing.approval_status = 'APPROVED' {}
+ORDER BY ozpcenter_listing.approved_date DESC;
+    '''.format(is_enabled, is_deleted, listing_ids_filter)
+    return sql_statement
+
+
+def build_listing_documents(listing_ids=None):
+    """
+    Build the storefront listing documents (listing dictionaries with related objects folded in)
+
+    Image urls are relative (see load_listing_document), is_bookmarked is added when read
+
+    Args:
+        listing_ids: only build these listing ids, None for all listings
+
+    Returns:
+        [listing dictionary, ...] ordered by approved_date DSC
+    """
+    mapping_dict = {}
+
+    cursor = connection.cursor()
+
+    cursor.execute(get_sql_statement(listing_ids))
+    rows = dictfetchall(cursor)
+
+    categories_set = set()
+    tags_set = set()
+    contacts_set = set()
+    profile_set = set()
+    intents_set = set()
+
+    for row in rows:
+        if row['id'] not in mapping_dict:
+            mapping_dict[row['id']] = {
+                "id": row['id'],
+                "unique_name": row['unique_name'],
+                "is_enabled": row['is_enabled'],
+                "is_private": bool(row['is_private']),
+
+                "required_listings_id": row['required_listings_id'],
+
+                "total_rate1": row['total_rate1'],
+                "total_rate2": row['total_rate2'],
+                "total_rate3": row['total_rate3'],
+                "total_rate4": row['total_rate4'],
+                "total_rate5": row['total_rate5'],
+                "avg_rate": row['avg_rate'],
+                "total_reviews": row['total_reviews'],
+                "total_votes": row['total_votes'],
+
+                "approved_date": row['approved_date'],
+
+                "requirements": row['requirements'],
+                "iframe_compatible": row['iframe_compatible'],
+
+                "what_is_new": row['what_is_new'],
+
+                "is_deleted": row['is_deleted'],
+                "security_marking": row['security_marking'],
+                "version_name": row['version_name'],
+                "approval_status": row['approval_status'],
+                "current_rejection_id": row['current_rejection_id'],
+                "is_featured": row['is_featured'],
+                "title": row['title'],
+                "description_short": row['description_short'],
+
+
+                "launch_url": row['launch_url'],
+                "edited_date": row['edited_date'],
+                "description": row['description'],
+
+                # One to One
+                "listing_type": {"title": row['listing_type_title']},
+
+                "agency": {'id': row['agency_id'],
+                           'title': row['agency_title'],
+                           'short_name': row['agency_short_name']},
+
+                "small_icon": {"id": row['small_icon_id'],
+                               'url': reverse('image-detail', args=[row['small_icon_id']]),
+                               "security_marking": row['small_icon_security_marking']},
+
+                "large_icon": {"id": row['large_icon_id'],
+                               'url': reverse('image-detail', args=[row['large_icon_id']]),
+                               "security_marking": row['large_icon_security_marking']},
+
+                "banner_icon": {"id": row['banner_icon_id'],
+                                'url': reverse('image-detail', args=[row['banner_icon_id']]),
+                                "security_marking": row['banner_icon_security_marking']},
+
+                "large_banner_icon": {"id": row['large_banner_icon_id'],
+                                      'url': reverse('image-detail', args=[row['large_banner_icon_id']]),
+                                      "security_marking": row['large_banner_icon_security_marking']},
+
+                "last_activity_id": row['last_activity_id']
+
+            }
+
+        # Many to Many
+        # Categorys
+
+        if not mapping_dict[row['id']].get('categories'):
+            mapping_dict[row['id']]['categories'] = {}
+        if row['category_id']:
+            current_data = {'title': row['category_title'], 'description': row['category_description']}
+            categories_set.add(row['category_id'])
+
+            if row['category_id'] not in mapping_dict[row['id']]['categories']:
+                mapping_dict[row['id']]['categories'][row['category_id']] = current_data
+
+        # Tags
+        if not mapping_dict[row['id']].get('tags'):
+            mapping_dict[row['id']]['tags'] = {}
+        if row['tag_id']:
+            current_data = {'name': row['tag_name']}
+            tags_set.add(row['tag_id'])
+
+            if row['tag_id'] not in mapping_dict[row['id']]['tags']:
+                mapping_dict[row['id']]['tags'][row['tag_id']] = current_data
+
+        # Contacts
+        if not mapping_dict[row['id']].get('contacts'):
+            mapping_dict[row['id']]['contacts'] = {}
+        if row['contact_id']:
+            current_data = {'id': row['contact_id'],
+                            'secure_phone': row['contact_secure_phone'],
+                            'unsecure_phone': row['contact_unsecure_phone'],
+                            'email': row['contact_email'],
+                            'name': row['contact_name'],
+                            'organization': row['contact_organization'],
+                            'contact_type': {'name': row['contact_type_name']}}
+            contacts_set.add(row['contact_id'])
+
+            if row['contact_id'] not in mapping_dict[row['id']]['contacts']:
+                mapping_dict[row['id']]['contacts'][row['contact_id']] = current_data
+
+        # Profile
+        if not mapping_dict[row['id']].get('owners'):
+            mapping_dict[row['id']]['owners'] = {}
+        if row['profile_id']:
+            current_data = {'display_name': row['owner_display_name'],
+                'user': {'username': row['owner_username']}}
+            profile_set.add(row['profile_id'])
+
+            if row['profile_id'] not in mapping_dict[row['id']]['owners']:
+                mapping_dict[row['id']]['owners'][row['profile_id']] = current_data
+
+        # Intent
+        if not mapping_dict[row['id']].get('intents'):
+            mapping_dict[row['id']]['intents'] = {}
+        if row['intent_id']:
+            intents_set.add(row['intent_id'])
+            if row['intent_id'] not in mapping_dict[row['id']]['intents']:
+                mapping_dict[row['id']]['intents'][row['intent_id']] = None
+
+    for profile_key in mapping_dict:
+        profile_map = mapping_dict[profile_key]
+        profile_map['owners'] = [profile_map['owners'][p_key] for p_key in profile_map['owners']]
+        profile_map['tags'] = [profile_map['tags'][p_key] for p_key in profile_map['tags']]
+        profile_map['categories'] = [profile_map['categories'][p_key] for p_key in profile_map['categories']]
+        profile_map['contacts'] = [profile_map['contacts'][p_key] for p_key in profile_map['contacts']]
+        profile_map['intents'] = [profile_map['intents'][p_key] for p_key in profile_map['intents']]
+
+    return [mapping_dict[listing_id] for listing_id in mapping_dict]
+
+
+def dump_listing_document(listing_document):
+    """
+    Serialize a listing dictionary (build_listing_documents) to JSON
+    """
+    listing_document = dict(listing_document)
+    for field in DATETIME_FIELDS:
+        if listing_document[field] is not None and not isinstance(listing_document[field], str):
+            listing_document[field] = listing_document[field].isoformat()
+    # Sorted keys so that an unchanged listing gives the same JSON (see models.refresh_storefront_listing_documents)
+    return json.dumps(listing_document, sort_keys=True)
+
+
+def load_listing_document(document, request):
+    """
+    Deserialize a listing dictionary, image urls are made absolute for the request
+    """
+    listing_document = json.loads(document)
+    for field in DATETIME_FIELDS:
+        if listing_document[field] is not None:
+            listing_document[field] = parse_datetime(listing_document[field])
+    for field in ICON_FIELDS:
+        listing_document[field]['url'] = request.build_absolute_uri(listing_document[field]['url'])
+    return listing_document
@@ -28,386 +28,160 @@ FROM ozpcenter_profile
 
 ORDER BY profile_username, role_priority
 """
+import hashlib
+import json
 import logging
 
-from django.core.urlresolvers import reverse
-from django.db import connection
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Count
+from django.db.models import Q
 from django.db.models.functions import Lower
 
 import msgpack
 
 import ozpcenter.api.listing.serializers as listing_serializers
+from ozpcenter import constants
 from ozpcenter import models
+from ozpcenter import utils
+from ozpcenter.api.storefront import listing_documents
 from ozpcenter.pipe import pipes
 from ozpcenter.pipe import pipeline
+from ozpcenter.recommend import listing_similarity
 from ozpcenter.recommend import recommend_utils
 
 # Get an instance of a logger
 logger = logging.getLogger('ozp-center.' + str(__name__))
 
 
-def dictfetchall(cursor):
-    "Returns all rows from a cursor as a dict"
-    desc = cursor.description
-    return [
-        dict(zip([col[0] for col in desc], row))
-        for row in cursor.fetchall()
-    ]
+def get_user_listings(username, request, visible_org_ids=None):
+    """
+    Get User listings
 
+    Read from the storefront listing documents (models.StorefrontListingDocument)
 
-def get_sql_statement():
-    schema_class_str = str(connection.SchemaEditorClass)
-    is_deleted = None
-    is_enabled = None
+    The documents do not contain is_bookmarked, it is added per request by get_storefront_new
 
-    if 'sqlite' in schema_class_str:
-        is_deleted = '0'
-        is_enabled = '1'
-    elif 'postgres' in schema_class_str:
-        is_deleted = 'False'
-        is_enabled = 'True'
-    else:
-        raise Exception('Get SQL Statment ENGINE Error')
-
-    sql_statement = '''
-SELECT DISTINCT
-  ozpcenter_listing.id,
-  ozpcenter_listing.title,
-  ozpcenter_listing.approved_date,
-  ozpcenter_listing.edited_date,
-  ozpcenter_listing.description,
-  ozpcenter_listing.launch_url,
-  ozpcenter_listing.version_name,
-  ozpcenter_listing.unique_name,
-  ozpcenter_listing.what_is_new,
-  ozpcenter_listing.requirements,
-  ozpcenter_listing.description_short,
-  ozpcenter_listing.approval_status,
-  ozpcenter_listing.is_enabled,
-  ozpcenter_listing.is_featured,
-  ozpcenter_listing.avg_rate,
-  ozpcenter_listing.total_rate1,
-  ozpcenter_listing.total_rate2,
-  ozpcenter_listing.total_rate3,
-  ozpcenter_listing.total_rate4,
-  ozpcenter_listing.total_rate5,
-  ozpcenter_listing.total_votes,
-  ozpcenter_listing.total_reviews,
-  ozpcenter_listing.iframe_compatible,
-  ozpcenter_listing.security_marking,
-  ozpcenter_listing.is_private,
-  ozpcenter_listing.current_rejection_id,
-  ozpcenter_listing.last_activity_id,
-  ozpcenter_listing.listing_type_id,
-  ozpcenter_listing.required_listings_id,
-  ozpcenter_listing.is_deleted,
-
-  /* One to Many */
-  ozpcenter_listing.listing_type_id,
-  ozpcenter_listingtype.title listing_type_title,
-
-  /* One to Many Images*/
-  ozpcenter_listing.agency_id agency_id,
-  ozpcenter_agency.title agency_title,
-  ozpcenter_agency.short_name agency_short_name,
-
-  ozpcenter_listing.small_icon_id,
-  small_icon.security_marking small_icon_security_marking,
-
-  ozpcenter_listing.large_icon_id,
-  large_icon.security_marking large_icon_security_marking,
-
-  ozpcenter_listing.banner_icon_id,
-  banner_icon.security_marking banner_icon_security_marking,
-
-  ozpcenter_listing.large_banner_icon_id,
-  large_banner_icon.security_marking large_banner_icon_security_marking,
-
-  /* Many to Many */
-  /* Category */
-  category_listing.category_id,
-  ozpcenter_category.title category_title,
-  ozpcenter_category.description category_description,
-
-  /* Contact */
-  contact_listing.contact_id contact_id,
-  ozpcenter_contact.contact_type_id contact_type_id, /* Check to see if contact_id and contact_type_id is correct*/
-  ozpcenter_contacttype.name contact_type_name,
-  ozpcenter_contact.secure_phone contact_secure_phone,
-  ozpcenter_contact.unsecure_phone contact_unsecure_phone,
-  ozpcenter_contact.email contact_email,
-  ozpcenter_contact.name contact_name,
-  ozpcenter_contact.organization contact_organization,
-
-  /* Tags */
-  tag_listing.tag_id,
-  ozpcenter_tag.name tag_name,
-
-  /* Owners */
-  owners.profile_id,
-  owner_profile.display_name owner_display_name,
-  owner_profile.user_id owner_user_id,
-  owner_user.username owner_username,
-
-  /* Intents */
-  intent_listing.intent_id,
-  ozpcenter_intent.action intent_action,
-
-  /* Bookmarks */
-  lib_entries.bookmark_count
-FROM
-  ozpcenter_listing
-/* One to Many Joins */
-JOIN ozpcenter_agency ON (ozpcenter_listing.agency_id = ozpcenter_agency.id)
-JOIN ozpcenter_listingtype ON (ozpcenter_listingtype.id = ozpcenter_listing.listing_type_id)
-JOIN ozpcenter_image small_icon ON (small_icon.id = ozpcenter_listing.small_icon_id)
-JOIN ozpcenter_image large_icon ON (large_icon.id = ozpcenter_listing.small_icon_id)
-JOIN ozpcenter_image banner_icon ON (banner_icon.id = ozpcenter_listing.small_icon_id)
-JOIN ozpcenter_image large_banner_icon ON (large_banner_icon.id = ozpcenter_listing.small_icon_id)
-/* Many to Many Joins */
-
-/* Categories */
-LEFT JOIN category_listing ON (category_listing.listing_id = ozpcenter_listing.id)
-LEFT JOIN ozpcenter_category on (category_listing.category_id = ozpcenter_category.id)
-
-/* Contacts */
-LEFT JOIN contact_listing ON (contact_listing.listing_id = ozpcenter_listing.id)
-LEFT JOIN ozpcenter_contact on (contact_listing.contact_id = ozpcenter_contact.id)
-LEFT JOIN ozpcenter_contacttype on (ozpcenter_contact.contact_type_id = ozpcenter_contacttype.id)
-
-/* Tags */
-LEFT JOIN tag_listing ON (tag_listing.listing_id = ozpcenter_listing.id)
-LEFT JOIN ozpcenter_tag ON (tag_listing.tag_id = ozpcenter_tag.id)
-
-/* Owners */
-LEFT JOIN profile_listing owners ON (owners.listing_id = ozpcenter_listing.id)
-LEFT JOIN ozpcenter_profile owner_profile ON (owners.profile_id = owner_profile.id)
-LEFT JOIN auth_user owner_user ON (owner_profile.user_id = owner_user.id)
-
-/* Intent */
-LEFT JOIN intent_listing ON (intent_listing.listing_id = ozpcenter_listing.id)
-LEFT JOIN ozpcenter_intent ON (intent_listing.intent_id = ozpcenter_intent.id)
-
-/* Bookmarks */
-LEFT JOIN (SELECT ozpcenter_applicationlibraryentry.listing_id, count(ozpcenter_applicationlibraryentry.listing_id) bookmark_count
-           FROM ozpcenter_applicationlibraryentry
-           GROUP BY ozpcenter_applicationlibraryentry.listing_id) lib_entries ON (lib_entries.listing_id = ozpcenter_listing.id)
-/*
-Get Listings that are enabled, not deleted, and approved
-*/
-WHERE ozpcenter_listing.is_enabled = {} AND
-      ozpcenter_listing.is_deleted = {} AND
-      ozpcenter_listing.approval_status = 'APPROVED'
-ORDER BY ozpcenter_listing.approved_date DESC;
-    '''.format(is_enabled, is_deleted)
-    return sql_statement
-
-
-def get_user_listings(username, request, exclude_orgs=None):
-    """
-    Get User listings
+    Args:
+        username
+        request
+        visible_org_ids: ids of the agencies whose private listings are included, None to include all
 
     Returns:
         Python object of listings
     """
-    exclude_orgs = exclude_orgs or []
+    documents = models.StorefrontListingDocument.objects.order_by('-approved_date')
+    if visible_org_ids is not None:
+        documents = documents.filter(Q(is_private=False) | Q(agency__in=list(visible_org_ids)))
 
-    mapping_dict = {}
+    return [listing_documents.load_listing_document(document, request)
+            for document in documents.values_list('document', flat=True)]
 
-    cursor = connection.cursor()
 
-    cursor.execute(get_sql_statement())
-    rows = dictfetchall(cursor)
+def get_visibility_class(profile):
+    """
+    Get the private listing visibility class of a profile, profiles in the same class see the same private listings
 
-    categories_set = set()
-    tags_set = set()
-    contacts_set = set()
-    profile_set = set()
-    intents_set = set()
+    Args:
+        profile: Profile or UserContext
+
+    Returns:
+        None if the profile can see all private listings, otherwise the sorted ids of the agencies whose
+        private listings the profile can see
+    """
+    visible_org_ids = models.get_user_context(profile).visible_org_ids
+    if visible_org_ids is None:
+        return None
+    return sorted(visible_org_ids)
+
+
+def get_storefront_snapshot(profile, request):
+    """
+    Get the storefront listings (get_user_listings) visible to the visibility class of the profile
+
+    Snapshots are shared by all the profiles of a visibility class, the cache key contains the listing data
+    version (bumped by the Listing, Agency, Category, ... signals) so a snapshot is only built once per version.
+    Security marking filtering and bookmark status are applied per user on top of the snapshot.
+
+    Args:
+        profile: Profile or UserContext
+        request: request
+
+    Returns:
+        [listing dictionary, ...] ordered by approved_date DSC
+    """
+    user_context = models.get_user_context(profile)
+    visibility_class = get_visibility_class(user_context)
+    # Image urls are absolute, snapshots are built per host
+    visibility_class_hash = hashlib.md5(json.dumps([visibility_class, request.build_absolute_uri('/')]).encode('utf-8')).hexdigest()
+
+    listing_version = utils.get_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+    cache_key = 'storefront_snapshot-{0}-{1}'.format(listing_version, visibility_class_hash)
+
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        snapshot = get_user_listings(user_context.username, request, visibility_class)
+        cache.set(cache_key, snapshot, timeout=settings.GLOBAL_SECONDS_TO_CACHE_DATA)
+    return snapshot
 
-    for row in rows:
-        if row['id'] not in mapping_dict:
-            mapping_dict[row['id']] = {
-                "id": row['id'],
-                "unique_name": row['unique_name'],
-                "is_enabled": row['is_enabled'],
-                "is_private": row['is_private'],
-
-                "required_listings_id": row['required_listings_id'],
-
-                "total_rate1": row['total_rate1'],
-                "total_rate2": row['total_rate2'],
-                "total_rate3": row['total_rate3'],
-                "total_rate4": row['total_rate4'],
-                "total_rate5": row['total_rate5'],
-                "avg_rate": row['avg_rate'],
-                "total_reviews": row['total_reviews'],
-                "total_votes": row['total_votes'],
-
-                "approved_date": row['approved_date'],
-
-                "requirements": row['requirements'],
-                "iframe_compatible": row['iframe_compatible'],
-
-                "what_is_new": row['what_is_new'],
-
-                "is_deleted": row['is_deleted'],
-                "security_marking": row['security_marking'],
-                "version_name": row['version_name'],
-                "approval_status": row['approval_status'],
-                "current_rejection_id": row['current_rejection_id'],
-                "is_featured": row['is_featured'],
-                "title": row['title'],
-                "description_short": row['description_short'],
-
-
-                "launch_url": row['launch_url'],
-                "edited_date": row['edited_date'],
-                "description": row['description'],
-
-                # One to One
-                "listing_type": {"title": row['listing_type_title']},
-
-                "agency": {'title': row['agency_title'],
-                           'short_name': row['agency_short_name']},
-
-                "small_icon": {"id": row['small_icon_id'],
-                               'url': request.build_absolute_uri(reverse('image-detail', args=[row['small_icon_id']])),
-                               "security_marking": row['small_icon_security_marking']},
-
-                "large_icon": {"id": row['large_icon_id'],
-                               'url': request.build_absolute_uri(reverse('image-detail', args=[row['large_icon_id']])),
-                               "security_marking": row['large_icon_security_marking']},
-
-                "banner_icon": {"id": row['banner_icon_id'],
-                                'url': request.build_absolute_uri(reverse('image-detail', args=[row['banner_icon_id']])),
-                                "security_marking": row['banner_icon_security_marking']},
-
-                "large_banner_icon": {"id": row['large_banner_icon_id'],
-                                      'url': request.build_absolute_uri(reverse('image-detail', args=[row['large_banner_icon_id']])),
-                                      "security_marking": row['large_banner_icon_security_marking']},
-
-                "last_activity_id": row['last_activity_id']
-
-            }
-
-            if row['bookmark_count']:
-                mapping_dict[row['id']]['is_bookmarked'] = True
-            else:
-                mapping_dict[row['id']]['is_bookmarked'] = False
-
-        # Many to Many
-        # Categorys
-
-        if not mapping_dict[row['id']].get('categories'):
-            mapping_dict[row['id']]['categories'] = {}
-        if row['category_id']:
-            current_data = {'title': row['category_title'], 'description': row['category_description']}
-            categories_set.add(row['category_id'])
-
-            if row['category_id'] not in mapping_dict[row['id']]['categories']:
-                mapping_dict[row['id']]['categories'][row['category_id']] = current_data
-
-        # Tags
-        if not mapping_dict[row['id']].get('tags'):
-            mapping_dict[row['id']]['tags'] = {}
-        if row['tag_id']:
-            current_data = {'name': row['tag_name']}
-            tags_set.add(row['tag_id'])
-
-            if row['tag_id'] not in mapping_dict[row['id']]['tags']:
-                mapping_dict[row['id']]['tags'][row['tag_id']] = current_data
-
-        # Contacts
-        if not mapping_dict[row['id']].get('contacts'):
-            mapping_dict[row['id']]['contacts'] = {}
-        if row['contact_id']:
-            current_data = {'id': row['contact_id'],
-                            'secure_phone': row['contact_secure_phone'],
-                            'unsecure_phone': row['contact_unsecure_phone'],
-                            'email': row['contact_email'],
-                            'name': row['contact_name'],
-                            'organization': row['contact_organization'],
-                            'contact_type': {'name': row['contact_type_name']}}
-            contacts_set.add(row['contact_id'])
-
-            if row['contact_id'] not in mapping_dict[row['id']]['contacts']:
-                mapping_dict[row['id']]['contacts'][row['contact_id']] = current_data
-
-        # Profile
-        if not mapping_dict[row['id']].get('owners'):
-            mapping_dict[row['id']]['owners'] = {}
-        if row['profile_id']:
-            current_data = {'display_name': row['owner_display_name'],
-                'user': {'username': row['owner_username']}}
-            profile_set.add(row['profile_id'])
-
-            if row['profile_id'] not in mapping_dict[row['id']]['owners']:
-                mapping_dict[row['id']]['owners'][row['profile_id']] = current_data
-
-        # Intent
-        if not mapping_dict[row['id']].get('intents'):
-            mapping_dict[row['id']]['intents'] = {}
-        if row['intent_id']:
-            intents_set.add(row['intent_id'])
-            if row['intent_id'] not in mapping_dict[row['id']]['intents']:
-                mapping_dict[row['id']]['intents'][row['intent_id']] = None
-
-    for profile_key in mapping_dict:
-        profile_map = mapping_dict[profile_key]
-        profile_map['owners'] = [profile_map['owners'][p_key] for p_key in profile_map['owners']]
-        profile_map['tags'] = [profile_map['tags'][p_key] for p_key in profile_map['tags']]
-        profile_map['categories'] = [profile_map['categories'][p_key] for p_key in profile_map['categories']]
-        profile_map['contacts'] = [profile_map['contacts'][p_key] for p_key in profile_map['contacts']]
-        profile_map['intents'] = [profile_map['intents'][p_key] for p_key in profile_map['intents']]
-
-    output_list = []
-
-    for listing_id in mapping_dict:
-        listing_values = mapping_dict[listing_id]
-
-        if listing_values['is_private'] is True:
-            if listing_values['agency']['title'] not in exclude_orgs:
-                output_list.append(listing_values)
-        else:
-            output_list.append(listing_values)
 
-    return output_list
+def get_recommendation_listing_ids(profile_instance, include_entry_data=True):
+    """
+    Get recommended listing ids for profile
+
+    The combined top recommendations are read from RecommendationsEntry.recommendation_top_n (pre-sorted by
+    the recommendation job), the recommendation_data of each recommender is only unpacked when
+    include_entry_data is True (or for entries saved before recommendation_top_n existed)
 
+    When the profile has no stored RecommendationsEntry (new user) or it is stale (bookmarks/reviews
+    changed since the last recommendation run), recommendations scored at request time from the listing
+    similarity table are added under listing_similarity.FRIENDLY_NAME
 
-def get_recommendation_listing_ids(profile_instance):
+    Returns:
+        (listing_ids_list, recommended_entry_data)
+        recommended_entry_data is {} when include_entry_data is False
+    """
     # Get Recommended Listings for owner
-    target_profile_recommended_entry = models.RecommendationsEntry.objects.filter(target_profile=profile_instance).first()
+    recommendations_entry = models.RecommendationsEntry.objects.filter(target_profile=profile_instance)
 
     recommended_entry_data = {}
-    if target_profile_recommended_entry:
-        recommendation_data = target_profile_recommended_entry.recommendation_data
-        if recommendation_data:
-            recommended_entry_data = msgpack.unpackb(recommendation_data, encoding='utf-8')
-
-    recommendation_combined_dict = {'profile': {}}
+    combined_recommendations = []
 
-    for recommender_friendly_name in recommended_entry_data:
-        recommender_name_data = recommended_entry_data[recommender_friendly_name]
-        # print(recommender_name_data)
-        recommender_name_weight = recommender_name_data['weight']
-        recommender_name_recommendations = recommender_name_data['recommendations']
+    recommendation_top_n = None
+    if not include_entry_data:
+        recommendation_top_n = recommendations_entry.values_list('recommendation_top_n', flat=True).first()
 
-        for recommendation_tuple in recommender_name_recommendations:
-            current_listing_id = recommendation_tuple[0]
-            current_listing_score = recommendation_tuple[1]
+    if recommendation_top_n is not None:
+        combined_recommendations = recommend_utils.unpack_top_n_scores(recommendation_top_n)
+    else:
+        recommendation_data = recommendations_entry.values_list('recommendation_data', flat=True).first()
+        if recommendation_data:
+            recommended_entry_data = msgpack.unpackb(recommendation_data, encoding='utf-8')
+            combined_recommendations = recommend_utils.combine_recommendations(recommended_entry_data)
 
-            if current_listing_id in recommendation_combined_dict['profile']:
-                recommendation_combined_dict['profile'][current_listing_id] = recommendation_combined_dict['profile'][current_listing_id] + (current_listing_score * recommender_name_weight)
-            else:
-                recommendation_combined_dict['profile'][current_listing_id] = current_listing_score * recommender_name_weight
+    is_stale = models.RecommendationsDirtyEntry.objects.filter(profile_id=profile_instance.id).exists()
+    if not combined_recommendations or is_stale:
+        online_recommendations = {
+            'recommendations': listing_similarity.get_online_recommendations(profile_instance.id),
+            'weight': listing_similarity.RECOMMENDATION_WEIGHT
+        }
 
-    sorted_recommendations_combined_dict = recommend_utils.get_top_n_score(recommendation_combined_dict, 40)
-    # sorted_recommendations_combined_dict = {'profile': [[11, 8.5], [112, 8.0], [85, 7.0], [86, 7.0], [87, 7.0],
+        if recommended_entry_data:
+            recommended_entry_data[listing_similarity.FRIENDLY_NAME] = online_recommendations
+            combined_recommendations = recommend_utils.combine_recommendations(recommended_entry_data)
+        else:
+            # Scores read from recommendation_top_n are already weighted
+            combined_recommendations = recommend_utils.combine_recommendations({
+                'Stored': {'recommendations': combined_recommendations, 'weight': 1.0},
+                listing_similarity.FRIENDLY_NAME: online_recommendations
+            })
+            if include_entry_data:
+                recommended_entry_data[listing_similarity.FRIENDLY_NAME] = online_recommendations
+
+    # combined_recommendations = [[11, 8.5], [112, 8.0], [85, 7.0], [86, 7.0], [87, 7.0],
     #    [88, 7.0], [89, 7.0], [90, 7.0], [81, 6.0], [62, 6.0],
-    #    [21, 5.5], [1, 5.0], [113, 5.0], [111, 5.0], [114, 5.0], [64, 4.0], [66, 4.0], [68, 4.0], [70, 4.0], [72, 4.0]]}
-    listing_ids_list = [entry[0] for entry in sorted_recommendations_combined_dict['profile']]
+    #    [21, 5.5], [1, 5.0], [113, 5.0], [111, 5.0], [114, 5.0], [64, 4.0], [66, 4.0], [68, 4.0], [70, 4.0], [72, 4.0]]
+    listing_ids_list = [entry[0] for entry in combined_recommendations]
     return listing_ids_list, recommended_entry_data
 
 
@@ -431,24 +205,20 @@ def get_storefront_new(username, request):
         }
     """
     extra_data = {}
-    profile = models.Profile.objects.get(user__username=username)
+    user_context = models.get_user_context(username)
+    profile = user_context.profile
 
-    if profile.highest_role() == 'APPS_MALL_STEWARD':
-        exclude_orgs = []
-    elif profile.highest_role() == 'ORG_STEWARD':
-        user_orgs = profile.stewarded_organizations.all()
-        user_orgs = [i.title for i in user_orgs]
-        exclude_orgs = [agency.title for agency in models.Agency.objects.exclude(title__in=user_orgs)]
-    else:
-        user_orgs = profile.organizations.all()
-        user_orgs = [i.title for i in user_orgs]
-        exclude_orgs = [agency.title for agency in models.Agency.objects.exclude(title__in=user_orgs)]
+    current_listings = get_storefront_snapshot(user_context, request)
 
-    current_listings = get_user_listings(username, request, exclude_orgs)
+    # Bookmark status is read per request so bookmarks do not invalidate snapshots
+    # (a listing is bookmarked when any profile bookmarked it)
+    bookmarked_listing_ids = set(models.ApplicationLibraryEntry.objects.values_list('listing_id', flat=True).distinct())
+    current_listings = [dict(current_listing, is_bookmarked=current_listing['id'] in bookmarked_listing_ids)
+                        for current_listing in current_listings]
 
     # Get Recommended Listings for owner
     if profile.is_beta_user():
-        recommendation_listing_ids, recommended_entry_data = get_recommendation_listing_ids(profile)
+        recommendation_listing_ids, recommended_entry_data = get_recommendation_listing_ids(profile, include_entry_data=False)
         listing_ids_list = set(recommendation_listing_ids)
 
         recommended_listings_raw = []
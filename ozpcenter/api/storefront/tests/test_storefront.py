@@ -1,10 +1,19 @@
 """
 Utils tests
 """
+from unittest.mock import patch
+
+import msgpack
 from django.test import override_settings
+from django.test import RequestFactory
 from django.test import TestCase
 
+from ozpcenter import constants
 from ozpcenter import models
+from ozpcenter import utils
+from ozpcenter.api.storefront import listing_documents
+from ozpcenter.recommend import listing_similarity
+from ozpcenter.recommend import recommend_utils
 from ozpcenter.scripts import sample_data_generator as data_gen
 import ozpcenter.api.storefront.model_access as model_access
 
@@ -47,6 +56,27 @@ class StorefrontTest(TestCase):
         for i in data['most_popular']:
             self.assertEqual(i.approval_status, models.Listing.APPROVED)
 
+    def test_get_storefront_snapshot(self):
+        """
+        test for model_access.get_storefront_snapshot()
+        """
+        request = RequestFactory().get('/api/storefront/')
+        profile = models.Profile.objects.get(user__username='wsmith')
+
+        visibility_class = model_access.get_visibility_class(profile)
+        self.assertEqual(visibility_class, sorted(agency.id for agency in profile.stewarded_organizations.all()))
+        expected_listing_ids = [listing['id'] for listing in model_access.get_user_listings('wsmith', request, visibility_class)]
+
+        snapshot = model_access.get_storefront_snapshot(profile, request)
+        self.assertEqual([listing['id'] for listing in snapshot], expected_listing_ids)
+        # Bookmark status is added per request, not stored in the shared snapshot
+        self.assertFalse([listing for listing in snapshot if 'is_bookmarked' in listing])
+
+        # Listing changes bump the listing data version
+        listing_version = utils.get_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+        models.Listing.objects.get(title='Air Mail').save()
+        self.assertNotEqual(utils.get_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY), listing_version)
+
     def test_get_metadata(self):
         """
         test for model_access.get_metadata()
@@ -76,3 +106,109 @@ class StorefrontTest(TestCase):
         keys = list(listing_types[0].keys()).sort()
         expected_keys = ['title', 'description'].sort()
         self.assertEqual(keys, expected_keys)
+
+    def test_storefront_listing_documents(self):
+        """
+        test that the storefront listing documents follow listing changes
+        """
+        request = RequestFactory().get('/api/storefront/')
+        built_listing_ids = [document['id'] for document in listing_documents.build_listing_documents()]
+        self.assertEqual(sorted(models.StorefrontListingDocument.objects.values_list('listing_id', flat=True)), sorted(built_listing_ids))
+
+        listing = models.Listing.objects.get(title='Air Mail')
+        tag, created = models.Tag.objects.get_or_create(name='document_tag')
+        listing.tags.add(tag)
+
+        listing_document = [document for document in model_access.get_user_listings('bigbrother', request) if document['id'] == listing.id][0]
+        self.assertIn({'name': 'document_tag'}, listing_document['tags'])
+        self.assertTrue(listing_document['small_icon']['url'].startswith('http://'))
+
+        listing.is_enabled = False
+        listing.save()
+        self.assertFalse(models.StorefrontListingDocument.objects.filter(listing=listing).exists())
+
+    def test_storefront_listing_documents_refresh_scope(self):
+        """
+        test that related object changes only rebuild the documents of their listings
+        """
+        listing = models.Listing.objects.get(title='Air Mail')
+        tag, created = models.Tag.objects.get_or_create(name='document_tag')
+        listing.tags.add(tag)
+
+        with patch('ozpcenter.models.listing_documents.build_listing_documents',
+                   wraps=listing_documents.build_listing_documents) as build_listing_documents:
+            tag.listings.clear()
+            build_listing_documents.assert_called_once_with({listing.id})
+
+            listing.tags.add(tag)
+            build_listing_documents.reset_mock()
+            tag.delete()
+            build_listing_documents.assert_called_once_with({listing.id})
+
+            # Fields that are not in the document do not rebuild it
+            build_listing_documents.reset_mock()
+            listing.save(update_fields=['total_review_responses'])
+            self.assertFalse(build_listing_documents.called)
+
+        listing_document = models.StorefrontListingDocument.objects.get(listing=listing)
+        self.assertNotIn('document_tag', listing_document.document)
+
+        # Unchanged documents are not written again
+        self.assertFalse(models.refresh_storefront_listing_documents([listing.id]))
+
+    def test_get_recommendation_listing_ids_stale_profile(self):
+        """
+        test that new and stale profiles get recommendations scored from the listing similarity table
+        """
+        profile = models.Profile.objects.get(user__username='bigbrother')
+        models.RecommendationsEntry.objects.filter(target_profile=profile).delete()
+        models.RecommendationsDirtyEntry.objects.all().delete()
+        listing_similarity.save_listing_similarities()
+
+        online_listing_ids = [listing_id for listing_id, score in listing_similarity.get_online_recommendations(profile.id)]
+        self.assertTrue(online_listing_ids)
+
+        # New profile: no stored recommendations
+        listing_ids, recommended_entry_data = model_access.get_recommendation_listing_ids(profile)
+        self.assertEqual(sorted(listing_ids), sorted(online_listing_ids))
+        self.assertIn(listing_similarity.FRIENDLY_NAME, recommended_entry_data)
+
+        # Stale profile: stored recommendations combined with the online recommendations
+        stored_listing_id = models.Listing.objects.exclude(id__in=online_listing_ids).order_by('id').first().id
+        stored_recommendations = [[stored_listing_id, 100.0]]
+        models.RecommendationsEntry.objects.create(
+            target_profile=profile,
+            recommendation_data=msgpack.packb({'Stored Recommender': {'weight': 1.0, 'recommendations': stored_recommendations}}),
+            recommendation_top_n=recommend_utils.pack_top_n_scores(stored_recommendations))
+        models.RecommendationsDirtyEntry.mark_dirty(profile_id=profile.id)
+
+        listing_ids, recommended_entry_data = model_access.get_recommendation_listing_ids(profile, include_entry_data=False)
+        self.assertEqual(listing_ids[0], stored_listing_id)
+        self.assertEqual(sorted(listing_ids[1:]), sorted(online_listing_ids))
+        self.assertEqual(recommended_entry_data, {})
+
+    def test_get_recommendation_listing_ids_stored(self):
+        """
+        test that profiles with up to date stored recommendations are not scored at request time
+        """
+        profile = models.Profile.objects.get(user__username='bigbrother')
+        models.RecommendationsEntry.objects.filter(target_profile=profile).delete()
+        models.RecommendationsDirtyEntry.objects.all().delete()
+
+        stored_recommendations = [[listing_id, 10.0 - index] for index, listing_id in
+                                  enumerate(models.Listing.objects.order_by('id').values_list('id', flat=True)[:3])]
+        models.RecommendationsEntry.objects.create(
+            target_profile=profile,
+            recommendation_data=msgpack.packb({'Stored Recommender': {'weight': 1.0, 'recommendations': stored_recommendations}}),
+            recommendation_top_n=recommend_utils.pack_top_n_scores(stored_recommendations))
+
+        with patch('ozpcenter.recommend.listing_similarity.get_online_recommendations') as get_online_recommendations:
+            listing_ids, recommended_entry_data = model_access.get_recommendation_listing_ids(profile, include_entry_data=False)
+            self.assertEqual(listing_ids, [listing_id for listing_id, score in stored_recommendations])
+            self.assertEqual(recommended_entry_data, {})
+
+            listing_ids, recommended_entry_data = model_access.get_recommendation_listing_ids(profile)
+            self.assertEqual(listing_ids, [listing_id for listing_id, score in stored_recommendations])
+            self.assertEqual(list(recommended_entry_data.keys()), ['Stored Recommender'])
+
+            self.assertFalse(get_online_recommendations.called)
@@ -34,3 +34,9 @@ ES_BOOST_TITLE = 10
 ES_BOOST_DESCRIPTION = 3
 ES_BOOST_DESCRIPTION_SHORT = 3
 ES_BOOST_TAGS = 1
+
+# Cache version counter of the storefront listing snapshots, bumped when listing data changes
+STOREFRONT_LISTING_VERSION_KEY = 'storefront_listing_version'
+
+# Cache version counter of the Elasticsearch search/suggest results, bumped when the listing index changes
+ES_LISTING_INDEX_GENERATION_KEY = 'es_listing_index_generation'
@@ -0,0 +1,157 @@
+"""
+Local (in-process) Cache
+
+Bounded TTL + LRU cache kept in the memory of each process, used in front of the Django cache / database for
+hot lookups (access control, profiles) that are done many times in a single request.
+
+Invalidation across processes:
+    Every LocalCache has a version counter stored in the Django cache (Redis), entries are tagged with the
+    version they were set with. invalidate() bumps the counter, other processes read the counter at most
+    every LOCAL_CACHE_VERSION_CHECK_SECONDS seconds, so an invalidation takes effect everywhere within that delay.
+
+    invalidate_key(key) only invalidates one key: each key has its own version counter ('<version_key>-<key>'),
+    read at most every LOCAL_CACHE_VERSION_CHECK_SECONDS seconds per entry. A key counter is only kept for
+    the lifetime of the entries (timeout), older entries have expired anyway.
+
+Usage:
+    profile_cache = LocalCache('local_cache_version-profile')
+    profile = profile_cache.get(username)
+    if profile is None:
+        profile = ...
+        profile_cache.set(username, profile)
+"""
+from collections import OrderedDict
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ozpcenter import utils
+
+
+class LocalCache(object):
+    """
+    Bounded in-process TTL + LRU cache invalidated by a version counter in the Django cache
+    """
+
+    def __init__(self, version_key, max_size=None, timeout=None, version_check_seconds=None, copy_values=False):
+        """
+        Args:
+            version_key: Django cache key of the version counter
+            max_size: Max number of entries (least recently used entries are evicted first)
+            timeout: Seconds an entry is kept
+            version_check_seconds: Seconds between reads of the version counter
+            copy_values: Return deep copies of the values (for mutable values like model instances)
+        """
+        self.version_key = version_key
+        self.max_size = max_size or settings.LOCAL_CACHE_MAX_SIZE
+        self.timeout = timeout or settings.LOCAL_CACHE_SECONDS
+        self.version_check_seconds = version_check_seconds or settings.LOCAL_CACHE_VERSION_CHECK_SECONDS
+        self.copy_values = copy_values
+
+        self._entries = OrderedDict()  # key: (version, expires, key_version, key_version_expires, value)
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_expires = 0
+
+    def get_version(self):
+        """
+        Get the version counter, read from the Django cache at most every version_check_seconds
+        """
+        now = time.time()
+        if self._version is None or now >= self._version_expires:
+            self._version = utils.get_cache_version(self.version_key)
+            self._version_expires = now + self.version_check_seconds
+        return self._version
+
+    def get_key_version_key(self, key):
+        """
+        Django cache key of the version counter of a key
+        """
+        return '{}-{}'.format(self.version_key, key)
+
+    def get_key_version(self, key):
+        """
+        Get the version counter of a key from the Django cache (None if the key was not invalidated recently)
+        """
+        return cache.get(self.get_key_version_key(key))
+
+    def get(self, key, default=None):
+        version = self.get_version()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            entry_version, expires, key_version, key_version_expires, value = entry
+            if entry_version != version or now >= expires:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+
+        if now >= key_version_expires:
+            is_current = self.get_key_version(key) == key_version
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    if is_current:
+                        self._entries[key] = (entry_version, expires, key_version, now + self.version_check_seconds, value)
+                    else:
+                        del self._entries[key]
+            if not is_current:
+                return default
+
+        if self.copy_values:
+            return copy.deepcopy(value)
+        return value
+
+    def set(self, key, value):
+        version = self.get_version()
+        key_version = self.get_key_version(key)
+        if self.copy_values:
+            value = copy.deepcopy(value)
+
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (version, now + self.timeout, key_version, now + self.version_check_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """
+        Delete an entry of this process
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self):
+        """
+        Invalidate the entries of all processes
+        """
+        self._version = utils.bump_cache_version(self.version_key)
+        self._version_expires = time.time() + self.version_check_seconds
+
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate_key(self, key):
+        """
+        Invalidate the entry of a key in all processes
+        """
+        key_version_key = self.get_key_version_key(key)
+        try:
+            cache.incr(key_version_key)
+        except ValueError:
+            # Counter is not in the cache, start at the current time in milliseconds (see utils.get_cache_version)
+            cache.set(key_version_key, int(time.time() * 1000), timeout=self.timeout + self.version_check_seconds)
+
+        self.delete(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Profile instances by username (ozpcenter.model_access.get_profile), keys are invalidated when a profile is saved
+profile_local_cache = LocalCache('local_cache_version-profile', copy_values=True)
@@ -0,0 +1,37 @@
+"""
+Middleware
+
+RequestCacheMiddleware:
+    Keeps a dictionary for the duration of a request (thread local), used to memoize lookups that are done
+    many times while handling a single request (ex: models.get_user_context)
+"""
+import threading
+
+
+_request_local = threading.local()
+
+
+def get_request_cache():
+    """
+    Get the dictionary of the current request
+
+    Return:
+        dict, None outside of a request (scripts, tests calling managers directly)
+    """
+    return getattr(_request_local, 'cache', None)
+
+
+class RequestCacheMiddleware(object):
+    """
+    Create the request cache when a request starts and drop it when the response is returned
+    """
+
+    def process_request(self, request):
+        _request_local.cache = {}
+
+    def process_response(self, request, response):
+        _request_local.cache = None
+        return response
+
+    def process_exception(self, request, exception):
+        _request_local.cache = None
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import ozpcenter.utils
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ozpcenter', '0026_auto_20170912_1524'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationsDirtyEntry',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('profile_id', models.IntegerField(null=True, blank=True, db_index=True)),
+                ('listing_id', models.IntegerField(null=True, blank=True, db_index=True)),
+                ('created_date', models.DateTimeField(default=ozpcenter.utils.get_now_utc)),
+            ],
+            options={
+                'verbose_name_plural': 'recommendations dirty entries',
+            },
+        ),
+    ]
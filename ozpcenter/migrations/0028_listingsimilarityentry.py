@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ozpcenter', '0027_recommendationsdirtyentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingSimilarityEntry',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('listing_id', models.IntegerField(unique=True)),
+                ('similarity_data', models.BinaryField(default=None)),
+            ],
+            options={
+                'verbose_name_plural': 'listing similarity entries',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ozpcenter', '0028_listingsimilarityentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationsentry',
+            name='recommendation_top_n',
+            field=models.BinaryField(default=None, null=True),
+        ),
+    ]
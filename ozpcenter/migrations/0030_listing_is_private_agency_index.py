@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ozpcenter', '0029_recommendationsentry_recommendation_top_n'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='listing',
+            index_together=set([('is_private', 'agency')]),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+from ozpcenter.api.storefront import listing_documents
+
+
+def forwards(apps, schema_editor):
+    if not schema_editor.connection.alias == 'default':
+        return
+    # Build the documents of the existing listings
+    StorefrontListingDocument = apps.get_model('ozpcenter', 'StorefrontListingDocument')
+    StorefrontListingDocument.objects.bulk_create([
+        StorefrontListingDocument(listing_id=document['id'],
+                                  agency_id=document['agency']['id'],
+                                  is_private=document['is_private'],
+                                  approved_date=document['approved_date'],
+                                  document=listing_documents.dump_listing_document(document))
+        for document in listing_documents.build_listing_documents()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ozpcenter', '0030_listing_is_private_agency_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorefrontListingDocument',
+            fields=[
+                ('listing', models.OneToOneField(serialize=False, related_name='storefront_document', primary_key=True, to='ozpcenter.Listing')),
+                ('is_private', models.BooleanField(default=False)),
+                ('approved_date', models.DateTimeField(null=True, blank=True, db_index=True)),
+                ('document', models.TextField()),
+                ('agency', models.ForeignKey(related_name='+', to='ozpcenter.Agency')),
+            ],
+        ),
+        migrations.RunPython(forwards, reverse_code=migrations.RunPython.noop),
+    ]
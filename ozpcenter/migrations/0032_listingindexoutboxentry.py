@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import ozpcenter.utils
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ozpcenter', '0031_storefrontlistingdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingIndexOutboxEntry',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('listing_id', models.IntegerField()),
+                ('created_date', models.DateTimeField(default=ozpcenter.utils.get_now_utc)),
+            ],
+            options={
+                'verbose_name_plural': 'listing index outbox entries',
+            },
+        ),
+    ]
@@ -6,6 +6,7 @@ import logging
 from django.core.exceptions import ObjectDoesNotExist
 
 from ozpcenter import models
+from ozpcenter.local_cache import profile_local_cache
 
 
 # Get an instance of a logger
@@ -19,10 +20,35 @@ def get_profile(username):
     Args:
         username
 
+    Profiles are kept in profile_local_cache (reset by the Profile post_save signal)
+
     Return:
         Profile
     """
+    profile = profile_local_cache.get(username)
+    if profile is not None:
+        return profile
+
+    try:
+        profile = models.Profile.objects.select_related('user').get(user__username=username)
+    except ObjectDoesNotExist:
+        return None
+
+    profile_local_cache.set(username, profile)
+    return profile
+
+
+def get_user_context(username):
+    """
+    Get a User's UserContext (profile, role and organizations), memoized for the duration of the request
+
+    Args:
+        username
+
+    Return:
+        UserContext, None if the user has no Profile
+    """
     try:
-        return models.Profile.objects.get(user__username=username)
+        return models.get_user_context(username)
     except ObjectDoesNotExist:
         return None
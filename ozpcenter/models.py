@@ -18,15 +18,22 @@ from django.core.validators import MaxValueValidator
 from django.core.validators import MinValueValidator
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed
 from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
 from django.dispatch import receiver
-from rest_framework import serializers
+from django.utils.functional import cached_property
 
 from ozpcenter import constants
 from ozpcenter import utils
-from ozpcenter.api.listing import elasticsearch_util
-from plugins_util.plugin_manager import system_has_access_control
+from ozpcenter.local_cache import profile_local_cache
+from ozpcenter.middleware import get_request_cache
+from ozpcenter.api.storefront import listing_documents
+from plugins_util.plugin_manager import system_allowed_security_markings
+from plugins_util.plugin_manager import system_reset_allowed_security_markings
 from ozp.storage import media_storage
 
 
@@ -86,6 +93,159 @@ def post_delete_image_type(sender, instance, **kwargs):
     pass
 
 
+def filter_security_markings(username, queryset, field_name='security_marking'):
+    """
+    Filter a queryset to the rows with a security marking the user has access to
+
+    The distinct security markings of the queryset are checked with system_allowed_security_markings
+    (a single cache entry per user), then filtered with one field_name__in clause
+
+    Args:
+        username (str): username
+        queryset: queryset to filter
+        field_name (str): security marking field lookup (ex: listing__security_marking)
+    """
+    security_markings = queryset.order_by().values_list(field_name, flat=True).distinct()
+    allowed_security_markings = system_allowed_security_markings(username, security_markings)
+
+    security_marking_filter = Q(**{field_name + '__in': [marking for marking in allowed_security_markings if marking is not None]})
+    if None in allowed_security_markings:
+        security_marking_filter = security_marking_filter | Q(**{field_name + '__isnull': True})
+    return queryset.filter(security_marking_filter)
+
+
+class UserContext(object):
+    """
+    Profile, role and organizations of a user, used by the access control managers
+
+    Build it with get_user_context, the context is reused for the whole request. Attributes are
+    loaded on first access (a role check does not load the organizations)
+    """
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.username = profile.user.username
+
+    def __repr__(self):
+        return 'UserContext: {0!s}'.format(self.username)
+
+    @cached_property
+    def highest_role(self):
+        return self.profile.highest_role()
+
+    @cached_property
+    def organizations(self):
+        return list(self.profile.organizations.all())
+
+    @cached_property
+    def stewarded_organizations(self):
+        return list(self.profile.stewarded_organizations.all())
+
+    @cached_property
+    def organization_ids(self):
+        return [agency.id for agency in self.organizations]
+
+    @cached_property
+    def stewarded_organization_ids(self):
+        return [agency.id for agency in self.stewarded_organizations]
+
+    @property
+    def visible_organizations(self):
+        """
+        Agencies whose private listings the user can see, None for all agencies (APPS_MALL_STEWARD)
+        """
+        if self.highest_role == 'APPS_MALL_STEWARD':
+            return None
+        elif self.highest_role == 'ORG_STEWARD':
+            return self.stewarded_organizations
+        else:
+            return self.organizations
+
+    @cached_property
+    def exclude_organizations(self):
+        """
+        Agencies whose private listings the user can not see
+        """
+        visible_organizations = self.visible_organizations
+        if visible_organizations is None:
+            return []
+        return list(Agency.objects.exclude(id__in=[agency.id for agency in visible_organizations]))
+
+    @cached_property
+    def visible_org_ids(self):
+        """
+        Ids of the agencies whose private listings the user can see, None for all agencies (APPS_MALL_STEWARD)
+        """
+        visible_organizations = self.visible_organizations
+        if visible_organizations is None:
+            return None
+        return [agency.id for agency in visible_organizations]
+
+
+def filter_private_listings(user, queryset, field_prefix=''):
+    """
+    Filter a queryset to the listings the user can see based on private status
+
+        is_private = False OR agency_id IN (ids of the user's visible agencies)
+
+    The cost grows with the number of agencies of the user instead of the total number of agencies
+
+    Args:
+        user: username, Profile or UserContext
+        queryset: queryset to filter
+        field_prefix (str): lookup prefix of the listing (ex: listing__)
+    """
+    visible_org_ids = get_user_context(user).visible_org_ids
+    if visible_org_ids is None:
+        return queryset
+    return queryset.filter(Q(**{field_prefix + 'is_private': False}) |
+                           Q(**{field_prefix + 'agency__in': visible_org_ids}))
+
+
+def get_user_context_key(username):
+    return 'user_context-{0!s}'.format(username)
+
+
+def get_user_context(user):
+    """
+    Get the UserContext of a user, memoized for the duration of the request (ozpcenter.middleware.RequestCacheMiddleware)
+
+    Args:
+        user: username, Profile or UserContext
+
+    Raises:
+        Profile.DoesNotExist
+    """
+    if isinstance(user, UserContext):
+        return user
+
+    username = user.user.username if isinstance(user, Profile) else user
+    request_cache = get_request_cache()
+    key = get_user_context_key(username)
+
+    if request_cache is not None and key in request_cache:
+        return request_cache[key]
+
+    if isinstance(user, Profile):
+        profile = user
+    else:
+        profile = Profile.objects.select_related('user').get(user__username=username)
+    user_context = UserContext(profile)
+
+    if request_cache is not None:
+        request_cache[key] = user_context
+    return user_context
+
+
+def reset_user_context(username):
+    """
+    Drop the memoized UserContext of a user from the request cache
+    """
+    request_cache = get_request_cache()
+    if request_cache is not None:
+        request_cache.pop(get_user_context_key(username), None)
+
+
 class AccessControlImageManager(models.Manager):
     """
     Use a custom manager to control access to Images
@@ -111,16 +271,18 @@ class AccessControlImageManager(models.Manager):
         """
         Find more effective way to do exclude
         SELECT * FROM "ozpcenter_image"
+
+        Args:
+            username: username or UserContext
         """
         # get all images
         objects = super(AccessControlImageManager, self).get_queryset()
 
-        # filter out listings by user's access level
-        images_to_exclude = []
-        for i in objects:
-            if not system_has_access_control(username, i.security_marking):
-                images_to_exclude.append(i.id)
-        objects = objects.exclude(id__in=images_to_exclude)
+        if isinstance(username, UserContext):
+            username = username.username
+
+        # filter out images by user's access level
+        objects = filter_security_markings(username, objects)
 
         return objects
 
@@ -231,7 +393,10 @@ class Image(models.Model):
 
 @receiver(post_save, sender=Image)
 def post_save_image(sender, instance, created, **kwargs):
-    pass
+    if not created:
+        # security_marking of listing icons
+        refresh_storefront_listing_documents(Listing.objects.filter(
+            Q(small_icon=instance) | Q(large_icon=instance) | Q(banner_icon=instance) | Q(large_banner_icon=instance)).values_list('id', flat=True))
 
 
 @receiver(post_delete, sender=Image)
@@ -256,12 +421,18 @@ class Tag(models.Model):
 
 @receiver(post_save, sender=Tag)
 def post_save_tag(sender, instance, created, **kwargs):
-    pass
+    refresh_storefront_listing_documents(instance.listings.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def pre_delete_tag(sender, instance, **kwargs):
+    # tag_listing rows are deleted without m2m_changed signals
+    remember_storefront_listing_ids(instance, instance.listings.values_list('id', flat=True))
 
 
 @receiver(post_delete, sender=Tag)
 def post_delete_tag(sender, instance, **kwargs):
-    pass
+    refresh_remembered_storefront_listing_documents(instance)
 
 
 class Agency(models.Model):
@@ -291,11 +462,20 @@ class Agency(models.Model):
 @receiver(post_save, sender=Agency)
 def post_save_agency(sender, instance, created, **kwargs):
     cache.delete_pattern('metadata-*')
+    utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+    refresh_storefront_listing_documents(Listing.objects.filter(agency=instance).values_list('id', flat=True), bump_version=False)
+
+
+@receiver(pre_delete, sender=Agency)
+def pre_delete_agency(sender, instance, **kwargs):
+    remember_storefront_listing_ids(instance, Listing.objects.filter(agency=instance).values_list('id', flat=True))
 
 
 @receiver(post_delete, sender=Agency)
 def post_delete_agency(sender, instance, **kwargs):
     cache.delete_pattern('metadata-*')
+    utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+    refresh_remembered_storefront_listing_documents(instance, bump_version=False)
 
 
 class AccessControlApplicationLibraryEntryManager(models.Manager):
@@ -332,31 +512,15 @@ class AccessControlApplicationLibraryEntryManager(models.Manager):
         # get all listings
         objects = super(AccessControlApplicationLibraryEntryManager, self).get_queryset()
         # filter out private listings
-        user = Profile.objects.get(user__username=username)
-        if user.highest_role() == 'APPS_MALL_STEWARD':
-            exclude_orgs = []
-        elif user.highest_role() == 'ORG_STEWARD':
-            user_orgs = user.stewarded_organizations.all()
-            user_orgs = [i.title for i in user_orgs]
-            exclude_orgs = Agency.objects.exclude(title__in=user_orgs)
-        else:
-            user_orgs = user.organizations.all()
-            user_orgs = [i.title for i in user_orgs]
-            exclude_orgs = Agency.objects.exclude(title__in=user_orgs)
+        user_context = get_user_context(username)
 
-        objects = objects.filter(owner__user__username=username)
+        objects = objects.filter(owner=user_context.profile)
         objects = objects.filter(listing__is_enabled=True)
         objects = objects.filter(listing__is_deleted=False)
-        objects = objects.exclude(listing__is_private=True, listing__agency__in=exclude_orgs)
+        objects = filter_private_listings(user_context, objects, 'listing__')
         objects = self.apply_select_related(objects)
         # Filter out listings by user's access level
-        ids_to_exclude = []
-        for i in objects:
-            if not i.listing.security_marking:
-                logger.debug('Listing {0!s} has no security_marking'.format(i.listing.title))
-            if not system_has_access_control(username, i.listing.security_marking):
-                ids_to_exclude.append(i.listing.id)
-        objects = objects.exclude(listing__pk__in=ids_to_exclude)
+        objects = filter_security_markings(user_context.username, objects, 'listing__security_marking')
         return objects
 
     def for_user_organization_minus_security_markings(self, username, filter_for_user=False):
@@ -366,23 +530,11 @@ class AccessControlApplicationLibraryEntryManager(models.Manager):
         # get all listings
         objects = super(AccessControlApplicationLibraryEntryManager, self).get_queryset()
         # filter out private listings
-        user = Profile.objects.get(user__username=username)
-        if user.highest_role() == 'APPS_MALL_STEWARD':
-            exclude_orgs = []
-        elif user.highest_role() == 'ORG_STEWARD':
-            user_orgs = user.stewarded_organizations.all()
-            user_orgs = [i.title for i in user_orgs]
-            exclude_orgs = Agency.objects.exclude(title__in=user_orgs)
-        else:
-            user_orgs = user.organizations.all()
-            user_orgs = [i.title for i in user_orgs]
-            exclude_orgs = Agency.objects.exclude(title__in=user_orgs)
-
-        objects = objects.exclude(listing__is_private=True,
-                                  listing__agency__in=exclude_orgs)
+        user_context = get_user_context(username)
+        objects = filter_private_listings(user_context, objects, 'listing__')
 
         if filter_for_user:
-            objects = objects.filter(owner__user__username=username)
+            objects = objects.filter(owner=user_context.profile)
             objects = objects.filter(listing__is_enabled=True)
             objects = objects.filter(listing__is_deleted=False)
 
@@ -421,11 +573,13 @@ class ApplicationLibraryEntry(models.Model):
 @receiver(post_save, sender=ApplicationLibraryEntry)
 def post_save_application_library_entry(sender, instance, created, **kwargs):
     cache.delete_pattern('library_self-*')
+    RecommendationsDirtyEntry.mark_dirty(profile_id=instance.owner_id, listing_id=instance.listing_id)
 
 
 @receiver(post_delete, sender=ApplicationLibraryEntry)
 def post_delete_application_library_entry(sender, instance, **kwargs):
     cache.delete_pattern('library_self-*')
+    RecommendationsDirtyEntry.mark_dirty(profile_id=instance.owner_id, listing_id=instance.listing_id)
 
 
 class Category(models.Model):
@@ -450,11 +604,21 @@ class Category(models.Model):
 @receiver(post_save, sender=Category)
 def post_save_category(sender, instance, created, **kwargs):
     cache.delete_pattern('metadata-*')
+    utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+    refresh_storefront_listing_documents(instance.listings.values_list('id', flat=True), bump_version=False)
+
+
+@receiver(pre_delete, sender=Category)
+def pre_delete_category(sender, instance, **kwargs):
+    # category_listing rows are deleted without m2m_changed signals
+    remember_storefront_listing_ids(instance, instance.listings.values_list('id', flat=True))
 
 
 @receiver(post_delete, sender=Category)
 def post_delete_category(sender, instance, **kwargs):
     cache.delete_pattern('metadata-*')
+    utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+    refresh_remembered_storefront_listing_documents(instance, bump_version=False)
 
 
 class ChangeDetail(models.Model):
@@ -556,6 +720,22 @@ class Contact(models.Model):
         return '{0!s}: {1!s}'.format(self.name, self.email)
 
 
+@receiver(post_save, sender=Contact)
+def post_save_contact(sender, instance, created, **kwargs):
+    refresh_storefront_listing_documents(instance.listings.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Contact)
+def pre_delete_contact(sender, instance, **kwargs):
+    # contact_listing rows are deleted without m2m_changed signals
+    remember_storefront_listing_ids(instance, instance.listings.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Contact)
+def post_delete_contact(sender, instance, **kwargs):
+    refresh_remembered_storefront_listing_documents(instance)
+
+
 class ContactType(models.Model):
     """
     Contact Type
@@ -574,11 +754,21 @@ class ContactType(models.Model):
 @receiver(post_save, sender=ContactType)
 def post_save_contact_types(sender, instance, created, **kwargs):
     cache.delete_pattern('metadata-*')
+    utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+    refresh_storefront_listing_documents(Listing.objects.filter(contacts__contact_type=instance).values_list('id', flat=True),
+                                         bump_version=False)
+
+
+@receiver(pre_delete, sender=ContactType)
+def pre_delete_contact_types(sender, instance, **kwargs):
+    remember_storefront_listing_ids(instance, Listing.objects.filter(contacts__contact_type=instance).values_list('id', flat=True))
 
 
 @receiver(post_delete, sender=ContactType)
 def post_delete_contact_types(sender, instance, **kwargs):
     cache.delete_pattern('metadata-*')
+    utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+    refresh_remembered_storefront_listing_documents(instance, bump_version=False)
 
 
 class DocUrlManager(models.Manager):
@@ -669,11 +859,13 @@ class Intent(models.Model):
 @receiver(post_save, sender=Intent)
 def post_save_intents(sender, instance, created, **kwargs):
     cache.delete_pattern('metadata-*')
+    utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
 
 
 @receiver(post_delete, sender=Intent)
 def post_delete_intents(sender, instance, **kwargs):
     cache.delete_pattern('metadata-*')
+    utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
 
 
 class AccessControlReviewManager(models.Manager):
@@ -773,6 +965,16 @@ class Review(models.Model):
                                           self.rate, self.text, self.review_parent)
 
 
+@receiver(post_save, sender=Review)
+def post_save_review(sender, instance, created, **kwargs):
+    RecommendationsDirtyEntry.mark_dirty(profile_id=instance.author_id, listing_id=instance.listing_id)
+
+
+@receiver(post_delete, sender=Review)
+def post_delete_review(sender, instance, **kwargs):
+    RecommendationsDirtyEntry.mark_dirty(profile_id=instance.author_id, listing_id=instance.listing_id)
+
+
 class ProfileManager(models.Manager):
 
     def get_queryset(self):
@@ -986,6 +1188,16 @@ class Profile(models.Model):
         return p
 
 
+@receiver(post_save, sender=Profile)
+def post_save_profile(sender, instance, created, **kwargs):
+    # access_control may have changed (authorization update)
+    system_reset_allowed_security_markings(instance.user.username)
+    profile_local_cache.invalidate_key(instance.user.username)
+    reset_user_context(instance.user.username)
+    # display_name of listing owners
+    refresh_storefront_listing_documents(instance.owned_listings.values_list('id', flat=True))
+
+
 class AccessControlListingManager(models.Manager):
     """
     Use a custom manager to control access to Listings
@@ -1061,29 +1273,13 @@ class AccessControlListingManager(models.Manager):
         # get all listings
         objects = super(AccessControlListingManager, self).get_queryset()
         # filter out private listings
-        user = Profile.objects.get(user__username=username)
-        if user.highest_role() == 'APPS_MALL_STEWARD':
-            exclude_orgs = []
-        elif user.highest_role() == 'ORG_STEWARD':
-            user_orgs = user.stewarded_organizations.all()
-            user_orgs = [i.title for i in user_orgs]
-            exclude_orgs = Agency.objects.exclude(title__in=user_orgs)
-        else:
-            user_orgs = user.organizations.all()
-            user_orgs = [i.title for i in user_orgs]
-            exclude_orgs = Agency.objects.exclude(title__in=user_orgs)
+        user_context = get_user_context(username)
 
-        objects = objects.exclude(is_private=True, agency__in=exclude_orgs)
+        objects = filter_private_listings(user_context, objects)
         objects = self.apply_select_related(objects)
 
         # Filter out listings by user's access level
-        ids_to_exclude = []
-        for i in objects:
-            if not i.security_marking:
-                logger.debug('Listing {0!s} has no security_marking'.format(i.title))
-            if not system_has_access_control(username, i.security_marking):
-                ids_to_exclude.append(i.id)
-        objects = objects.exclude(pk__in=ids_to_exclude)
+        objects = filter_security_markings(user_context.username, objects)
 
         return objects
 
@@ -1091,19 +1287,9 @@ class AccessControlListingManager(models.Manager):
         # get all listings
         objects = super(AccessControlListingManager, self).get_queryset()
         # filter out private listings
-        user = Profile.objects.get(user__username=username)
-        if user.highest_role() == 'APPS_MALL_STEWARD':
-            exclude_orgs = []
-        elif user.highest_role() == 'ORG_STEWARD':
-            user_orgs = user.stewarded_organizations.all()
-            user_orgs = [i.title for i in user_orgs]
-            exclude_orgs = Agency.objects.exclude(title__in=user_orgs)
-        else:
-            user_orgs = user.organizations.all()
-            user_orgs = [i.title for i in user_orgs]
-            exclude_orgs = Agency.objects.exclude(title__in=user_orgs)
+        user_context = get_user_context(username)
 
-        objects = objects.exclude(is_private=True, agency__in=exclude_orgs)
+        objects = filter_private_listings(user_context, objects)
         return objects
 
 
@@ -1248,34 +1434,166 @@ class Listing(models.Model):
         return '({0!s}-{1!s})'.format(listing_name, [owner.user.username for owner in self.owners.all()])
 
     def save(self, *args, **kwargs):
-        is_new = self.pk
         super(Listing, self).save(*args, **kwargs)
-        current_listing_id = self.pk
 
         if settings.ES_ENABLED:
-            serializer = ReadOnlyListingSerializer(self)
-            record = serializer.data  # TODO Find a faster way to serialize data, makes test take a long time to complete
-            elasticsearch_util.update_es_listing(current_listing_id, record, is_new)
-
-
-class ReadOnlyListingSerializer(serializers.ModelSerializer):
+            # Indexed by the listing index worker (ozpcenter.scripts.es_index_worker)
+            ListingIndexOutboxEntry.enqueue(self.pk)
 
     class Meta:
-        model = Listing
-        depth = 2
+        # Private listing visibility filter (filter_private_listings)
+        index_together = [['is_private', 'agency']]
 
 
 @receiver(post_save, sender=Listing)
-def post_save_listing(sender, instance, created, **kwargs):
-    cache.delete_pattern("storefront-*")
+def post_save_listing(sender, instance, created, update_fields=None, **kwargs):
+    utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
     cache.delete_pattern("library_self-*")
+    # Saves of fields that are not in the document (update_fields) do not rebuild it
+    if update_fields is None or not listing_documents.LISTING_FIELDS.isdisjoint(update_fields):
+        refresh_storefront_listing_documents([instance.pk], bump_version=False)
+
+
+@receiver(m2m_changed, sender=Listing.categories.through)
+@receiver(m2m_changed, sender=Listing.tags.through)
+@receiver(m2m_changed, sender=Listing.contacts.through)
+@receiver(m2m_changed, sender=Listing.owners.through)
+@receiver(m2m_changed, sender=Listing.intents.through)
+def m2m_changed_listing(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # Cleared from the other side (ex: tag.listings.clear()), pk_set is None, get the listings before the clear
+        related_field_name = [field.name for field in sender._meta.fields if field.rel and field.rel.to is instance.__class__][0]
+        remember_storefront_listing_ids(instance, sender.objects.filter(**{related_field_name: instance}).values_list('listing_id', flat=True))
+        return
+
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+
+    if not reverse:
+        refresh_storefront_listing_documents([instance.pk])
+    elif pk_set is not None:
+        refresh_storefront_listing_documents(pk_set)
+    else:
+        refresh_remembered_storefront_listing_documents(instance)
 
 
 @receiver(post_delete, sender=Listing)
 def post_delete_listing(sender, instance, **kwargs):
-    # TODO: When logic is in place to delete, make sure elasticsearch logic is here
-    cache.delete_pattern("storefront-*")
+    utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
     cache.delete_pattern("library_self-*")
+    if settings.ES_ENABLED:
+        # Removed from the index by the listing index worker
+        ListingIndexOutboxEntry.enqueue(instance.pk)
+
+
+class ListingIndexOutboxEntry(models.Model):
+    """
+    Listing whose Elasticsearch document is out of date
+
+    Written when a listing is saved or deleted, consumed in bulk by the listing index worker
+    (model_access_es.process_listing_index_outbox) so listing saves do not wait on Elasticsearch
+
+    Plain integer column instead of a foreign key so entries survive the deletion of the listing
+    """
+    listing_id = models.IntegerField()
+    created_date = models.DateTimeField(default=utils.get_now_utc)
+
+    def __str__(self):
+        return '{0!s}:ListingIndexOutboxEntry'.format(self.listing_id)
+
+    def __repr__(self):
+        return '{0!s}:ListingIndexOutboxEntry'.format(self.listing_id)
+
+    @staticmethod
+    def enqueue(listing_id):
+        """
+        Record that the Elasticsearch document of a listing needs to be indexed (or deleted)
+        """
+        return ListingIndexOutboxEntry.objects.create(listing_id=listing_id)
+
+    class Meta:
+        verbose_name_plural = "listing index outbox entries"
+
+
+class StorefrontListingDocument(models.Model):
+    """
+    Storefront Listing Document
+
+    One pre-rendered JSON listing dictionary (ozpcenter.api.storefront.listing_documents) per enabled,
+    approved and not deleted listing, kept up to date by the Listing and related object signals
+    (refresh_storefront_listing_documents)
+    """
+    listing = models.OneToOneField(Listing, primary_key=True, related_name='storefront_document')
+    agency = models.ForeignKey(Agency, related_name='+')
+    is_private = models.BooleanField(default=False)
+    approved_date = models.DateTimeField(null=True, blank=True, db_index=True)
+    document = models.TextField()
+
+    def __repr__(self):
+        return '{0!s}:StorefrontListingDocument'.format(self.listing_id)
+
+
+def refresh_storefront_listing_documents(listing_ids=None, bump_version=True):
+    """
+    Rebuild the storefront listing documents of listings, listings that are no longer visible in the
+    storefront (disabled, deleted, not approved) lose their document
+
+    Only the documents that changed are written
+
+    Args:
+        listing_ids: listing ids to rebuild, None to rebuild all listings
+        bump_version: bump the storefront listing version when a document changed (callers that bump it
+            themselves pass False)
+
+    Returns:
+        True if a document was created, changed or deleted
+    """
+    if listing_ids is not None:
+        listing_ids = set(listing_ids)
+        if not listing_ids:
+            return False
+
+    documents = {document['id']: document for document in listing_documents.build_listing_documents(listing_ids)}
+    dumped_documents = {listing_id: listing_documents.dump_listing_document(document) for listing_id, document in documents.items()}
+
+    with transaction.atomic():
+        existing_documents = StorefrontListingDocument.objects.all()
+        if listing_ids is not None:
+            existing_documents = existing_documents.filter(listing_id__in=listing_ids)
+        existing_documents = dict(existing_documents.values_list('listing_id', 'document'))
+
+        changed_ids = [listing_id for listing_id in dumped_documents if existing_documents.get(listing_id) != dumped_documents[listing_id]]
+        stale_ids = [listing_id for listing_id in existing_documents if listing_id not in dumped_documents or listing_id in changed_ids]
+        if not changed_ids and not stale_ids:
+            return False
+
+        StorefrontListingDocument.objects.filter(listing_id__in=stale_ids).delete()
+        StorefrontListingDocument.objects.bulk_create([
+            StorefrontListingDocument(listing_id=listing_id,
+                                      agency_id=documents[listing_id]['agency']['id'],
+                                      is_private=documents[listing_id]['is_private'],
+                                      approved_date=documents[listing_id]['approved_date'],
+                                      document=dumped_documents[listing_id])
+            for listing_id in changed_ids])
+
+    if bump_version:
+        utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+    return True
+
+
+def remember_storefront_listing_ids(instance, listing_ids):
+    """
+    Keep the listing ids of an object that is about to lose its listings (pre_delete, reverse pre_clear),
+    the related rows are gone when the post signal runs (refresh_remembered_storefront_listing_documents)
+    """
+    instance._storefront_listing_ids = list(listing_ids)
+
+
+def refresh_remembered_storefront_listing_documents(instance, bump_version=True):
+    """
+    Rebuild the documents of the listings kept by remember_storefront_listing_ids
+    """
+    refresh_storefront_listing_documents(getattr(instance, '_storefront_listing_ids', []), bump_version=bump_version)
 
 
 class AccessControlRecommendationsEntryManager(models.Manager):
@@ -1303,68 +1621,43 @@ class AccessControlRecommendationsEntryManager(models.Manager):
         objects = super(AccessControlRecommendationsEntryManager, self).get_queryset()
 
         # filter out private listings
-        user = Profile.objects.get(user__username=username)
-        if user.highest_role() == 'APPS_MALL_STEWARD':
-            exclude_orgs = []
-        elif user.highest_role() == 'ORG_STEWARD':
-            user_orgs = user.stewarded_organizations.all()
-            user_orgs = [i.title for i in user_orgs]
-            exclude_orgs = Agency.objects.exclude(title__in=user_orgs)
-        else:
-            user_orgs = user.organizations.all()
-            user_orgs = [i.title for i in user_orgs]
-            exclude_orgs = Agency.objects.exclude(title__in=user_orgs)
+        user_context = get_user_context(username)
 
-        objects = objects.filter(target_profile=user,
+        objects = objects.filter(target_profile=user_context.profile,
                     listing__is_enabled=True,
                     listing__approval_status=Listing.APPROVED,
                     listing__is_deleted=False)
 
-        objects = objects.exclude(listing__is_private=True,
-                                  listing__agency__in=exclude_orgs)
+        objects = filter_private_listings(user_context, objects, 'listing__')
 
         # Filter out listings by user's access level
-        ids_to_exclude = []
-        for i in objects:
-            if not i.listing.security_marking:
-                logger.debug('Listing {0!s} has no security_marking'.format(i.listing.title))
-            if not system_has_access_control(username, i.listing.security_marking):
-                ids_to_exclude.append(i.listing.id)
-        objects = objects.exclude(listing__pk__in=ids_to_exclude)
-        return objects
+        return filter_security_markings(user_context.username, objects, 'listing__security_marking')
 
     def for_user_organization_minus_security_markings(self, username):
         # get all listings
         objects = super(AccessControlRecommendationsEntryManager, self).get_queryset()
         # filter out private listings
-        user = Profile.objects.get(user__username=username)
-
-        if user.highest_role() == 'APPS_MALL_STEWARD':
-            exclude_orgs = []
-        elif user.highest_role() == 'ORG_STEWARD':
-            user_orgs = user.stewarded_organizations.all()
-            user_orgs = [i.title for i in user_orgs]
-            exclude_orgs = Agency.objects.exclude(title__in=user_orgs)
-        else:
-            user_orgs = user.organizations.all()
-            user_orgs = [i.title for i in user_orgs]
-            exclude_orgs = Agency.objects.exclude(title__in=user_orgs)
+        user_context = get_user_context(username)
 
-        objects = objects.filter(target_profile=user,
+        objects = objects.filter(target_profile=user_context.profile,
                     listing__is_enabled=True,
                     listing__approval_status=Listing.APPROVED,
                     listing__is_deleted=False)
 
-        objects = objects.exclude(listing__is_private=True, listing__agency__in=exclude_orgs)
+        objects = filter_private_listings(user_context, objects, 'listing__')
         return objects
 
 
 class RecommendationsEntry(models.Model):
     """
     Recommendations Entry
+
+    recommendation_data: msgpack dictionary of the recommendations of each recommender (keyed by friendly name)
+    recommendation_top_n: combined top recommendations, packed with recommend_utils.pack_top_n_scores
     """
     target_profile = models.ForeignKey('Profile', related_name='recommendations_profile')
     recommendation_data = models.BinaryField(default=None)
+    recommendation_top_n = models.BinaryField(default=None, null=True)
 
     # use a custom Manager class to limit returned Listings
     objects = AccessControlRecommendationsEntryManager()
@@ -1379,6 +1672,57 @@ class RecommendationsEntry(models.Model):
         verbose_name_plural = "recommendations entries"
 
 
+class ListingSimilarityEntry(models.Model):
+    """
+    Listings most co-bookmarked with a listing, written by the recommendation batch job
+    and used to score recommendations at request time
+
+    similarity_data: msgpack list of [similar_listing_id, similarity] sorted by similarity DSC
+    """
+    listing_id = models.IntegerField(unique=True)
+    similarity_data = models.BinaryField(default=None)
+
+    def __str__(self):
+        return '{0!s}:ListingSimilarityEntry'.format(self.listing_id)
+
+    def __repr__(self):
+        return '{0!s}:ListingSimilarityEntry'.format(self.listing_id)
+
+    class Meta:
+        verbose_name_plural = "listing similarity entries"
+
+
+class RecommendationsDirtyEntry(models.Model):
+    """
+    Profile or Listing whose recommendations changed since the last recommendation run
+
+    Written by the ApplicationLibraryEntry and Review signals, consumed by the incremental
+    recommendation run (RecommenderDirectory.recommend with incremental=True)
+
+    Plain integer columns instead of foreign keys so entries survive the deletion of the
+    profile or listing they were recorded for
+    """
+    profile_id = models.IntegerField(null=True, blank=True, db_index=True)
+    listing_id = models.IntegerField(null=True, blank=True, db_index=True)
+    created_date = models.DateTimeField(default=utils.get_now_utc)
+
+    def __str__(self):
+        return '{0!s}:{1!s}:RecommendationsDirtyEntry'.format(self.profile_id, self.listing_id)
+
+    def __repr__(self):
+        return '{0!s}:{1!s}:RecommendationsDirtyEntry'.format(self.profile_id, self.listing_id)
+
+    @staticmethod
+    def mark_dirty(profile_id=None, listing_id=None):
+        """
+        Record that the recommendations of a profile and/or of the profiles related to a listing are out of date
+        """
+        return RecommendationsDirtyEntry.objects.create(profile_id=profile_id, listing_id=listing_id)
+
+    class Meta:
+        verbose_name_plural = "recommendations dirty entries"
+
+
 class AccessControlListingActivityManager(models.Manager):
     """
     Use a custom manager to control access to ListingActivities
@@ -1546,11 +1890,20 @@ class ListingType(models.Model):
 @receiver(post_save, sender=ListingType)
 def post_save_listing_types(sender, instance, created, **kwargs):
     cache.delete_pattern('metadata-*')
+    utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+    refresh_storefront_listing_documents(instance.listings.values_list('id', flat=True), bump_version=False)
+
+
+@receiver(pre_delete, sender=ListingType)
+def pre_delete_listing_types(sender, instance, **kwargs):
+    remember_storefront_listing_ids(instance, instance.listings.values_list('id', flat=True))
 
 
 @receiver(post_delete, sender=ListingType)
 def post_delete_listing_types(sender, instance, **kwargs):
     cache.delete_pattern('metadata-*')
+    utils.bump_cache_version(constants.STOREFRONT_LISTING_VERSION_KEY)
+    refresh_remembered_storefront_listing_documents(instance, bump_version=False)
 
 
 class NotificationManager(models.Manager):
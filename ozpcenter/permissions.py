@@ -20,9 +20,9 @@ class IsAppsMallStewardOrReadOnly(permissions.BasePermission):
 
         ozp_authorization = plugin_manager.get_system_authorization_plugin()
         ozp_authorization.authorization_update(request.user.username, request=request)
-        user_profile = model_access.get_profile(request.user.username)
+        user_context = model_access.get_user_context(request.user.username)
         if (request.method in SAFE_METHODS or
-                user_profile.highest_role() in ['APPS_MALL_STEWARD']):
+                user_context.highest_role in ['APPS_MALL_STEWARD']):
             return True
         return False
 
@@ -35,9 +35,9 @@ class IsOrgStewardOrReadOnly(permissions.BasePermission):
 
         ozp_authorization = plugin_manager.get_system_authorization_plugin()
         ozp_authorization.authorization_update(request.user.username, request=request)
-        user_profile = model_access.get_profile(request.user.username)
+        user_context = model_access.get_user_context(request.user.username)
         if (request.method in SAFE_METHODS or
-                user_profile.highest_role() in ['APPS_MALL_STEWARD', 'ORG_STEWARD']):
+                user_context.highest_role in ['APPS_MALL_STEWARD', 'ORG_STEWARD']):
             return True
         return False
 
@@ -53,10 +53,10 @@ class IsUser(permissions.BasePermission):
 
         ozp_authorization = plugin_manager.get_system_authorization_plugin()
         ozp_authorization.authorization_update(request.user.username, request=request)
-        profile = model_access.get_profile(request.user.username)
-        if profile is None:
+        user_context = model_access.get_user_context(request.user.username)
+        if user_context is None:
             return False
-        if profile.highest_role() in ['USER', 'ORG_STEWARD', 'APPS_MALL_STEWARD']:
+        if user_context.highest_role in ['USER', 'ORG_STEWARD', 'APPS_MALL_STEWARD']:
             return True
         else:
             return False
@@ -73,10 +73,10 @@ class IsOrgSteward(permissions.BasePermission):
 
         ozp_authorization = plugin_manager.get_system_authorization_plugin()
         ozp_authorization.authorization_update(request.user.username, request=request)
-        profile = model_access.get_profile(request.user.username)
-        if profile is None:
+        user_context = model_access.get_user_context(request.user.username)
+        if user_context is None:
             return False
-        if profile.highest_role() in ['ORG_STEWARD', 'APPS_MALL_STEWARD']:
+        if user_context.highest_role in ['ORG_STEWARD', 'APPS_MALL_STEWARD']:
             return True
         else:
             return False
@@ -93,10 +93,10 @@ class IsAppsMallSteward(permissions.BasePermission):
 
         ozp_authorization = plugin_manager.get_system_authorization_plugin()
         ozp_authorization.authorization_update(request.user.username, request=request)
-        profile = model_access.get_profile(request.user.username)
-        if profile is None:
+        user_context = model_access.get_user_context(request.user.username)
+        if user_context is None:
             return False
-        if profile.highest_role() == 'APPS_MALL_STEWARD':
+        if user_context.highest_role == 'APPS_MALL_STEWARD':
             return True
         else:
             return False
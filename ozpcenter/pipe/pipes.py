@@ -1,10 +1,11 @@
+from collections import deque
 import logging
 import random
 
 from ozpcenter.recommend import recommend_utils
 from ozpcenter.recommend.recommend_utils import Direction
 from ozpcenter.recommend.recommend_utils import FastNoSuchElementException
-from plugins_util.plugin_manager import system_has_access_control
+from plugins_util.plugin_manager import system_allowed_security_markings
 
 # Get an instance of a logger
 logger = logging.getLogger('ozp-center.' + str(__name__))
@@ -251,22 +252,62 @@ class LenPipe(Pipe):
         return start
 
 
-class ListingPostSecurityMarkingCheckPipe(Pipe):
+class SecurityMarkingCheckPipe(Pipe):
+    """
+    Base pipe for security_marking checks
+
+    Reads up to batch_size objects from the start and checks their distinct security markings with
+    one system_allowed_security_markings call (one access control plugin call for the unknown markings)
+    """
+    batch_size = 100
 
     def __init__(self, username):
         super().__init__()
         self.username = username
+        self.checked_objects = deque()
+
+    def get_security_marking(self, current_object):
+        raise NotImplementedError("Need to implement in subclasses")
+
+    def is_candidate(self, current_object):
+        """
+        Return False to drop an object without checking its security_marking
+        """
+        return True
 
     def process_next_start(self):
         """
-        execute security_marking check on each listing
+        execute security_marking check on batches of objects
         """
-        while True:
-            listing = self.starts.next()
-            if not listing.security_marking:
-                logger.debug('Listing {0!s} has no security_marking'.format(listing.title))
-            if system_has_access_control(self.username, listing.security_marking):
-                return listing
+        while not self.checked_objects:
+            batch = []
+            try:
+                while len(batch) < self.batch_size:
+                    current_object = self.starts.next()
+                    if self.is_candidate(current_object):
+                        batch.append(current_object)
+            except (FastNoSuchElementException, IndexError):
+                if not batch:
+                    raise
+
+            allowed_security_markings = system_allowed_security_markings(self.username, [self.get_security_marking(current_object) for current_object in batch])
+            self.checked_objects.extend(current_object for current_object in batch if self.get_security_marking(current_object) in allowed_security_markings)
+        return self.checked_objects.popleft()
+
+    def reset(self):
+        super().reset()
+        self.checked_objects.clear()
+
+
+class ListingPostSecurityMarkingCheckPipe(SecurityMarkingCheckPipe):
+
+    def get_security_marking(self, listing):
+        return listing.security_marking
+
+    def is_candidate(self, listing):
+        if not listing.security_marking:
+            logger.debug('Listing {0!s} has no security_marking'.format(listing.title))
+        return True
 
 
 class JitterPipe(Pipe):
@@ -294,30 +335,22 @@ class JitterPipe(Pipe):
                 return listing
 
 
-class ListingDictPostSecurityMarkingCheckPipe(Pipe):
+class ListingDictPostSecurityMarkingCheckPipe(SecurityMarkingCheckPipe):
 
     def __init__(self, username, featured=False):
-        super().__init__()
-        self.username = username
+        super().__init__(username)
         self.featured = featured
 
-    def process_next_start(self):
-        """
-        execute security_marking check on each listing
-        """
-        while True:
-            listing = self.starts.next()
+    def get_security_marking(self, listing):
+        return listing['security_marking']
 
-            if not listing['security_marking']:
-                logger.debug('Listing {0!s} has no security_marking'.format(listing['title']))
-            else:
-                if self.featured:
-                    if listing['is_featured'] is True:
-                        if system_has_access_control(self.username, listing['security_marking']):
-                            return listing
-                else:
-                    if system_has_access_control(self.username, listing['security_marking']):
-                        return listing
+    def is_candidate(self, listing):
+        if not listing['security_marking']:
+            logger.debug('Listing {0!s} has no security_marking'.format(listing['title']))
+            return False
+        if self.featured:
+            return listing['is_featured'] is True
+        return True
 
 
 class LimitPipe(Pipe):
@@ -0,0 +1,202 @@
+"""
+# Sparse Profile x Listing Bookmark Matrix
+
+Bookmark collaborative filtering for all profiles at once, ranking is the same as
+GraphAlgoritms.recommend_listings_for_profile.
+
+B is the binary profile x listing bookmark matrix (rows stored CSR style, columns CSC style)
+
+    neighbors(p) = nonzero columns of (B * B^T)[p] minus p   # Profiles sharing at least one bookmark
+    scores(p) = sum(B[u] for u in neighbors(p))                 # Co-bookmark counts
+    scores(p)[l] = 0 for every l bookmarked by p                # Mask own bookmarks
+
+Profiles with the same bookmark set have the same neighbors (except themselves, whose bookmarks are all
+masked), so the products are computed once per distinct bookmark set and then fanned out to the profiles
+in that group. The cost grows with the number of distinct bookmark sets instead of the number of profiles.
+
+# Usage
+matrix = BookmarkMatrix([(profile_id, listing_id), ...])
+for profile_id, listing_scores in matrix.recommend_all():
+    ...  # listing_scores: [(listing_id, count), ...] sorted DSC
+
+# Listing x Listing similarity
+(B^T * B)[i][j] is the number of profiles that bookmarked both listing i and listing j (co-bookmark count),
+normalized with the cosine similarity:
+
+    similarity(i, j) = (B^T * B)[i][j] / sqrt(bookmark_count(i) * bookmark_count(j))
+"""
+from array import array
+import logging
+import math
+
+# Get an instance of a logger
+logger = logging.getLogger('ozp-center.' + str(__name__))
+
+# Typecode for row/column indexes and offsets
+INDEX_TYPECODE = 'l'
+
+
+def build_csr(row_count, pairs):
+    """
+    Build CSR (offsets, columns) arrays from (row_index, column_index) pairs, duplicates are dropped
+
+    Return:
+        (offsets, columns): columns[offsets[row]:offsets[row + 1]] are the column indexes of row (sorted)
+    """
+    rows = [set() for _ in range(row_count)]
+    for row_index, column_index in pairs:
+        rows[row_index].add(column_index)
+
+    offsets = array(INDEX_TYPECODE, [0])
+    columns = array(INDEX_TYPECODE)
+    for row in rows:
+        columns.extend(sorted(row))
+        offsets.append(len(columns))
+    return offsets, columns
+
+
+class BookmarkMatrix(object):
+    """
+    Binary Profile x Listing bookmark matrix
+    """
+
+    def __init__(self, bookmark_pairs):
+        """
+        Args:
+            bookmark_pairs: iterable of (profile_id, listing_id)
+        """
+        self.profile_ids = []
+        self.listing_ids = []
+        self.profile_index = {}
+        self.listing_index = {}
+
+        index_pairs = []
+        for profile_id, listing_id in bookmark_pairs:
+            index_pairs.append((self._intern(self.profile_index, self.profile_ids, profile_id),
+                                self._intern(self.listing_index, self.listing_ids, listing_id)))
+
+        self.row_offsets, self.row_listings = build_csr(len(self.profile_ids), index_pairs)
+        self.column_offsets, self.column_profiles = build_csr(len(self.listing_ids),
+                                                              ((listing, profile) for profile, listing in index_pairs))
+
+    def __str__(self):
+        return 'BookmarkMatrix(profiles: {}, listings: {}, bookmarks: {})'.format(len(self.profile_ids),
+                                                                                  len(self.listing_ids),
+                                                                                  len(self.row_listings))
+
+    @staticmethod
+    def _intern(index_dict, id_list, current_id):
+        index = index_dict.get(current_id)
+        if index is None:
+            index = len(id_list)
+            index_dict[current_id] = index
+            id_list.append(current_id)
+        return index
+
+    def row(self, profile_index):
+        """
+        Listing indexes bookmarked by profile index (array slice)
+        """
+        return self.row_listings[self.row_offsets[profile_index]:self.row_offsets[profile_index + 1]]
+
+    def column(self, listing_index):
+        """
+        Profile indexes that bookmarked listing index (array slice)
+        """
+        return self.column_profiles[self.column_offsets[listing_index]:self.column_offsets[listing_index + 1]]
+
+    def group_profiles_by_bookmarks(self):
+        """
+        Group profile indexes with identical rows
+
+        Return:
+            {row tuple: [profile_index, ...]}
+        """
+        groups = {}
+        for profile_index in range(len(self.profile_ids)):
+            groups.setdefault(tuple(self.row(profile_index)), []).append(profile_index)
+        return groups
+
+    def scores_for_row(self, listing_indexes):
+        """
+        Co-bookmark counts for a row of B, own listings masked out
+
+        Return:
+            {listing_index: count}
+        """
+        neighbor_profiles = set()
+        for listing_index in listing_indexes:
+            neighbor_profiles.update(self.column(listing_index))
+
+        own_listings = set(listing_indexes)
+        scores = {}
+        for neighbor_profile in neighbor_profiles:
+            for listing_index in self.row(neighbor_profile):
+                if listing_index not in own_listings:
+                    scores[listing_index] = scores.get(listing_index, 0) + 1
+        return scores
+
+    def recommend_all(self, profile_filter=None):
+        """
+        Generator of (profile_id, [(listing_id, count), ...]) for every profile that has recommendations
+
+        Listings are sorted by count DSC (ties by listing id DSC) like GraphAlgoritms.recommend_listings_for_profile
+
+        Args:
+            profile_filter: function of profile_id, only recommend for the profiles it returns True for (None for all profiles)
+        """
+        groups = self.group_profiles_by_bookmarks()
+        logger.info('{}, distinct bookmark sets: {}'.format(self, len(groups)))
+
+        for listing_indexes, profile_indexes in groups.items():
+            if profile_filter is not None:
+                profile_indexes = [profile_index for profile_index in profile_indexes
+                                   if profile_filter(self.profile_ids[profile_index])]
+                if not profile_indexes:
+                    continue
+
+            scores = self.scores_for_row(listing_indexes)
+            if not scores:
+                continue
+
+            sorted_scores = sorted(((self.listing_ids[listing_index], count) for listing_index, count in scores.items()),
+                                   key=lambda x: (x[1], x[0]), reverse=True)
+
+            for profile_index in profile_indexes:
+                yield self.profile_ids[profile_index], sorted_scores
+
+    def listing_similarities(self, size_n=20, listing_ids=None):
+        """
+        Cosine co-bookmark similarity of every listing with the other listings
+
+        Args:
+            size_n: Max number of similar listings for each listing
+            listing_ids: Only compute the similarities of these listings (None for every listing)
+
+        Return:
+            {listing_id: [(similar_listing_id, similarity), ...]}  top size_n sorted by similarity DSC
+        """
+        if listing_ids is None:
+            listing_indexes = range(len(self.listing_ids))
+        else:
+            listing_indexes = [self.listing_index[listing_id] for listing_id in listing_ids if listing_id in self.listing_index]
+
+        output = {}
+        for listing_index in listing_indexes:
+            listing_profiles = self.column(listing_index)
+
+            co_bookmark_counts = {}
+            for profile_index in listing_profiles:
+                for other_listing_index in self.row(profile_index):
+                    if other_listing_index != listing_index:
+                        co_bookmark_counts[other_listing_index] = co_bookmark_counts.get(other_listing_index, 0) + 1
+
+            similarities = []
+            for other_listing_index, count in co_bookmark_counts.items():
+                other_listing_bookmark_count = len(self.column(other_listing_index))
+                similarity = count / math.sqrt(len(listing_profiles) * other_listing_bookmark_count)
+                similarities.append((self.listing_ids[other_listing_index], similarity))
+
+            if similarities:
+                output[self.listing_ids[listing_index]] = sorted(similarities, key=lambda x: (x[1], x[0]), reverse=True)[:size_n]
+        return output
@@ -0,0 +1,561 @@
+"""
+# Compact Graph Implementation for Recommendation engine
+
+Same public API as ozpcenter.recommend.graph.Graph (add_vertex, get_vertex, add_edge, query, algo)
+but the data is stored in flat integer arrays instead of one Python object per Vertex/Edge.
+
+# Storage
+Vertex ids ('p-12', 'l-7', ...) are interned to dense ints (vertex index) on insert.
+Edges are stored per edge label as parallel source/target arrays, and compiled on first read into
+CSR (Compressed Sparse Row) adjacency for both directions:
+
+    offsets[vertex_index]..offsets[vertex_index + 1] -> slice of neighbor vertex indexes
+
+Vertex and Edge objects handed out by the graph are lightweight views created on demand,
+so the Query/Pipe classes work unchanged.
+
+# Usage
+graph = CompactGraph()
+profile = graph.add_vertex('profile', {'username': 'bigbrother'}, current_id='p-1')
+listing = graph.add_vertex('listing', {'title': 'Air Mail'}, current_id='l-1')
+profile.add_edge('bookmarked', listing)
+
+graph.query().v('p-1').out('bookmarked').id().to_list()  # ['l-1']
+graph.algo().recommend_listings_for_profile('p-1')
+
+# Based on
+https://en.wikipedia.org/wiki/Sparse_matrix#Compressed_sparse_row_(CSR,_CRS_or_Yale_format)
+"""
+from array import array
+import logging
+
+from ozpcenter.recommend import recommend_utils
+from ozpcenter.recommend.query import Query
+
+# Get an instance of a logger
+logger = logging.getLogger('ozp-center.' + str(__name__))
+
+# Typecode for vertex indexes, edge positions and offsets
+INDEX_TYPECODE = 'l'
+
+
+class CompactAdjacency(object):
+    """
+    Adjacency for one edge label
+
+    Edges are appended to sources/targets in insertion order, the position of an edge in those arrays
+    is its identity inside the label. Reads go through the compiled CSR tables which are rebuilt lazily
+    after edges were added.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.sources = array(INDEX_TYPECODE)
+        self.targets = array(INDEX_TYPECODE)
+        self.edge_ids = array(INDEX_TYPECODE)
+        self.properties = {}  # Key: edge position, value: properties dict (only for edges that have properties)
+        self._csr = {}  # Key: Direction, value: (offsets, neighbors, positions)
+
+    def __len__(self):
+        return len(self.sources)
+
+    def append(self, source_index, target_index, edge_id, properties=None):
+        """
+        Add edge, returns the position of the edge
+        """
+        position = len(self.sources)
+        self.sources.append(source_index)
+        self.targets.append(target_index)
+        self.edge_ids.append(edge_id)
+        if properties:
+            self.properties[position] = properties
+        self._csr = {}
+        return position
+
+    def _compile(self, direction, vertex_count):
+        """
+        Build CSR table with a counting sort, keeps insertion order of edges for each vertex
+
+        Direction.OUT is keyed by source vertex and points to targets
+        Direction.IN is keyed by target vertex and points to sources
+        """
+        if direction == recommend_utils.Direction.OUT:
+            keys, values = self.sources, self.targets
+        else:
+            keys, values = self.targets, self.sources
+
+        offsets = array(INDEX_TYPECODE, [0]) * (vertex_count + 1)
+        for key in keys:
+            offsets[key + 1] += 1
+
+        for index in range(vertex_count):
+            offsets[index + 1] += offsets[index]
+
+        next_slot = array(INDEX_TYPECODE, offsets)
+        neighbors = array(INDEX_TYPECODE, [0]) * len(keys)
+        positions = array(INDEX_TYPECODE, [0]) * len(keys)
+
+        for position, key in enumerate(keys):
+            slot = next_slot[key]
+            neighbors[slot] = values[position]
+            positions[slot] = position
+            next_slot[key] = slot + 1
+
+        return offsets, neighbors, positions
+
+    def get_csr(self, direction, vertex_count):
+        """
+        Get compiled (offsets, neighbors, positions) for direction
+        """
+        csr = self._csr.get(direction)
+        if csr is None or len(csr[0]) != vertex_count + 1:
+            csr = self._compile(direction, vertex_count)
+            self._csr[direction] = csr
+        return csr
+
+    def neighbors(self, vertex_index, direction, vertex_count):
+        """
+        Get neighbor vertex indexes of vertex_index as an array slice
+        """
+        offsets, neighbors, _ = self.get_csr(direction, vertex_count)
+        return neighbors[offsets[vertex_index]:offsets[vertex_index + 1]]
+
+    def positions(self, vertex_index, direction, vertex_count):
+        """
+        Get edge positions of vertex_index as an array slice
+        """
+        offsets, _, positions = self.get_csr(direction, vertex_count)
+        return positions[offsets[vertex_index]:offsets[vertex_index + 1]]
+
+
+class CompactElement(object):
+    """
+    Base class for CompactVertex and CompactEdge views
+    """
+    __slots__ = ()
+
+    def get_properties(self):
+        return self.properties
+
+    def set_properties(self, properties):
+        current_properties = self.properties
+        for key in properties:
+            current_properties[key] = properties[key]
+        return current_properties
+
+    def get_property(self, key):
+        return self.properties.get(key)
+
+    def set_property(self, key, value):
+        self.properties[key] = value
+        return value
+
+    def remove_property(self, key):
+        return self.properties.pop(key, None)
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.id == other.id
+        else:
+            return False
+
+
+class CompactVertex(CompactElement):
+    """
+    Lightweight Vertex view over CompactGraph storage
+    """
+    __slots__ = ('graph', 'index')
+
+    def __init__(self, graph_instance, index):
+        self.graph = graph_instance
+        self.index = index
+
+    def __repr__(self):
+        return 'Vertex({})'.format(self.label)
+
+    @property
+    def id(self):
+        return self.graph._index_to_id[self.index]
+
+    @property
+    def label(self):
+        return self.graph._vertex_label_names[self.graph._vertex_labels[self.index]]
+
+    @property
+    def properties(self):
+        current_properties = self.graph._vertex_properties[self.index]
+        if current_properties is None:
+            current_properties = {}
+            self.graph._vertex_properties[self.index] = current_properties
+        return current_properties
+
+    def query(self):
+        return Query(self.graph).v(self.id)
+
+    def get_edges_iterator(self, direction, *labels):
+        return recommend_utils.ListIterator(self.get_edges(direction, labels))
+
+    def get_edges(self, direction, *labels):
+        labels = recommend_utils.flatten_iterable(labels)
+
+        if direction == recommend_utils.Direction.OUT:
+            return self.get_out_edges(labels)
+        elif direction == recommend_utils.Direction.IN:
+            return self.get_in_edges(labels)
+        else:
+            return self.get_out_edges(labels) + self.get_in_edges(labels)
+
+    def _get_edges(self, direction, labels):
+        labels = recommend_utils.flatten_iterable(labels) or list(self.graph._adjacency)
+        vertex_count = self.graph.node_count()
+        output_list = []
+
+        for label in labels:
+            adjacency = self.graph._adjacency.get(label)
+            if adjacency is not None:
+                for position in adjacency.positions(self.index, direction, vertex_count):
+                    output_list.append(CompactEdge(self.graph, adjacency, position))
+        return output_list
+
+    def get_in_edges(self, *labels):
+        """
+        Get in edges
+        """
+        return self._get_edges(recommend_utils.Direction.IN, labels)
+
+    def get_out_edges(self, *labels):
+        """
+        Get out edges
+        """
+        return self._get_edges(recommend_utils.Direction.OUT, labels)
+
+    def add_edge(self, label, vertex_instance, properties=None):
+        current_edge = None
+
+        if vertex_instance is None:
+            logger.warn('No Out Path for Vertex Instance: {}-{}'.format(self.id, vertex_instance))
+        else:
+            current_edge = self.graph.add_edge(in_vertex_id=self.id,
+                                               out_vertex_id=vertex_instance.id,
+                                               label=label,
+                                               properties=properties)
+        return current_edge
+
+
+class CompactEdge(CompactElement):
+    """
+    Lightweight Edge view over CompactGraph storage
+    """
+    __slots__ = ('graph', 'adjacency', 'position')
+
+    def __init__(self, graph_instance, adjacency, position):
+        self.graph = graph_instance
+        self.adjacency = adjacency
+        self.position = position
+
+    def __repr__(self):
+        return '{}--{}-->{}'.format(self.in_vertex, self.label, self.out_vertex)
+
+    @property
+    def id(self):
+        return self.adjacency.edge_ids[self.position]
+
+    @property
+    def label(self):
+        return self.adjacency.label
+
+    @property
+    def properties(self):
+        return self.adjacency.properties.setdefault(self.position, {})
+
+    @property
+    def in_vertex(self):
+        return CompactVertex(self.graph, self.adjacency.sources[self.position])
+
+    @property
+    def out_vertex(self):
+        return CompactVertex(self.graph, self.adjacency.targets[self.position])
+
+    def get_vertex(self, direction):
+        """
+        Get Vertex
+
+        Arg:
+            direction: Enum Direction
+        """
+        if direction == recommend_utils.Direction.IN:
+            return self.in_vertex
+        elif direction == recommend_utils.Direction.OUT:
+            return self.out_vertex
+        else:
+            raise Exception('Invalid Direction')
+
+
+class CompactVertexMapping(object):
+    """
+    Read only dict-like view of vertices (Key: ID, value: Vertex) used by Query
+    """
+
+    def __init__(self, graph_instance):
+        self.graph = graph_instance
+
+    def __len__(self):
+        return len(self.graph._index_to_id)
+
+    def __contains__(self, current_id):
+        return current_id in self.graph._id_to_index
+
+    def __iter__(self):
+        return iter(self.graph._index_to_id)
+
+    def __getitem__(self, current_id):
+        return CompactVertex(self.graph, self.graph._id_to_index[current_id])
+
+    def keys(self):
+        return list(self.graph._index_to_id)
+
+    def get(self, current_id, default=None):
+        index = self.graph._id_to_index.get(current_id)
+        if index is None:
+            return default
+        return CompactVertex(self.graph, index)
+
+
+class CompactGraph(object):
+    """
+    A Graph is a container object for a collection of Vertex, Edge stored in integer arrays
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def __str__(self):
+        output = 'Graph(vertices: {}, edges: {})'.format(self.node_count(),
+                                                         self.edge_count())
+        return output
+
+    def reset(self):
+        """
+        Reset Graph
+
+        _id_to_index / _index_to_id:
+            Interning of external vertex ids to dense vertex indexes
+        _vertex_labels:
+            Label code per vertex index, label codes are interned in _vertex_label_codes
+        _vertex_properties:
+            Properties dict (or None) per vertex index
+        _adjacency:
+            Dictionary with Key: edge label, value: CompactAdjacency
+        """
+        self.current_id = 0
+        self._id_to_index = {}
+        self._index_to_id = []
+        self._vertex_labels = array('H')
+        self._vertex_label_codes = {}
+        self._vertex_label_names = []
+        self._vertex_properties = []
+        self._adjacency = {}
+        self._edge_count = 0
+        self.vertices = CompactVertexMapping(self)
+
+    def node_count(self):
+        return len(self._index_to_id)
+
+    def edge_count(self):
+        return self._edge_count
+
+    def get_next_id(self):
+        """
+        Get next id
+        """
+        while True:
+            self.current_id = self.current_id + 1
+            if self.current_id not in self._id_to_index:
+                return self.current_id
+
+    def get_index(self, current_id):
+        """
+        Get dense vertex index of vertex id, None if vertex does not exist
+        """
+        return self._id_to_index.get(current_id)
+
+    def get_id(self, index):
+        """
+        Get vertex id of dense vertex index
+        """
+        return self._index_to_id[index]
+
+    def get_vertex(self, current_id):
+        """
+        Get Vertex from graph
+
+        Return:
+            Vertex
+        """
+        if current_id is None:
+            raise Exception('Vertex ID can not be None')
+        return self.vertices.get(current_id)
+
+    def get_vertices(self, key=None, value=None):
+        return [CompactVertex(self, index) for index in range(self.node_count())]
+
+    def get_vertices_iterator(self, key=None, value=None):
+        return recommend_utils.ListIterator(self.get_vertices())
+
+    def _intern_vertex_label(self, label):
+        code = self._vertex_label_codes.get(label)
+        if code is None:
+            code = len(self._vertex_label_names)
+            self._vertex_label_codes[label] = code
+            self._vertex_label_names.append(label)
+        return code
+
+    def add_vertex(self, label=None, properties=None, current_id=None):
+        """
+        Add Vertex to graph
+
+        Return:
+            Vertex
+        """
+        if current_id is None:
+            current_id = self.get_next_id()
+        elif current_id in self._id_to_index:
+            raise Exception('Vertex with ID Already Exist')
+
+        index = len(self._index_to_id)
+        self._id_to_index[current_id] = index
+        self._index_to_id.append(current_id)
+        self._vertex_labels.append(self._intern_vertex_label(label))
+        self._vertex_properties.append(properties or None)
+        return CompactVertex(self, index)
+
+    def get_edge(self, current_id):
+        """
+        Return the edge referenced by the provided object current_id.
+        If no edge is referenced by that current_id, then return null.
+        """
+        if current_id is None:
+            raise Exception('Edge ID can not be None')
+        for adjacency in self._adjacency.values():
+            for position, edge_id in enumerate(adjacency.edge_ids):
+                if edge_id == current_id:
+                    return CompactEdge(self, adjacency, position)
+        return None
+
+    def get_edges(self):
+        """
+        Get all edges
+        """
+        output_list = []
+        for adjacency in self._adjacency.values():
+            for position in range(len(adjacency)):
+                output_list.append(CompactEdge(self, adjacency, position))
+        return output_list
+
+    def get_adjacency(self, label):
+        """
+        Get CompactAdjacency of edge label, None if there are no edges with that label
+        """
+        return self._adjacency.get(label)
+
+    def add_edge(self, current_id=None, in_vertex_id=None, out_vertex_id=None, label=None, properties=None):
+        """
+        Add edge to graph
+
+        Edge ids are assigned sequentially, custom edge ids are not supported
+        """
+        if current_id is not None:
+            raise Exception('Custom Edge ID is not supported')
+
+        in_vertex_index = self._id_to_index.get(in_vertex_id)
+        out_vertex_index = self._id_to_index.get(out_vertex_id)
+
+        if out_vertex_index is None or in_vertex_index is None:
+            raise Exception('In_vertex or out_vertex not found')
+
+        adjacency = self._adjacency.get(label)
+        if adjacency is None:
+            adjacency = CompactAdjacency(label)
+            self._adjacency[label] = adjacency
+
+        self._edge_count = self._edge_count + 1
+        position = adjacency.append(in_vertex_index, out_vertex_index, self._edge_count, properties)
+        return CompactEdge(self, adjacency, position)
+
+    def neighbors(self, vertex_index, direction, label):
+        """
+        Get neighbor vertex indexes for vertex index following edges with label
+
+        Return:
+            array of vertex indexes
+        """
+        adjacency = self._adjacency.get(label)
+        if adjacency is None:
+            return array(INDEX_TYPECODE)
+        return adjacency.neighbors(vertex_index, direction, self.node_count())
+
+    def query(self):
+        """
+        Make a Query object to query graph
+        """
+        return Query(self)
+
+    def algo(self):
+        return CompactGraphAlgorithms(self)
+
+
+class CompactGraphAlgorithms(object):
+    """
+    Graph algorithms working directly on CompactGraph adjacency arrays
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def recommend_listings_for_profile(self, profile_id):
+        """
+        Collaborative filtering, same results as GraphAlgoritms.recommend_listings_for_profile
+
+        Algorithm Steps:
+            - Go to all Listings that profile has bookmarked (out slice)
+            - Go to all other Profiles that bookmarked the same listings (in slices, distinct)
+            - Go to all Listings that other Profiles has bookmarked (out slices)
+            - Filter out all listings that profile has bookmarked
+            - Group by Listings with Count (recommendation weight) and sort by count DSC
+
+        Returns:
+            [(listing_id, recommendation weight),
+             (listing_id, recommendation weight) ....]
+        """
+        graph = self.graph
+        profile_index = graph.get_index(profile_id)
+
+        if profile_index is None:
+            return []
+
+        in_direction = recommend_utils.Direction.IN
+        out_direction = recommend_utils.Direction.OUT
+
+        profile_listing_indexes = graph.neighbors(profile_index, out_direction, 'bookmarked')
+        profile_listing_index_set = set(profile_listing_indexes)
+
+        other_profile_indexes = set()
+        for listing_index in profile_listing_indexes:
+            other_profile_indexes.update(graph.neighbors(listing_index, in_direction, 'bookmarked'))
+        other_profile_indexes.discard(profile_index)
+
+        group_by_index_count = {}
+        for other_profile_index in other_profile_indexes:
+            for listing_index in graph.neighbors(other_profile_index, out_direction, 'bookmarked'):
+                if listing_index not in profile_listing_index_set:
+                    group_by_index_count[listing_index] = group_by_index_count.get(listing_index, 0) + 1
+
+        group_by_id_count = {graph.get_id(index): count for index, count in group_by_index_count.items()}
+
+        # Group by Listings with Count (recommendation weight) and sort by count DSC
+        sorted_listing_ids = sorted(group_by_id_count.items(), key=lambda x: (x[1], x[0]), reverse=True)
+
+        return sorted_listing_ids
@@ -3,6 +3,7 @@ Graph Factory
 Make different graphs
 """
 from ozpcenter import models
+from ozpcenter.recommend.compact_graph import CompactGraph
 from ozpcenter.recommend.graph import Graph
 
 
@@ -29,8 +30,9 @@ class GraphFactory(object):
         return graph
 
     @staticmethod
-    def load_sample_profile_listing_graph():
-        graph = Graph()
+    def load_sample_profile_listing_graph(graph=None):
+        if graph is None:
+            graph = Graph()
         profile1 = graph.add_vertex('profile', {'username': 'first1 last'}, current_id='p-1')
         profile2 = graph.add_vertex('profile', {'username': 'first2 last'}, current_id='p-2')
         profile3 = graph.add_vertex('profile', {'username': 'first3 last'}, current_id='p-3')
@@ -82,10 +84,13 @@ class GraphFactory(object):
         return graph
 
     @staticmethod
-    def load_db_into_graph():
+    def load_db_into_graph(graph=None):
         """
         Load Django Database into graph
 
+        Args:
+            graph: empty graph instance to load into (Graph or CompactGraph), defaults to Graph
+
         Agency <--stewardedAgency--
         Agency <--agency--          Profile --bookmarked--> Listing --listingCategory--> Category
                                                                     --listingAgency--> Agency
@@ -100,7 +105,8 @@ class GraphFactory(object):
                 Link to Agency
                 Link bookmarked listings
         """
-        graph = Graph()
+        if graph is None:
+            graph = Graph()
 
         for category in models.Category.objects.all():
             data = {'title': category.title}
@@ -151,3 +157,10 @@ class GraphFactory(object):
                 added_vertex.add_edge('bookmarked', graph.get_vertex('l-{}'.format(current_listing.pk)), data)
 
         return graph
+
+    @staticmethod
+    def load_db_into_compact_graph():
+        """
+        Load Django Database into a CompactGraph (integer array backed graph)
+        """
+        return GraphFactory.load_db_into_graph(CompactGraph())
@@ -0,0 +1,118 @@
+"""
+Listing Similarity
+===============
+Item-Item recommendations that can be computed at request time
+
+The recommendation batch job saves the top co-bookmarked listings of each listing (ListingSimilarityEntry).
+At request time a profile's current bookmarks are combined with that table:
+
+    score(listing) = sum(similarity(bookmarked_listing, listing) for bookmarked_listing in profile bookmarks)
+
+This only needs two small queries, so it can be used when the profile has no stored RecommendationsEntry yet
+(new user) or when the stored one is stale (bookmarks changed since the last batch run).
+"""
+import logging
+
+import msgpack
+from django.db import transaction
+from django.db.models import Q
+
+from ozpcenter import models
+from ozpcenter.recommend.bookmark_matrix import BookmarkMatrix
+
+# Get an instance of a logger
+logger = logging.getLogger('ozp-center.' + str(__name__))
+
+FRIENDLY_NAME = 'Online Listing Similarity'
+RECOMMENDATION_WEIGHT = 5.0
+SIMILAR_LISTINGS_SIZE = 20  # Number of similar listings to save for each listing
+
+
+def get_dirty_listing_ids(max_dirty_entry_id):
+    """
+    Get the listings whose similarities changed because of the RecommendationsDirtyEntry rows
+
+    similarity(i, j) depends on the bookmarks of i and the bookmark count of j, so a bookmark change of
+    listing l by profile p changes the similarities of:
+        - l
+        - the listings bookmarked by p
+        - the listings co-bookmarked with l (their similarity with l uses the bookmark count of l)
+
+    Args:
+        max_dirty_entry_id: Only take RecommendationsDirtyEntry rows up to this id into account
+
+    Returns:
+        set of listing ids
+    """
+    dirty_entries = models.RecommendationsDirtyEntry.objects.filter(id__lte=max_dirty_entry_id)
+    dirty_profile_ids = dirty_entries.filter(profile_id__isnull=False).values_list('profile_id', flat=True)
+    dirty_listing_ids = set(dirty_entries.filter(listing_id__isnull=False).values_list('listing_id', flat=True))
+
+    bookmarks = models.ApplicationLibraryEntry.objects.all()
+    co_bookmark_profile_ids = bookmarks.filter(listing_id__in=dirty_listing_ids).values_list('owner_id', flat=True)
+    related_listing_ids = set(bookmarks.filter(Q(owner_id__in=dirty_profile_ids) |
+                                               Q(owner_id__in=co_bookmark_profile_ids)).values_list('listing_id', flat=True))
+    return dirty_listing_ids | related_listing_ids
+
+
+@transaction.atomic
+def save_listing_similarities(listing_ids=None):
+    """
+    Compute the listing x listing co-bookmark similarity table from all bookmarks and replace ListingSimilarityEntry rows
+
+    Args:
+        listing_ids: Only replace the rows of these listings (incremental run, see get_dirty_listing_ids),
+            None to replace every row
+
+    Returns:
+        Number of ListingSimilarityEntry rows saved
+    """
+    bookmark_pairs = models.ApplicationLibraryEntry.objects.filter(
+        listing__is_enabled=True,
+        listing__is_deleted=False,
+        listing__approval_status=models.Listing.APPROVED).values_list('owner_id', 'listing_id')
+
+    matrix = BookmarkMatrix(bookmark_pairs.iterator())
+    listing_similarities = matrix.listing_similarities(SIMILAR_LISTINGS_SIZE, listing_ids)
+
+    similarity_entries = models.ListingSimilarityEntry.objects.all()
+    if listing_ids is not None:
+        similarity_entries = similarity_entries.filter(listing_id__in=listing_ids)
+    similarity_entries.delete()
+
+    models.ListingSimilarityEntry.objects.bulk_create(
+        [models.ListingSimilarityEntry(listing_id=listing_id,
+                                       similarity_data=msgpack.packb([list(similarity) for similarity in similarities]))
+         for listing_id, similarities in listing_similarities.items()])
+
+    logger.info('Saved listing similarities for {} listings'.format(len(listing_similarities)))
+    return len(listing_similarities)
+
+
+def get_online_recommendations(profile_id, size_n=20):
+    """
+    Score recommendations for a profile from its current bookmarks and the listing similarity table
+
+    Args:
+        profile_id: Profile id
+        size_n: Max number of recommendations
+
+    Returns:
+        [[listing_id, score], ...] sorted by score DSC, bookmarked listings excluded
+    """
+    bookmarked_listing_ids = set(models.ApplicationLibraryEntry.objects.filter(
+        owner_id=profile_id).values_list('listing_id', flat=True))
+
+    if not bookmarked_listing_ids:
+        return []
+
+    listing_scores = {}
+    similarity_data_list = models.ListingSimilarityEntry.objects.filter(
+        listing_id__in=bookmarked_listing_ids).values_list('similarity_data', flat=True)
+
+    for similarity_data in similarity_data_list:
+        for similar_listing_id, similarity in msgpack.unpackb(bytes(similarity_data)):
+            if similar_listing_id not in bookmarked_listing_ids:
+                listing_scores[similar_listing_id] = listing_scores.get(similar_listing_id, 0.0) + similarity
+
+    return [[listing_id, listing_scores[listing_id]] for listing_id in sorted(listing_scores, key=listing_scores.get, reverse=True)][:size_n]
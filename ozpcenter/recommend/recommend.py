@@ -27,19 +27,27 @@ Steps:
 Idea:
 Jitting Result
 """
+from concurrent.futures import ThreadPoolExecutor
+import copy
 import logging
+import multiprocessing
 import time
 
 import msgpack
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Count
+from django.db import connections
 from django.db import transaction
 from django.conf import settings
+from elasticsearch import helpers
 
 from ozpcenter import models
+from ozpcenter.recommend import listing_similarity
 from ozpcenter.recommend import recommend_utils
+from ozpcenter.recommend.bookmark_matrix import BookmarkMatrix
 from ozpcenter.recommend.graph_factory import GraphFactory
 from ozpcenter.api.listing.elasticsearch_util import elasticsearch_factory
+from plugins_util.plugin_manager import system_allowed_security_markings
 
 # Get an instance of a logger
 logger = logging.getLogger('ozp-center.' + str(__name__))
@@ -52,8 +60,18 @@ class Recommender(object):
     friendly_name = None
     recommendation_weight = None
 
-    def __init__(self):
+    def __init__(self, profile_id_range=None, profile_ids=None):
+        """
+        Args:
+            profile_id_range: (min_profile_id, max_profile_id) inclusive range of profiles to recommend for,
+                              None for all profiles. Used to run recommenders in shards.
+            profile_ids: set of profile ids to recommend for, None for all profiles.
+                         Used by the incremental recommendation run.
+        """
         self.recommender_result_set = {}
+        self.profile_id_range = profile_id_range
+        self.profile_ids = profile_ids
+        self.is_prepared = False
         self.initiate()
 
     def initiate(self):
@@ -63,6 +81,31 @@ class Recommender(object):
         """
         raise NotImplementedError()
 
+    def prepare(self):
+        """
+        This method is used for the subclasses.
+        It is used for the global precomputation shared by all profiles (rankings, matrices, graphs)
+        """
+        pass
+
+    def ensure_prepared(self):
+        """
+        Run the global precomputation once
+        """
+        if not self.is_prepared:
+            self.prepare()
+            self.is_prepared = True
+
+    def get_shard(self, profile_id_range):
+        """
+        Copy of the recommender that only scores the profiles of profile_id_range,
+        the copy shares the initialized and precomputed state (initiate and prepare are not run again)
+        """
+        shard_obj = copy.copy(self)
+        shard_obj.profile_id_range = profile_id_range
+        shard_obj.recommender_result_set = {}
+        return shard_obj
+
     def recommendation_logic(self):
         """
         This method is used for the subclasses.
@@ -70,6 +113,27 @@ class Recommender(object):
         """
         raise NotImplementedError()
 
+    def get_profiles(self):
+        """
+        Get the profiles to recommend for (all profiles or the profiles of the shard)
+        """
+        profiles = models.Profile.objects.all()
+        if self.profile_id_range is not None:
+            profiles = profiles.filter(id__gte=self.profile_id_range[0], id__lte=self.profile_id_range[1])
+        if self.profile_ids is not None:
+            profiles = profiles.filter(id__in=self.profile_ids)
+        return profiles
+
+    def is_profile_in_shard(self, profile_id):
+        """
+        Check if profile id is in the profiles to recommend for
+        """
+        if self.profile_id_range is not None and not (self.profile_id_range[0] <= profile_id <= self.profile_id_range[1]):
+            return False
+        if self.profile_ids is not None and profile_id not in self.profile_ids:
+            return False
+        return True
+
     def add_listing_to_user_profile(self, profile_id, listing_id, score, cumulative=False):
         """
         Add listing and score to user profile
@@ -104,6 +168,7 @@ class Recommender(object):
         Execute recommendation logic
         """
         start_ms = time.time() * 1000.0
+        self.ensure_prepared()
         self.recommendation_logic()
         recommendation_ms = time.time() * 1000.0
         print('--------')  # Print statement for debugging output
@@ -130,7 +195,7 @@ class SampleDataRecommender(Recommender):
         """
         Sample Recommendations for all users
         """
-        all_profiles = models.Profile.objects.all()
+        all_profiles = self.get_profiles()
         for profile in all_profiles:
             # Assign Recommendations
             # Get Listings this user can see
@@ -160,96 +225,195 @@ class BaselineRecommender(Recommender):
     - Recommendations should be explainable and believable
     - Must respect private apps
     - Does not have to repect security_marking while saving to db
+
+    Performance:
+    The featured, recent, most popular rankings and the bookmark counts are the same for every profile,
+    only the private listings a profile can see differ. The rankings are computed once, then projected
+    through the listing visibility of each distinct visibility class (None for APPS_MALL_STEWARD, else the
+    set of agency ids whose private listings are visible), so the cost grows with the number of distinct
+    agency memberships instead of the number of profiles.
     """
     friendly_name = 'Baseline'
     recommendation_weight = 1.0
+    result_size = 36  # Number of listings to take from each ranking
 
     def initiate(self):
         """
         Initiate any variables needed for recommendation_logic function
         """
-        pass
+        self.global_rankings = None
+        self.visibility_classes = None
+
+    def prepare(self):
+        """
+        Compute the global rankings and the profile visibility classes once for all shards
+        """
+        self.global_rankings = self.get_global_rankings()
+        self.visibility_classes = self.get_profile_visibility_classes(self.profile_ids)
+
+    @staticmethod
+    def get_profile_visibility_classes(profile_ids=None):
+        """
+        Group profiles by private listing visibility with three queries,
+        same rules as AccessControlListingManager.for_user_organization_minus_security_markings
+
+        Args:
+            profile_ids: Only group these profile ids (None for all profiles)
+
+        Returns:
+            {visibility_class: [profile_id, ...]}
+            visibility_class is None when the profile can see all private listings, otherwise a frozenset of agency ids
+        """
+        profiles = models.Profile.objects.all()
+        organizations = models.Profile.organizations.through.objects.all()
+        stewarded_organizations = models.Profile.stewarded_organizations.through.objects.all()
+
+        if profile_ids is not None:
+            profiles = profiles.filter(id__in=profile_ids)
+            organizations = organizations.filter(profile_id__in=profile_ids)
+            stewarded_organizations = stewarded_organizations.filter(profile_id__in=profile_ids)
+
+        profile_groups = {}
+        for profile_id, group_name in profiles.values_list('id', 'user__groups__name'):
+            profile_groups.setdefault(profile_id, set())
+            if group_name:
+                profile_groups[profile_id].add(group_name)
+
+        profile_organizations = {}
+        for profile_id, agency_id in organizations.values_list('profile_id', 'agency_id'):
+            profile_organizations.setdefault(profile_id, set()).add(agency_id)
+
+        profile_stewarded_organizations = {}
+        for profile_id, agency_id in stewarded_organizations.values_list('profile_id', 'agency_id'):
+            profile_stewarded_organizations.setdefault(profile_id, set()).add(agency_id)
+
+        visibility_classes = {}
+        for profile_id, group_names in profile_groups.items():
+            if 'APPS_MALL_STEWARD' in group_names:
+                visibility_class = None
+            elif 'ORG_STEWARD' in group_names:
+                visibility_class = frozenset(profile_stewarded_organizations.get(profile_id, ()))
+            else:
+                visibility_class = frozenset(profile_organizations.get(profile_id, ()))
+            visibility_classes.setdefault(visibility_class, []).append(profile_id)
+
+        return visibility_classes
+
+    def get_global_rankings(self):
+        """
+        Get the global rankings and bookmark counts once for all profiles
+
+        Returns:
+            listings: {listing_id: {'id', 'agency_id', 'is_private', 'avg_rate'}}
+            featured_ids, recent_ids, most_popular_ids: listing ids in ranking order
+            bookmark_counts: {listing_id: count}
+        """
+        visible_listings = models.Listing.objects.filter(approval_status=models.Listing.APPROVED,
+                                                         is_enabled=True,
+                                                         is_deleted=False)
+        listing_values = ('id', 'agency_id', 'is_private', 'avg_rate')
+
+        listings = {}
+        featured_ids = []
+        recent_ids = []
+        for listing in visible_listings.order_by('-approved_date').values(*(listing_values + ('is_featured',))):
+            listings[listing['id']] = listing
+            if listing['is_featured']:
+                featured_ids.append(listing['id'])
+            else:
+                recent_ids.append(listing['id'])
+
+        most_popular_ids = list(visible_listings.order_by('-avg_rate', '-total_reviews').values_list('id', flat=True))
+
+        library_entries = models.ApplicationLibraryEntry.objects.filter(listing__is_enabled=True,
+                                                                        listing__is_deleted=False,
+                                                                        listing__approval_status=models.Listing.APPROVED)
+        library_entries_group_by_count = library_entries.values('listing_id').annotate(count=Count('listing_id')).order_by('-count')
+        # [{'listing_id': 1, 'count': 1}, {'listing_id': 2, 'count': 1}]
+        bookmark_counts = {entry['listing_id']: entry['count'] for entry in library_entries_group_by_count}
+
+        return listings, featured_ids, recent_ids, most_popular_ids, bookmark_counts
+
+    def visibility_class_scores(self, visibility_class, listings, featured_ids, recent_ids, most_popular_ids, bookmark_counts):
+        """
+        Project the global rankings through the visibility of a visibility class
+
+        Returns:
+            {listing_id: score}
+        """
+        def is_visible(listing_id):
+            listing = listings[listing_id]
+            return visibility_class is None or not listing['is_private'] or listing['agency_id'] in visibility_class
+
+        scores = {}
+
+        def add_score(listing_id, score):
+            scores[listing_id] = scores.get(listing_id, 0.0) + float(score)
+
+        # Get Featured Listings
+        for listing_id in [listing_id for listing_id in featured_ids if is_visible(listing_id)][:self.result_size]:
+            add_score(listing_id, 3.0)
+
+        # Get Recent Listings
+        for listing_id in [listing_id for listing_id in recent_ids if is_visible(listing_id)][:self.result_size]:
+            add_score(listing_id, 2.0)
+
+        # Get most popular listings via a weighted average
+        for listing_id in [listing_id for listing_id in most_popular_ids if is_visible(listing_id)][:self.result_size]:
+            avg_rate = listings[listing_id]['avg_rate']
+            if avg_rate != 0:
+                add_score(listing_id, avg_rate)
+
+        # Get most popular bookmarked apps for all users
+        visible_bookmark_counts = {listing_id: count for listing_id, count in bookmark_counts.items()
+                                   if listing_id in listings and is_visible(listing_id)}
+
+        # Calculation of Min and Max new scores dynamically.  This will increase the values that are lower
+        # to a range within 2 and 5, but will not cause values higher than new_min and new_max to become even
+        # larger.
+        old_min = 1
+        old_max = 1
+        new_min = 2
+        new_max = 5
+
+        for count in visible_bookmark_counts.values():
+            if count == 0:
+                continue
+            if count > old_max:
+                old_max = count
+            if count < old_min:
+                old_min = count
+
+        for listing_id, count in visible_bookmark_counts.items():
+            calculation = recommend_utils.map_numbers(count, old_min, old_max, new_min, new_max)
+            add_score(listing_id, calculation)
+
+        return scores
 
     def recommendation_logic(self):
         """
         Sample Recommendations for all users
         """
-        all_profiles = models.Profile.objects.all()
-        all_profiles_count = all_profiles.count()
+        visibility_classes = {}
+        for visibility_class, profile_ids in self.visibility_classes.items():
+            profile_ids = [profile_id for profile_id in profile_ids if self.is_profile_in_shard(profile_id)]
+            if profile_ids:
+                visibility_classes[visibility_class] = profile_ids
+        visibility_classes_count = len(visibility_classes)
 
-        current_profile_count = 0
-        for profile in all_profiles:
-            current_profile_count = current_profile_count + 1
-            logger.info('Calculating Profile {}/{}'.format(current_profile_count, all_profiles_count))
+        current_class_count = 0
+        for visibility_class, profile_ids in visibility_classes.items():
+            current_class_count = current_class_count + 1
+            logger.info('Calculating Visibility Class {}/{} ({} profiles)'.format(current_class_count,
+                                                                                 visibility_classes_count,
+                                                                                 len(profile_ids)))
 
-            profile_id = profile.id
-            profile_username = profile.user.username
-            # Get Featured Listings
-            featured_listings = models.Listing.objects.for_user_organization_minus_security_markings(
-                profile_username).order_by('-approved_date').filter(
-                    is_featured=True,
-                    approval_status=models.Listing.APPROVED,
-                    is_enabled=True,
-                    is_deleted=False)[:36]
-
-            for current_listing in featured_listings:
-                self.add_listing_to_user_profile(profile_id, current_listing.id, 3.0, True)
-
-            # Get Recent Listings
-            recent_listings = models.Listing.objects.for_user_organization_minus_security_markings(
-                profile_username).order_by(
-                    '-approved_date').filter(
-                        is_featured=False,
-                        approval_status=models.Listing.APPROVED,
-                        is_enabled=True,
-                        is_deleted=False)[:36]
-
-            for current_listing in recent_listings:
-                self.add_listing_to_user_profile(profile_id, current_listing.id, 2.0, True)
-
-            # Get most popular listings via a weighted average
-            most_popular_listings = models.Listing.objects.for_user_organization_minus_security_markings(
-                profile_username).filter(
-                    approval_status=models.Listing.APPROVED,
-                    is_enabled=True,
-                    is_deleted=False).order_by('-avg_rate', '-total_reviews')[:36]
-
-            for current_listing in most_popular_listings:
-                if current_listing.avg_rate != 0:
-                    self.add_listing_to_user_profile(profile_id, current_listing.id, current_listing.avg_rate, True)
-
-            # Get most popular bookmarked apps for all users
-            # Would it be faster it this code was outside the loop for profiles?
-            library_entries = models.ApplicationLibraryEntry.objects.for_user_organization_minus_security_markings(profile_username)
-            library_entries = library_entries.filter(listing__is_enabled=True)
-            library_entries = library_entries.filter(listing__is_deleted=False)
-            library_entries = library_entries.filter(listing__approval_status=models.Listing.APPROVED)
-            library_entries_group_by_count = library_entries.values('listing_id').annotate(count=Count('listing_id')).order_by('-count')
-            # [{'listing_id': 1, 'count': 1}, {'listing_id': 2, 'count': 1}]
-
-            # Calculation of Min and Max new scores dynamically.  This will increase the values that are lower
-            # to a range within 2 and 5, but will not cause values higher than new_min and new_max to become even
-            # larger.
-            old_min = 1
-            old_max = 1
-            new_min = 2
-            new_max = 5
-
-            for entry in library_entries_group_by_count:
-                count = entry['count']
-                if count == 0:
-                    continue
-                if count > old_max:
-                    old_max = count
-                if count < old_min:
-                    old_min = count
-
-            for entry in library_entries_group_by_count:
-                listing_id = entry['listing_id']
-                count = entry['count']
-
-                calculation = recommend_utils.map_numbers(count, old_min, old_max, new_min, new_max)
-                self.add_listing_to_user_profile(profile_id, listing_id, calculation, True)
+            scores = self.visibility_class_scores(visibility_class, *self.global_rankings)
+
+            # Profiles of the same visibility class share the same (read only) scores dictionary
+            if scores:
+                for profile_id in profile_ids:
+                    self.recommender_result_set[profile_id] = scores
 
 
 class ElasticsearchRecommender(Recommender):
@@ -265,6 +429,9 @@ class ElasticsearchRecommender(Recommender):
     MIN_ES_RATING = 3.5
     WAIT_TIME = 30  # Wait time in Minutes before running recreation of index
     TIMESTAMP_INDEX_TYPE = 'custom_meta'
+    PROFILE_CHUNK_SIZE = 500  # Profiles prefetched at a time (keeps IN queries under the SQLite variable limit)
+    BULK_CHUNK_SIZE = 500  # Max number of documents in a bulk request
+    BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024  # Max size of a bulk request
 
     @staticmethod
     def set_timestamp_record():
@@ -425,6 +592,102 @@ class ElasticsearchRecommender(Recommender):
         }
         return index_mapping
 
+    @staticmethod
+    def get_profile_query(profile_id):
+        """
+        Query to get the Elasticsearch Recommendation Table document of a profile
+        """
+        return {
+            "query": {
+                "bool": {
+                    "must": [
+                        {"term": {"author_id": profile_id}}
+                    ]
+                }
+            }
+        }
+
+    @staticmethod
+    def msearch(searches):
+        """
+        Run searches in a single _msearch request
+
+        Args:
+            searches: [(index_name, query_body), ...]
+
+        Returns:
+            [search result or None if that search failed, ...] in the same order as searches
+        """
+        if not searches:
+            return []
+
+        es_client = elasticsearch_factory.get_client()
+        body = []
+        for index_name, query_body in searches:
+            body.append({"index": index_name})
+            body.append(query_body)
+
+        results = []
+        for response in es_client.msearch(body=body)['responses']:
+            if 'error' in response:
+                logger.error('Elasticsearch multi search error: {}'.format(response['error']))
+                results.append(None)
+            else:
+                results.append(response)
+        return results
+
+    def get_recommendation_search(self, profile_source):
+        """
+        Build the recommendation search of a profile from its Elasticsearch Recommendation Table document
+
+        Returns:
+            (index_name, query_body)
+        """
+        raise NotImplementedError()
+
+    def batch_recommendation(self, profile_ids):
+        """
+        Run the recommendation searches of a batch of profiles with two _msearch requests
+        (profile documents, then recommendation searches)
+
+        Returns:
+            [(profile_id, search result or None if the profile has no document), ...]
+        """
+        start_ms = time.time() * 1000.0
+
+        profile_results = self.msearch([(settings.ES_RECOMMEND_USER, self.get_profile_query(profile_id)) for profile_id in profile_ids])
+
+        searches = []
+        search_profile_ids = []
+        for profile_id, profile_result in zip(profile_ids, profile_results):
+            if profile_result and profile_result['hits']['hits']:
+                searches.append(self.get_recommendation_search(profile_result['hits']['hits'][0]['_source']))
+                search_profile_ids.append(profile_id)
+
+        profile_search_results = dict(zip(search_profile_ids, self.msearch(searches)))
+
+        logger.info('= {} batch of {} profiles took {:.2f} ms ='.format(self.friendly_name, len(profile_ids), time.time() * 1000.0 - start_ms))
+        return [(profile_id, profile_search_results.get(profile_id)) for profile_id in profile_ids]
+
+    def iterate_recommendations(self):
+        """
+        Generator of (profile_id, search result) for every profile
+
+        Profiles are split in batches of ES_RECOMMEND_MSEARCH_BATCH_SIZE, the batches are run over a pool of
+        ES_RECOMMEND_MSEARCH_THREADS threads
+        """
+        profile_ids = list(self.get_profiles().values_list('id', flat=True))
+        batch_size = settings.ES_RECOMMEND_MSEARCH_BATCH_SIZE
+        batches = [profile_ids[index:index + batch_size] for index in range(0, len(profile_ids), batch_size)]
+
+        current_profile_count = 0
+        with ThreadPoolExecutor(max_workers=settings.ES_RECOMMEND_MSEARCH_THREADS) as executor:
+            for batch_results in executor.map(self.batch_recommendation, batches):
+                for profile_id, search_result in batch_results:
+                    yield profile_id, search_result
+                current_profile_count = current_profile_count + len(batch_results)
+                logger.info("= {} Completed Results for {}/{} =".format(self.friendly_name, current_profile_count, len(profile_ids)))
+
     def initiate(self):
         """
         Make sure the Elasticsearch is up and running
@@ -436,104 +699,176 @@ class ElasticsearchRecommender(Recommender):
             elasticsearch_factory.recreate_index_mapping(settings.ES_RECOMMEND_USER, ElasticsearchRecommender.get_index_mapping())
             ElasticsearchRecommender.load_data_into_es_table()
 
+    @staticmethod
+    def get_listings_document_data():
+        """
+        Get the listing fields used in the profile documents with three queries
+
+        Returns:
+            {listing_id: {'title', 'description', 'description_short', 'is_private', 'agency_id', 'is_enabled',
+                          'is_deleted', 'security_marking', 'tags': [tag name, ...], 'categories': [(category_id, title), ...]}}
+        """
+        listings = {}
+        for listing in models.Listing.objects.values('id', 'title', 'description', 'description_short', 'is_private',
+                                                     'agency_id', 'is_enabled', 'is_deleted', 'security_marking'):
+            listing['tags'] = []
+            listing['categories'] = []
+            listings[listing['id']] = listing
+
+        for listing_id, tag_name in models.Listing.tags.through.objects.values_list('listing_id', 'tag__name'):
+            listings[listing_id]['tags'].append(tag_name)
+
+        for listing_id, category_id, category_title in models.Listing.categories.through.objects.values_list('listing_id', 'category_id', 'category__title'):
+            listings[listing_id]['categories'].append((category_id, category_title))
+
+        return listings
+
+    @staticmethod
+    def generate_profile_documents():
+        """
+        Generator of Elasticsearch profile documents
+
+        Profiles are read in chunks of PROFILE_CHUNK_SIZE, the reviews, bookmarks and visibility of a chunk are
+        prefetched with set-based queries, so memory does not grow with the number of profiles.
+        Bookmarks are filtered like AccessControlApplicationLibraryEntryManager.for_user
+        """
+        listings = ElasticsearchRecommender.get_listings_document_data()
+
+        last_profile_id = 0
+        while True:
+            profiles = list(models.Profile.objects.filter(id__gt=last_profile_id).order_by('id').values_list(
+                'id', 'user_id', 'user__username')[:ElasticsearchRecommender.PROFILE_CHUNK_SIZE])
+            if not profiles:
+                break
+            last_profile_id = profiles[-1][0]
+            profile_ids = [profile[0] for profile in profiles]
+
+            # Reviews are looked up by the profile user_id (same as the author filter used before)
+            reviews_by_author = {}
+            for author_id, listing_id, rate in models.Review.objects.filter(
+                    author_id__in=[profile[1] for profile in profiles]).order_by('id').values_list('author_id', 'listing_id', 'rate'):
+                reviews_by_author.setdefault(author_id, []).append((listing_id, rate))
+
+            bookmarks_by_owner = {}
+            for owner_id, listing_id in models.ApplicationLibraryEntry.objects.filter(
+                    owner_id__in=profile_ids).order_by('id').values_list('owner_id', 'listing_id'):
+                bookmarks_by_owner.setdefault(owner_id, []).append(listing_id)
+
+            profile_visibility_class = {}
+            for visibility_class, class_profile_ids in BaselineRecommender.get_profile_visibility_classes(profile_ids).items():
+                for profile_id in class_profile_ids:
+                    profile_visibility_class[profile_id] = visibility_class
+
+            for profile_id, user_id, username in profiles:
+                title_text_list = set()
+                description_text_list = set()
+                description_short_text_list = set()
+                categories_text_list = set()
+                category_id_list = set()
+                tags_text_list = set()
+
+                profile_listings_review = []
+                for listing_id, rate in reviews_by_author.get(user_id, []):
+                    listing = listings[listing_id]
+
+                    if rate > ElasticsearchRecommender.MIN_ES_RATING:
+                        title_text_list.add(listing['title'])
+                        description_text_list.add(listing['description'])
+                        description_short_text_list.add(listing['description_short'])
+
+                    tags_text_list.update(listing['tags'])
+
+                    listing_category_id_list = set()
+                    for category_id, category_title in listing['categories']:
+                        listing_category_id_list.add(category_id)
+                        categories_text_list.add(category_title)
+                        category_id_list.add(category_id)
+
+                    update_item = {"listing_id": listing_id,
+                                   "rate": rate,
+                                   "listing_categories": list(categories_text_list),
+                                   "category_ids": list(listing_category_id_list)}
+                    profile_listings_review.append(update_item)
+
+                visibility_class = profile_visibility_class.get(profile_id, frozenset())
+                profile_bookmarks = bookmarks_by_owner.get(profile_id, [])
+                allowed_security_markings = system_allowed_security_markings(
+                    username, [listings[listing_id]['security_marking'] for listing_id in profile_bookmarks])
+
+                bookmarked_id_list = []
+                for listing_id in profile_bookmarks:
+                    listing = listings[listing_id]
+                    if not listing['is_enabled'] or listing['is_deleted']:
+                        continue
+                    if listing['is_private'] and visibility_class is not None and listing['agency_id'] not in visibility_class:
+                        continue
+                    if listing['security_marking'] not in allowed_security_markings:
+                        continue
+
+                    bookmarked_id_list.append(listing_id)
+                    title_text_list.add(listing['title'])
+                    description_text_list.add(listing['description'])
+                    description_short_text_list.add(listing['description_short'])
+                    categories_text_list.update(category_title for category_id, category_title in listing['categories'])
+                    tags_text_list.update(listing['tags'])
+
+                yield {"author_id": user_id,
+                       "author": username,
+                       "titles": list(title_text_list),
+                       "descriptions": list(description_text_list),
+                       "description_shorts": list(description_short_text_list),
+                       "tags": list(tags_text_list),
+                       "categories_text": list(categories_text_list),
+                       "bookmark_ids": bookmarked_id_list,
+                       "categories_id": list(category_id_list),
+                       "ratings": profile_listings_review}
+
+    @staticmethod
+    def generate_bulk_actions():
+        """
+        Generator of bulk index actions for the profile documents
+        """
+        for record in ElasticsearchRecommender.generate_profile_documents():
+            yield {
+                "_index": settings.ES_RECOMMEND_USER,
+                "_type": settings.ES_RECOMMEND_TYPE,
+                "_id": record['author_id'],
+                "_source": record
+            }
+
     @staticmethod
     def load_data_into_es_table():
         """
         - Get Mapping for Elasticsearch Table
-        - Cycle through all profiles:
+        - Stream the documents of all profiles (see generate_profile_documents):
             - For each profile:
                 Get Reviewed Listings with Categories, Title, Description, and Description Short Text
                 Get Bookmarked Listings with Categories, Title, Description, and Description Short Text
-                Add information to Elasticsearch Table for profile
+        - Send the documents in bulk requests of at most BULK_CHUNK_SIZE documents / BULK_MAX_CHUNK_BYTES
         - Set timestamp for data creation
         """
         es_client = elasticsearch_factory.get_client()
 
-        all_profiles = models.Profile.objects.all()
-
-        data_to_bulk_index = []
-        for profile in all_profiles:
-            profile_username = profile.user.username
-
-            title_text_list = set()
-            description_text_list = set()
-            description_short_text_list = set()
-            categories_text_list = set()
-            category_id_list = set()
-            tags_text_list = set()
-
-            profile_listings_review = []
-            for review_object in models.Review.objects.filter(author=profile.user_id):
-                listing_obj = review_object.listing
-
-                if review_object.rate > ElasticsearchRecommender.MIN_ES_RATING:
-                    title_text_list.add(listing_obj.title)
-                    description_text_list.add(listing_obj.description)
-                    description_short_text_list.add(listing_obj.description_short)
-
-                for tagitem in listing_obj.tags.all():
-                    tags_text_list.add(tagitem.name)
-
-                listing_categories = set()
-                listing_category_id_list = set()
-                for cat_item in review_object.listing.categories.all():
-                    listing_categories.add(cat_item.title)
-                    listing_category_id_list.add(cat_item.id)
-                    categories_text_list.add(cat_item.title)
-                    category_id_list.add(cat_item.id)
-
-                update_item = {"listing_id": review_object.listing_id,
-                               "rate": review_object.rate,
-                               "listing_categories": list(categories_text_list),
-                               "category_ids": list(listing_category_id_list)}
-                profile_listings_review.append(update_item)
-
-            bookmarked_id_list = []
-            for bookmark_item in models.ApplicationLibraryEntry.objects.for_user(profile.user.username):
-                bookmarked_listing_obj = bookmark_item.listing
-                bookmarked_id_list.append(bookmarked_listing_obj.id)
-                title_text_list.add(bookmarked_listing_obj.title)
-                description_text_list.add(bookmarked_listing_obj.description)
-                description_short_text_list.add(bookmarked_listing_obj.description_short)
-
-                for cat_item in bookmarked_listing_obj.categories.all():
-                    categories_text_list.add(cat_item.title)
-
-                for tagitem in bookmarked_listing_obj.tags.all():
-                    tags_text_list.add(tagitem.name)
-
-            data_to_bulk_index.append({"author_id": profile.user_id,
-                "author": profile_username,
-                "titles": list(title_text_list),
-                "descriptions": list(description_text_list),
-                "description_shorts": list(description_short_text_list),
-                "tags": list(tags_text_list),
-                "categories_text": list(categories_text_list),
-                "bookmark_ids": list(bookmarked_id_list),
-                "categories_id": list(category_id_list),
-                "ratings": profile_listings_review})
-
-        # TODO data_to_bulk_index = [1..19500] > [[1..5000],[5001..10000], .., [15001..19500]]
-        bulk_data = []
-        for record in data_to_bulk_index:
-            op_dict = {
-                "index": {
-                    "_index": settings.ES_RECOMMEND_USER,
-                    "_type": settings.ES_RECOMMEND_TYPE,
-                    "_id": record['author_id']
-                }
-            }
+        logger.info('Bulk indexing Users...')
+        indexed_count = 0
+        error_count = 0
+        for is_success, item in helpers.streaming_bulk(es_client,
+                                                       ElasticsearchRecommender.generate_bulk_actions(),
+                                                       chunk_size=ElasticsearchRecommender.BULK_CHUNK_SIZE,
+                                                       max_chunk_bytes=ElasticsearchRecommender.BULK_MAX_CHUNK_BYTES,
+                                                       raise_on_error=False):
+            if is_success:
+                indexed_count = indexed_count + 1
+            else:
+                error_count = error_count + 1
+                logger.error('Error Bulk Recommendation Indexing: {}'.format(item))
 
-            bulk_data.append(op_dict)
-            bulk_data.append(record)
+        es_client.indices.refresh(index=settings.ES_RECOMMEND_USER)
 
-        # Bulk index the data
-        logger.info('Bulk indexing Users...')
-        res = es_client.bulk(index=settings.ES_RECOMMEND_USER, body=bulk_data, refresh=True)
-        if res.get('errors', True):
-            logger.error('Error Bulk Recommendation Indexing')
+        if error_count:
+            logger.error('Bulk Recommendation Indexing: {} indexed, {} errors'.format(indexed_count, error_count))
         else:
-            logger.info('Bulk Recommendation Indexing Successful')
+            logger.info('Bulk Recommendation Indexing Successful: {} indexed'.format(indexed_count))
 
         logger.info("Done Indexing")
 
@@ -573,22 +908,31 @@ class ElasticsearchContentBaseRecommender(ElasticsearchRecommender):
         """
         es_client = elasticsearch_factory.get_client()
 
-        query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {"term": {"author_id": profile_id}}
-                    ]
-                }
-            }
-        }
-
         es_profile_result = es_client.search(
             index=settings.ES_RECOMMEND_USER,
-            body=query
+            body=self.get_profile_query(profile_id)
         )
 
-        each_profile_source = es_profile_result['hits']['hits'][0]['_source']
+        index_name, query_compare = self.get_recommendation_search(es_profile_result['hits']['hits'][0]['_source'], result_size)
+
+        es_query_result = es_client.search(
+            index=index_name,
+            body=query_compare
+        )
+
+        return es_query_result
+
+    def get_recommendation_search(self, each_profile_source, result_size=None):
+        """
+        Content Based Recommendations search of a profile:
+        - Match the categories and text of the profile against listings
+        - Exclude apps that are already in the profile
+
+        Returns:
+            (index_name, query_body)
+        """
+        if result_size is None:
+            result_size = self.result_size
 
         query_object = []
 
@@ -661,12 +1005,7 @@ class ElasticsearchContentBaseRecommender(ElasticsearchRecommender):
             }
         }
 
-        es_query_result = es_client.search(
-            index=settings.ES_INDEX_NAME,
-            body=query_compare
-        )
-
-        return es_query_result
+        return settings.ES_INDEX_NAME, query_compare
 
     def new_user_return_list(self, result_size):
         """
@@ -731,20 +1070,13 @@ class ElasticsearchContentBaseRecommender(ElasticsearchRecommender):
         The list is then normalized and added to the recommendations database.
         """
         logger.info('= Elasticsearch Content Base Recommendation Engine= ')
-        all_profiles = models.Profile.objects.all()
-        all_profiles_count = all_profiles.count()
 
         performed_search_request = False
         new_user_return_list = []
-        current_profile_count = 0
-
-        for profile in all_profiles:
-            current_profile_count = current_profile_count + 1
-            profile_id = profile.id
-            es_query_result = self.es_content_based_recommendation(profile_id, self.result_size)
 
+        for profile_id, es_query_result in self.iterate_recommendations():
             # Check if results returned are returned or if it is empty (New User):
-            if es_query_result['hits']['total'] == 0:
+            if es_query_result is None or es_query_result['hits']['total'] == 0:
                 if not performed_search_request:
                     new_user_return_list = self.new_user_return_list(int(self.result_size / 2))
                     performed_search_request = True
@@ -759,7 +1091,6 @@ class ElasticsearchContentBaseRecommender(ElasticsearchRecommender):
                 score = recommend_utils.map_numbers(indexitem['_score'], 0, max_score_es_content, self.min_new_score, self.max_new_score)
                 itemtoadd = indexitem['_source']['id']
                 self.add_listing_to_user_profile(profile_id, itemtoadd, score, False)
-            logger.info("= ES CONTENT RECOMMENDER Engine Completed Results for {}/{} =".format(current_profile_count, all_profiles_count))
 
         logger.info("= ES CONTENT RECOMMENDATION Results Completed =")
 
@@ -792,29 +1123,48 @@ class ElasticsearchUserBaseRecommender(ElasticsearchRecommender):
         - Return list of recommended items back to calling method
         See: https://github.com/aml-development/ozp-backend/wiki/Elasticsearch-Recommendation-Engine
         """
-        AGG_LIST_SIZE = 50  # Default is 10 if parameter is left out of query.
-
         es_client = elasticsearch_factory.get_client()
-        es_profile_search = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {"term": {"author_id": profile_id}}
-                    ],
-                }
-            }
-        }
 
         es_search_result = es_client.search(
             index=settings.ES_RECOMMEND_USER,
-            body=es_profile_search
+            body=self.get_profile_query(profile_id)
+        )
+
+        index_name, agg_search_query = self.get_recommendation_search(es_search_result['hits']['hits'][0]['_source'])
+
+        es_query_result = es_client.search(
+            index=index_name,
+            body=agg_search_query
         )
 
+        return self.get_recommended_items(es_query_result)
+
+    @staticmethod
+    def get_recommended_items(es_query_result):
+        """
+        Get the recommended listing buckets ({'key': listing_id, 'score': score}) of a user based search result
+        """
+        if es_query_result is None:
+            return []
+        return es_query_result['aggregations']['the_listing']['aggs']['buckets']
+
+    def get_recommendation_search(self, profile_source):
+        """
+        User Based Recommendations search of a profile:
+        - Get Categories, Bookmarks, Rated Apps (all and ones only greater than MIN_ES_RATING)
+        - Match profiles with the same bookmarked and rated apps, aggregate their ratings and remove apps
+          that have been identified by user already.
+
+        Returns:
+            (index_name, query_body)
+        """
+        AGG_LIST_SIZE = 50  # Default is 10 if parameter is left out of query.
+
         agg_query_term = {}
-        categories_to_match = es_search_result['hits']['hits'][0]['_source']['categories_id']
-        bookmarks_to_match = es_search_result['hits']['hits'][0]['_source']['bookmark_ids']
-        rated_apps_list = list([rate['listing_id'] for rate in es_search_result['hits']['hits'][0]['_source']['ratings']])
-        rated_apps_list_match = list([rate['listing_id'] for rate in es_search_result['hits']['hits'][0]['_source']['ratings'] if rate['rate'] > ElasticsearchRecommender.MIN_ES_RATING])
+        categories_to_match = profile_source['categories_id']
+        bookmarks_to_match = profile_source['bookmark_ids']
+        rated_apps_list = list([rate['listing_id'] for rate in profile_source['ratings']])
+        rated_apps_list_match = list([rate['listing_id'] for rate in profile_source['ratings'] if rate['rate'] > ElasticsearchRecommender.MIN_ES_RATING])
 
         agg_query_term = {
             "constant_score": {
@@ -873,14 +1223,7 @@ class ElasticsearchUserBaseRecommender(ElasticsearchRecommender):
             }
         }
 
-        es_query_result = es_client.search(
-            index=settings.ES_RECOMMEND_USER,
-            body=agg_search_query
-        )
-
-        recommended_items = es_query_result['aggregations']['the_listing']['aggs']['buckets']
-
-        return recommended_items
+        return settings.ES_RECOMMEND_USER, agg_search_query
 
     def recommendation_logic(self):
         """
@@ -896,16 +1239,8 @@ class ElasticsearchUserBaseRecommender(ElasticsearchRecommender):
         """
         logger.info('= Elasticsearch User Base Recommendation Engine =')
 
-        # Retreive all of the profiles from database:
-        all_profiles = models.Profile.objects.all()
-        all_profiles_count = all_profiles.count()
-
-        current_profile_count = 0
-        for profile in all_profiles:
-            current_profile_count = current_profile_count + 1
-
-            profile_id = profile.id
-            recommended_items = self.es_user_based_recommendation(profile_id)
+        for profile_id, es_query_result in self.iterate_recommendations():
+            recommended_items = self.get_recommended_items(es_query_result)
 
             # If a recommendaiton list is returned then get the max score,
             # otherwise it is a new user or there is no profile to base recommendations on:
@@ -916,7 +1251,6 @@ class ElasticsearchUserBaseRecommender(ElasticsearchRecommender):
                 score = recommend_utils.map_numbers(indexitem['score'], 0, max_score_es_user, self.min_new_score, self.max_new_score)
                 self.add_listing_to_user_profile(profile_id, indexitem['key'], score, False)
 
-            logger.info("= ES USER RECOMMENDER Engine Completed Results for {}/{} =".format(current_profile_count, all_profiles_count))
         logger.info("= ES USER RECOMMENDATION Results Completed =")
 
 
@@ -931,16 +1265,22 @@ class GraphCollaborativeFilteringBaseRecommender(Recommender):
         """
         Initiate any variables needed for recommendation_logic function
         """
-        pass
+        self.graph = None
+
+    def prepare(self):
+        """
+        Load the bookmark graph once for all shards
+        """
+        self.graph = GraphFactory.load_db_into_compact_graph()
 
     def recommendation_logic(self):
         """
         Recommendation logic
         """
-        all_profiles = models.Profile.objects.all()
+        all_profiles = self.get_profiles()
         all_profiles_count = all_profiles.count()
 
-        graph = GraphFactory.load_db_into_graph()
+        graph = self.graph
 
         current_profile_count = 0
         for profile in all_profiles:
@@ -960,21 +1300,96 @@ class GraphCollaborativeFilteringBaseRecommender(Recommender):
                 self.add_listing_to_user_profile(profile_id, listing_id, score)
 
 
+class BookmarkMatrixCollaborativeFilteringRecommender(Recommender):
+    """
+    Bookmark Collaborative Filtering over a sparse Profile x Listing matrix
+
+    Same ranking as GraphCollaborativeFilteringBaseRecommender, but loads all bookmarks with one query
+    and computes co-bookmark counts for all profiles at once (see ozpcenter.recommend.bookmark_matrix)
+    """
+    friendly_name = 'Bookmark Matrix Collaborative Filtering'
+    recommendation_weight = 5.0
+
+    def initiate(self):
+        """
+        Initiate any variables needed for recommendation_logic function
+        """
+        self.matrix = None
+
+    def prepare(self):
+        """
+        Load the bookmark matrix once for all shards
+        """
+        # Same listings as the ones GraphFactory.load_db_into_graph loads
+        bookmark_pairs = models.ApplicationLibraryEntry.objects.filter(
+            listing__is_enabled=True,
+            listing__is_deleted=False,
+            listing__approval_status=models.Listing.APPROVED).values_list('owner_id', 'listing_id')
+
+        self.matrix = BookmarkMatrix(bookmark_pairs.iterator())
+
+    def recommendation_logic(self):
+        """
+        Recommendation logic
+        """
+        for profile_id, listing_scores in self.matrix.recommend_all(self.is_profile_in_shard):
+            for listing_id, score in listing_scores:
+                # No need to rebase since results are within the range of others based on testing:
+                self.add_listing_to_user_profile(profile_id, listing_id, score)
+
+
 # Method is decorated with @transaction.atomic to ensure all logic is executed in a single transaction
 @transaction.atomic
 def bulk_recommendations_saver(recommendation_entries):
-    # Loop over each store and invoke save() on each entry
-    for recommendation_entry in recommendation_entries:
-        target_profile = recommendation_entry['target_profile']
-        recommendation_data = recommendation_entry['recommendation_data']
+    """
+    Replace the RecommendationsEntry rows of the profiles in recommendation_entries with set-based queries:
+    one DELETE for the existing rows of the batch and one bulk INSERT
 
-        try:
-            obj = models.RecommendationsEntry.objects.get(target_profile=target_profile)
-            obj.recommendation_data = recommendation_data
-            obj.save()
-        except models.RecommendationsEntry.DoesNotExist:
-            obj = models.RecommendationsEntry(target_profile=target_profile, recommendation_data=recommendation_data)
-            obj.save()
+    Args:
+        recommendation_entries: [{'target_profile_id': profile_id, 'recommendation_data': bytes, 'recommendation_top_n': bytes}, ...]
+    """
+    target_profile_ids = [recommendation_entry['target_profile_id'] for recommendation_entry in recommendation_entries]
+    models.RecommendationsEntry.objects.filter(target_profile_id__in=target_profile_ids).delete()
+
+    models.RecommendationsEntry.objects.bulk_create(
+        [models.RecommendationsEntry(target_profile_id=recommendation_entry['target_profile_id'],
+                                     recommendation_data=recommendation_entry['recommendation_data'],
+                                     recommendation_top_n=recommendation_entry['recommendation_top_n'])
+         for recommendation_entry in recommendation_entries])
+
+
+# Recommender objects initiated and prepared by the parent process, set in each process pool worker
+shard_recommender_list = []
+
+
+def init_shard_worker(recommender_list):
+    """
+    Process pool initializer, keep the recommenders prepared by the parent process
+    """
+    global shard_recommender_list
+    shard_recommender_list = recommender_list
+
+
+def recommend_shard(profile_id_range):
+    """
+    Process pool worker, score a shard of profiles with the recommenders prepared by the parent process
+
+    Args:
+        profile_id_range: (min_profile_id, max_profile_id)
+
+    Returns:
+        [(friendly_name, recommendation_weight, recommendations_results, recommendations_time), ...]
+    """
+    recommender_directory = RecommenderDirectory()
+
+    shard_results = []
+    for recommender_obj in shard_recommender_list:
+        shard_results.append(recommender_directory.run_recommender(recommender_obj.get_shard(profile_id_range)))
+
+    for connection in connections.all():
+        connection.close()
+
+    return shard_results
 
 
 class RecommenderDirectory(object):
@@ -1032,15 +1447,16 @@ class RecommenderDirectory(object):
             'sample_data': SampleDataRecommender,
             'baseline': BaselineRecommender,
             'graph_cf': GraphCollaborativeFilteringBaseRecommender,
+            'bookmark_matrix_cf': BookmarkMatrixCollaborativeFilteringRecommender,
         }
         self.recommender_result_set = {}
 
-    def get_recommender_class_obj(self, recommender_class_string):
+    def get_recommender_class_obj(self, recommender_class_string, profile_id_range=None, profile_ids=None):
         """
         Get Recommender class and make a instance of it
         """
         if recommender_class_string in self.recommender_classes:
-            return self.recommender_classes[recommender_class_string]()
+            return self.recommender_classes[recommender_class_string](profile_id_range, profile_ids)
         else:
             raise Exception('Recommender Engine [{}] Not Found'.format(recommender_class_string))
 
@@ -1088,95 +1504,224 @@ class RecommenderDirectory(object):
 
         return True
 
-    def recommend(self, recommender_string):
+    def run_recommender(self, recommender_obj):
+        """
+        Execute recommender object
+
+        Returns:
+            (friendly_name, recommendation_weight, recommendations_results, recommendations_time)
+        """
+        logger.info('=={}=='.format(recommender_obj.__class__.__name__))
+
+        friendly_name = recommender_obj.__class__.__name__
+        if hasattr(recommender_obj.__class__, 'friendly_name'):
+            friendly_name = recommender_obj.__class__.friendly_name
+
+        recommendation_weight = 1.0
+        if hasattr(recommender_obj.__class__, 'recommendation_weight'):
+            recommendation_weight = recommender_obj.__class__.recommendation_weight
+
+        recommendations_start_ms = time.time() * 1000.0
+        recommendations_results = recommender_obj.recommend()
+        recommendations_end_ms = time.time() * 1000.0
+        recommendations_time = recommendations_end_ms - recommendations_start_ms
+
+        return friendly_name, recommendation_weight, recommendations_results, recommendations_time
+
+    @staticmethod
+    def get_profile_id_ranges(shard_count):
+        """
+        Partition profiles into shard_count contiguous id ranges of about the same number of profiles
+
+        Returns:
+            [(min_profile_id, max_profile_id), ...]
+        """
+        profile_ids = list(models.Profile.objects.order_by('id').values_list('id', flat=True))
+        if not profile_ids:
+            return []
+
+        shard_size = -(-len(profile_ids) // shard_count)  # Ceiling division
+        return [(profile_ids[index], profile_ids[min(index + shard_size, len(profile_ids)) - 1])
+                for index in range(0, len(profile_ids), shard_size)]
+
+    @staticmethod
+    def get_incremental_profile_ids(max_dirty_entry_id):
+        """
+        Get the profiles whose recommendations are out of date
+
+        - Profiles that bookmarked/reviewed something (dirty profiles)
+        - Profiles that bookmarked a listing that was bookmarked/unbookmarked/reviewed (dirty listings)
+        - Graph neighbours of dirty profiles: profiles that bookmarked a listing a dirty profile bookmarked
+
+        Args:
+            max_dirty_entry_id: Only take RecommendationsDirtyEntry rows up to this id into account
+
+        Returns:
+            set of profile ids
+        """
+        dirty_entries = models.RecommendationsDirtyEntry.objects.filter(id__lte=max_dirty_entry_id)
+        dirty_profile_ids = set(dirty_entries.filter(profile_id__isnull=False).values_list('profile_id', flat=True))
+        dirty_listing_ids = set(dirty_entries.filter(listing_id__isnull=False).values_list('listing_id', flat=True))
+
+        neighbour_listing_ids = set(models.ApplicationLibraryEntry.objects.filter(
+            owner_id__in=dirty_profile_ids).values_list('listing_id', flat=True))
+
+        profile_ids = set(models.ApplicationLibraryEntry.objects.filter(
+            listing_id__in=dirty_listing_ids | neighbour_listing_ids).values_list('owner_id', flat=True))
+
+        return profile_ids | dirty_profile_ids
+
+    def recommend(self, recommender_string, shard_count=1, incremental=False):
         """
         Creates Recommender Object, and execute the recommend
 
         Args:
             recommender_string: Comma Delimited list of Recommender Engine to execute
+            shard_count: Number of profile shards, when greater than 1 the shards are executed in a process pool
+            incremental: Only recompute the profiles affected by bookmark and review changes since the last run
         """
+        if incremental:
+            self.recommend_incremental(recommender_string)
+            return
+
         recommender_list = [self.get_recommender_class_obj(current_recommender.strip()) for current_recommender in recommender_string.split(',')]
 
         start_ms = time.time() * 1000.0
 
-        for current_recommender_obj in recommender_list:
-            logger.info('=={}=='.format(current_recommender_obj.__class__.__name__))
-
-            friendly_name = current_recommender_obj.__class__.__name__
-            if hasattr(current_recommender_obj.__class__, 'friendly_name'):
-                friendly_name = current_recommender_obj.__class__.friendly_name
-
-            recommendation_weight = 1.0
-            if hasattr(current_recommender_obj.__class__, 'recommendation_weight'):
-                recommendation_weight = current_recommender_obj.__class__.recommendation_weight
-
-            recommender_obj = current_recommender_obj
+        # A full run covers all the changes recorded before it started
+        latest_dirty_entry = models.RecommendationsDirtyEntry.objects.order_by('-id').first()
 
-            recommendations_start_ms = time.time() * 1000.0
-            recommendations_results = recommender_obj.recommend()
-            recommendations_end_ms = time.time() * 1000.0
-            recommendations_time = recommendations_end_ms - recommendations_start_ms
+        if shard_count > 1:
+            self.recommend_sharded(recommender_list, shard_count)
+        else:
+            for current_recommender_obj in recommender_list:
+                friendly_name, recommendation_weight, recommendations_results, recommendations_time = self.run_recommender(current_recommender_obj)
 
-            logger.info('Merging {} into results'.format(friendly_name))
-            self.merge(friendly_name, recommendation_weight, recommendations_results, recommendations_time)
+                logger.info('Merging {} into results'.format(friendly_name))
+                self.merge(friendly_name, recommendation_weight, recommendations_results, recommendations_time)
 
         start_db_ms = time.time() * 1000.0
         self.save_to_db()
+        listing_similarity.save_listing_similarities()
+        if latest_dirty_entry is not None:
+            models.RecommendationsDirtyEntry.objects.filter(id__lte=latest_dirty_entry.id).delete()
         end_db_ms = time.time() * 1000.0
         logger.info('Save to database took: {} ms'.format(end_db_ms - start_db_ms))
         logger.info('Whole Process: {} ms'.format(end_db_ms - start_ms))
 
+    def recommend_incremental(self, recommender_string):
+        """
+        Recompute the recommendations of the profiles affected by the RecommendationsDirtyEntry rows
+        recorded since the last run, and replace their RecommendationsEntry rows.
+
+        Dirty entries recorded while this run is executing are kept for the next run.
+        """
+        start_ms = time.time() * 1000.0
+
+        latest_dirty_entry = models.RecommendationsDirtyEntry.objects.order_by('-id').first()
+        if latest_dirty_entry is None:
+            logger.info('No bookmark or review changes since the last recommendation run')
+            return
+
+        max_dirty_entry_id = latest_dirty_entry.id
+        profile_ids = self.get_incremental_profile_ids(max_dirty_entry_id)
+        logger.info('Incremental recommendation for {} profiles'.format(len(profile_ids)))
+
+        if profile_ids:
+            for current_recommender in recommender_string.split(','):
+                current_recommender_obj = self.get_recommender_class_obj(current_recommender.strip(), profile_ids=profile_ids)
+                friendly_name, recommendation_weight, recommendations_results, recommendations_time = self.run_recommender(current_recommender_obj)
+
+                logger.info('Merging {} into results'.format(friendly_name))
+                self.merge(friendly_name, recommendation_weight, recommendations_results, recommendations_time)
+
+            self.save_to_db()
+
+            # Profiles that no longer have any recommendation
+            stale_profile_ids = [profile_id for profile_id in profile_ids if profile_id not in self.recommender_result_set]
+            if stale_profile_ids:
+                models.RecommendationsEntry.objects.filter(target_profile_id__in=stale_profile_ids).delete()
+
+        listing_similarity.save_listing_similarities(listing_similarity.get_dirty_listing_ids(max_dirty_entry_id))
+        models.RecommendationsDirtyEntry.objects.filter(id__lte=max_dirty_entry_id).delete()
+
+        end_ms = time.time() * 1000.0
+        logger.info('Whole Incremental Process: {} ms'.format(end_ms - start_ms))
+
+    def recommend_sharded(self, recommender_list, shard_count):
+        """
+        Partition profiles into shards and execute the recommenders for each shard in a process pool.
+        Shards do not overlap, so the shard results are merged into the same recommender_result_set.
+
+        The recommenders are initiated (recommend) and prepared (global rankings, visibility classes,
+        bookmark matrix/graph) once in this process before forking, the workers only score the profiles of their shard.
+
+        Args:
+            recommender_list: Recommender objects
+            shard_count: Number of profile shards
+        """
+        for recommender_obj in recommender_list:
+            recommender_obj.ensure_prepared()
+
+        profile_id_ranges = self.get_profile_id_ranges(shard_count)
+        logger.info('Recommending in {} shards: {}'.format(len(profile_id_ranges), profile_id_ranges))
+
+        # Forked workers must not share the parent database connections, each worker opens its own
+        for connection in connections.all():
+            connection.close()
+
+        pool = multiprocessing.Pool(processes=min(shard_count, len(profile_id_ranges)) or 1,
+                                    initializer=init_shard_worker,
+                                    initargs=(recommender_list,))
+        try:
+            for shard_results in pool.imap_unordered(recommend_shard, profile_id_ranges):
+                for friendly_name, recommendation_weight, recommendations_results, recommendations_time in shard_results:
+                    logger.info('Merging {} shard into results'.format(friendly_name))
+                    self.merge(friendly_name, recommendation_weight, recommendations_results, recommendations_time)
+        finally:
+            pool.close()
+            pool.join()
+
     def save_to_db(self):
         """
         This function is responsible for storing the recommendations into the database
 
+        Profile ids and listing ids are validated against id sets loaded with one query each,
+        then RecommendationsEntry rows are written in batches with bulk_recommendations_saver
+
         Performance:
             transaction.atomic() - 430 ms
             Without Atomic and Batch - 1400 ms
         """
+        # Batch size is kept under the SQLite limit of 999 variables per query
+        batch_size = 500
         batch_list = []
 
-        for profile_id in self.recommender_result_set:
-            # print('*-*-*-*-'); import json; print(json.dumps(self.recommender_result_set[profile_id])); print('*-*-*-*-')
-            profile = None
-            try:
-                profile = models.Profile.objects.get(pk=profile_id)
-            except ObjectDoesNotExist:
-                profile = None
+        existing_profile_ids = set(models.Profile.objects.values_list('id', flat=True))
+        existing_listing_ids = set(models.Listing.objects.values_list('id', flat=True))
 
-            if profile:
-                # Clear Recommendations Entries before putting new ones.
-                recommendations_query = models.RecommendationsEntry.objects.filter(target_profile=profile)
-
-                if recommendations_query.count() > 1:
-                    recommendations_query.delete()
-
-                for current_recommender_friendly_name in self.recommender_result_set[profile_id]:
-                    output_current_tuples = []
-
-                    current_recommendations = self.recommender_result_set[profile_id][current_recommender_friendly_name]['recommendations']
+        for profile_id in self.recommender_result_set:
+            if profile_id not in existing_profile_ids:
+                continue
 
-                    for current_recommendation_tuple in current_recommendations:
-                        current_listing_id = current_recommendation_tuple[0]
-                        # current_listing_score = current_recommendation_tuple[1]
+            for current_recommender_friendly_name in self.recommender_result_set[profile_id]:
+                current_recommendations = self.recommender_result_set[profile_id][current_recommender_friendly_name]['recommendations']
 
-                        current_listing = None
-                        try:
-                            current_listing = models.Listing.objects.get(pk=current_listing_id)
-                        except ObjectDoesNotExist:
-                            current_listing = None
+                output_current_tuples = [current_recommendation_tuple for current_recommendation_tuple in current_recommendations
+                                         if current_recommendation_tuple[0] in existing_listing_ids]
 
-                        if current_listing:
-                            output_current_tuples.append(current_recommendation_tuple)
+                self.recommender_result_set[profile_id][current_recommender_friendly_name]['recommendations'] = output_current_tuples
 
-                    self.recommender_result_set[profile_id][current_recommender_friendly_name]['recommendations'] = output_current_tuples
+            # Combined top recommendations are saved pre-sorted so the storefront does not need to merge recommenders
+            combined_recommendations = recommend_utils.combine_recommendations(self.recommender_result_set[profile_id])
 
-                batch_list.append({'target_profile': profile,
-                                   'recommendation_data': msgpack.packb(self.recommender_result_set[profile_id])})
+            batch_list.append({'target_profile_id': profile_id,
+                               'recommendation_data': msgpack.packb(self.recommender_result_set[profile_id]),
+                               'recommendation_top_n': recommend_utils.pack_top_n_scores(combined_recommendations)})
 
-                if len(batch_list) >= 1000:
-                    bulk_recommendations_saver(batch_list)
-                    batch_list = []
+            if len(batch_list) >= batch_size:
+                bulk_recommendations_saver(batch_list)
+                batch_list = []
 
         if batch_list:
             bulk_recommendations_saver(batch_list)
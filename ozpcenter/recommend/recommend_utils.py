@@ -5,6 +5,7 @@ Exception
 """
 from collections import Iterable
 from enum import Enum
+import struct
 
 
 class FastNoSuchElementException(Exception):
@@ -202,3 +203,50 @@ def get_top_n_score(recommendations_results, size_n=30):
         sorted_listing_scores = [[key, listing_scores[key]] for key in sorted(listing_scores, key=listing_scores.get, reverse=True)][:size_n]
         output[profile_id] = sorted_listing_scores
     return output
+
+
+# Packed top-N recommendations: little-endian (int32 listing_id, float32 score) pairs
+TOP_N_PAIR_FORMAT = 'if'
+TOP_N_PAIR_SIZE = struct.calcsize('<' + TOP_N_PAIR_FORMAT)
+
+
+def combine_recommendations(recommendation_data, size_n=40):
+    """
+    Combine the recommendations of each recommender with the recommender weight
+
+    {
+        friendly_name#1: {'weight': weight#1, 'recommendations': [[listing_id#1, score#1], [listing_id#2, score#2]]},
+        friendly_name#2: {'weight': weight#2, 'recommendations': [[listing_id#1, score#3]]}
+    }
+    TO
+    [[listing_id#1, score#1 * weight#1 + score#3 * weight#2], [listing_id#2, score#2 * weight#1]]  (top size_n, score DSC)
+    """
+    combined_scores = {}
+    for friendly_name in recommendation_data:
+        weight = recommendation_data[friendly_name]['weight']
+        for recommendation_tuple in recommendation_data[friendly_name]['recommendations']:
+            listing_id = recommendation_tuple[0]
+            combined_scores[listing_id] = combined_scores.get(listing_id, 0) + recommendation_tuple[1] * weight
+    return get_top_n_score({'profile': combined_scores}, size_n)['profile']
+
+
+def pack_top_n_scores(listing_scores):
+    """
+    Pack [[listing_id, score], ...] into fixed width binary (TOP_N_PAIR_SIZE bytes per pair)
+    """
+    values = []
+    for listing_id, score in listing_scores:
+        values.append(listing_id)
+        values.append(score)
+    return struct.pack('<' + TOP_N_PAIR_FORMAT * len(listing_scores), *values)
+
+
+def unpack_top_n_scores(data):
+    """
+    Unpack the binary made by pack_top_n_scores with a single struct unpack
+
+    Return:
+        [(listing_id, score), ...]
+    """
+    values = struct.unpack('<' + TOP_N_PAIR_FORMAT * (len(data) // TOP_N_PAIR_SIZE), data)
+    return list(zip(values[0::2], values[1::2]))
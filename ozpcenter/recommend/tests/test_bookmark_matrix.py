@@ -0,0 +1,66 @@
+"""
+Make sure that BookmarkMatrix gives the same results as the graph collaborative filtering
+"""
+from django.test import override_settings
+from django.test import TestCase
+
+from ozpcenter.recommend.bookmark_matrix import BookmarkMatrix
+from ozpcenter.recommend.graph_factory import GraphFactory
+
+
+@override_settings(ES_ENABLED=False)
+class BookmarkMatrixTest(TestCase):
+
+    def setUp(self):
+        """
+        setUp is invoked before each test method
+        """
+        pass
+
+    def test_bookmark_matrix_same_as_graph(self):
+        graph = GraphFactory.load_sample_profile_listing_graph()
+        bookmark_pairs = []
+        for edge in graph.get_edges():
+            if edge.label == 'bookmarked':
+                bookmark_pairs.append((edge.in_vertex.id, edge.out_vertex.id))
+
+        matrix = BookmarkMatrix(bookmark_pairs)
+        self.assertEqual(str(matrix), 'BookmarkMatrix(profiles: 5, listings: 8, bookmarks: 15)')
+
+        results = dict(matrix.recommend_all())
+        self.assertEqual(sorted(results.keys()), ['p-1', 'p-2', 'p-3', 'p-4', 'p-5'])
+
+        for profile_id in results:
+            self.assertEqual(results[profile_id], graph.algo().recommend_listings_for_profile(profile_id))
+
+    def test_bookmark_matrix_shared_bookmark_sets(self):
+        bookmark_pairs = [(1, 10), (1, 11),
+                          (2, 10), (2, 11),
+                          (3, 10), (3, 12),
+                          (4, 13)]
+        matrix = BookmarkMatrix(bookmark_pairs)
+        self.assertEqual(len(matrix.group_profiles_by_bookmarks()), 3)
+
+        results = dict(matrix.recommend_all())
+        self.assertEqual(results[1], [(12, 1)])
+        self.assertEqual(results[2], [(12, 1)])
+        self.assertEqual(results[3], [(11, 2)])
+        self.assertNotIn(4, results)
+
+        # Only the profiles of a shard
+        results = dict(matrix.recommend_all(lambda profile_id: profile_id >= 2))
+        self.assertEqual(sorted(results.keys()), [2, 3])
+        self.assertEqual(results[2], [(12, 1)])
+
+    def test_bookmark_matrix_listing_similarities(self):
+        bookmark_pairs = [(1, 10), (1, 11),
+                          (2, 10), (2, 11),
+                          (3, 10), (3, 12)]
+        matrix = BookmarkMatrix(bookmark_pairs)
+        similarities = matrix.listing_similarities()
+
+        # 10 is bookmarked by 3 profiles, 11 by 2 profiles, 2 profiles bookmarked both
+        self.assertEqual([listing_id for listing_id, similarity in similarities[10]], [11, 12])
+        self.assertAlmostEqual(similarities[10][0][1], 2 / (3 * 2) ** 0.5)
+        self.assertEqual([listing_id for listing_id, similarity in similarities[11]], [10])
+        self.assertNotIn(13, similarities)
@@ -0,0 +1,93 @@
+"""
+Make sure that CompactGraph works the same way as Graph
+"""
+from django.test import override_settings
+from django.test import TestCase
+
+from ozpcenter.recommend.compact_graph import CompactGraph
+from ozpcenter.recommend.graph_factory import GraphFactory
+from ozpcenter.scripts import sample_data_generator as data_gen
+
+
+@override_settings(ES_ENABLED=False)
+class CompactGraphTest(TestCase):
+
+    def setUp(self):
+        """
+        setUp is invoked before each test method
+        """
+        pass
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data for the whole TestCase (only run once for the TestCase)
+        """
+        data_gen.run()
+
+    def test_compact_graph_add_edit_one_vertex(self):
+        graph = CompactGraph()
+        self.assertEqual(str(graph), 'Graph(vertices: 0, edges: 0)')
+
+        added_vertex = graph.add_vertex('test_label', {'test_field': 1})
+
+        self.assertEqual(str(graph), 'Graph(vertices: 1, edges: 0)')
+        self.assertEqual(added_vertex.label, 'test_label')
+        self.assertEqual(added_vertex.get_property('test_field'), 1)
+
+        added_vertex.set_property('test_field', 2)
+        added_vertex = graph.get_vertex(1)
+        self.assertEqual(added_vertex.get_property('test_field'), 2)
+
+    def test_compact_graph_three_vertices_simple(self):
+        graph = CompactGraph()
+        vertex1 = graph.add_vertex('person', {'username': 'first last'}, current_id=10)
+        vertex2 = graph.add_vertex('listing', {'title': 'Skyzone1'}, current_id=20)
+        vertex3 = graph.add_vertex('listing', {'title': 'Skyzone2'}, current_id=30)
+        vertex1.add_edge('personListing', vertex2)
+        vertex1.add_edge('personListing', vertex3)
+        vertex1.add_edge('testListing', vertex3)
+
+        self.assertEqual(str(graph), 'Graph(vertices: 3, edges: 3)')
+        self.assertEqual(len(vertex1.get_in_edges('personListing')), 0)
+        self.assertEqual(len(vertex1.get_out_edges('personListing')), 2)
+        self.assertEqual(len(vertex1.get_out_edges()), 3)
+        self.assertEqual([edge.out_vertex.id for edge in vertex1.get_out_edges('personListing')], [20, 30])
+
+        self.assertEqual(len(vertex3.get_in_edges()), 2)
+        self.assertEqual([edge.in_vertex.id for edge in vertex3.get_in_edges('personListing')], [10])
+
+        # Edges added after the adjacency was compiled
+        vertex4 = graph.add_vertex('listing', {'title': 'Skyzone3'}, current_id=40)
+        vertex1.add_edge('personListing', vertex4)
+        self.assertEqual([edge.out_vertex.id for edge in vertex1.get_out_edges('personListing')], [20, 30, 40])
+
+    def test_compact_graph_query(self):
+        graph = GraphFactory.load_sample_profile_listing_graph(CompactGraph())
+        self.assertEqual(str(graph), 'Graph(vertices: 15, edges: 23)')
+
+        query_results = graph.query().v('p-1').out('bookmarked').id().to_list()
+        self.assertEqual(query_results, ['l-1', 'l-2', 'l-3'])
+
+        query_results = graph.query().v('l-1').in_('bookmarked').id().to_list()
+        self.assertEqual(query_results, ['p-1', 'p-2', 'p-3'])
+
+        query_results = graph.query().v('p-1').to_dict().next()
+        self.assertEqual(query_results, {'username': 'first1 last'})
+
+    def test_compact_graph_recommendation(self):
+        graph = GraphFactory.load_sample_profile_listing_graph(CompactGraph())
+        results = graph.algo().recommend_listings_for_profile('p-1')
+
+        output = [('l-5', 2), ('l-8', 1), ('l-7', 1), ('l-6', 1), ('l-4', 1)]
+
+        self.assertEqual(results, output)
+
+    def test_compact_graph_recommendation_db(self):
+        graph = GraphFactory.load_db_into_compact_graph()
+        self.assertEqual(str(graph), 'Graph(vertices: 158, edges: 402)')
+
+        results = graph.algo().recommend_listings_for_profile('p-1')  # bigbrother
+        output = GraphFactory.load_db_into_graph().algo().recommend_listings_for_profile('p-1')
+
+        self.assertEqual(results, output)
@@ -0,0 +1,52 @@
+"""
+Make sure that the streamed Elasticsearch recommendation profile documents match the access controlled queries
+"""
+from django.test import override_settings
+from django.test import TestCase
+
+from ozpcenter import models
+from ozpcenter.recommend.recommend import ElasticsearchRecommender
+from ozpcenter.scripts import sample_data_generator as data_gen
+
+
+@override_settings(ES_ENABLED=False)
+class ElasticsearchRecommendDocumentsTest(TestCase):
+
+    def setUp(self):
+        """
+        setUp is invoked before each test method
+        """
+        pass
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test database for the whole TestCase (only run once for the TestCase)
+        """
+        data_gen.run()
+
+    def test_generate_profile_documents(self):
+        documents = list(ElasticsearchRecommender.generate_profile_documents())
+        self.assertEqual(len(documents), models.Profile.objects.count())
+
+        for document in documents:
+            profile = models.Profile.objects.get(user_id=document['author_id'])
+            bookmarked_ids = list(models.ApplicationLibraryEntry.objects.for_user(profile.user.username).order_by('id').values_list('listing_id', flat=True))
+            self.assertEqual(document['bookmark_ids'], bookmarked_ids)
+
+            review_listing_ids = [review['listing_id'] for review in document['ratings']]
+            self.assertEqual(review_listing_ids, list(models.Review.objects.filter(author=profile.user_id).order_by('id').values_list('listing_id', flat=True)))
+
+    def test_generate_profile_documents_chunked(self):
+        chunk_size = ElasticsearchRecommender.PROFILE_CHUNK_SIZE
+        ElasticsearchRecommender.PROFILE_CHUNK_SIZE = 3
+        try:
+            chunked_documents = list(ElasticsearchRecommender.generate_profile_documents())
+        finally:
+            ElasticsearchRecommender.PROFILE_CHUNK_SIZE = chunk_size
+
+        documents = list(ElasticsearchRecommender.generate_profile_documents())
+        self.assertEqual([document['author_id'] for document in chunked_documents],
+                         [document['author_id'] for document in documents])
+        self.assertEqual([document['bookmark_ids'] for document in chunked_documents],
+                         [document['bookmark_ids'] for document in documents])
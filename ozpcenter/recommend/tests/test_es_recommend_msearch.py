@@ -0,0 +1,153 @@
+"""
+Make sure that the batched _msearch Elasticsearch recommendations give the same results as the per profile searches
+"""
+import json
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import override_settings
+from django.test import TestCase
+
+from ozpcenter import models
+from ozpcenter.api.listing.elasticsearch_util import elasticsearch_factory
+from ozpcenter.recommend.recommend import ElasticsearchContentBaseRecommender
+from ozpcenter.recommend.recommend import ElasticsearchRecommender
+from ozpcenter.recommend.recommend import ElasticsearchUserBaseRecommender
+from ozpcenter.scripts import sample_data_generator as data_gen
+
+
+class StubElasticsearchClient(object):
+    """
+    Elasticsearch client stub
+
+    Profile documents are looked up by author_id, every other search body gets its own result
+    (the same body always gets the same result)
+    """
+
+    def __init__(self, profile_sources):
+        self.profile_sources = profile_sources
+        self.search_results = {}
+        self.msearch_profile_batches = []
+        self.msearch_search_counts = []
+
+    def search(self, index, body):
+        if index == settings.ES_RECOMMEND_USER and 'author_id' in json.dumps(body):
+            profile_id = body['query']['bool']['must'][0]['term']['author_id']
+            hits = []
+            if profile_id in self.profile_sources:
+                hits.append({'_source': self.profile_sources[profile_id]})
+            return {'hits': {'total': len(hits), 'max_score': 1.0, 'hits': hits}}
+
+        search_key = index + json.dumps(body, sort_keys=True)
+        if search_key not in self.search_results:
+            listing_id = 1000 + len(self.search_results)
+            score = float(len(self.search_results) + 1)
+            self.search_results[search_key] = {
+                'hits': {'total': 1, 'max_score': score, 'hits': [{'_score': score, '_source': {'id': listing_id, 'title': ''}}]},
+                'aggregations': {'the_listing': {'aggs': {'buckets': [{'key': listing_id, 'score': score}]}}}
+            }
+        return self.search_results[search_key]
+
+    def msearch(self, body):
+        headers = body[0::2]
+        query_bodies = body[1::2]
+
+        if query_bodies and 'author_id' in json.dumps(query_bodies[0]):
+            self.msearch_profile_batches.append([query_body['query']['bool']['must'][0]['term']['author_id'] for query_body in query_bodies])
+        else:
+            self.msearch_search_counts.append(len(query_bodies))
+
+        return {'responses': [self.search(header['index'], query_body) for header, query_body in zip(headers, query_bodies)]}
+
+
+@override_settings(ES_ENABLED=False)
+class ElasticsearchRecommendMsearchTest(TestCase):
+
+    def setUp(self):
+        """
+        setUp is invoked before each test method
+        """
+        self.profile_ids = list(models.Profile.objects.order_by('id').values_list('id', flat=True))
+        # Last profile has no Elasticsearch Recommendation Table document (new user)
+        self.profile_sources = {}
+        for profile_id in self.profile_ids[:-1]:
+            self.profile_sources[profile_id] = {
+                'author_id': profile_id,
+                'categories_id': [profile_id],
+                'titles': ['title {}'.format(profile_id)],
+                'descriptions': [],
+                'description_shorts': [],
+                'ratings': [{'listing_id': profile_id, 'rate': 4}],
+                'bookmark_ids': [profile_id * 10]
+            }
+        self.es_client = StubElasticsearchClient(self.profile_sources)
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test database for the whole TestCase (only run once for the TestCase)
+        """
+        data_gen.run()
+
+    def get_recommender(self, recommender_class):
+        with patch.object(ElasticsearchRecommender, 'initiate'):
+            return recommender_class()
+
+    @override_settings(ES_RECOMMEND_MSEARCH_BATCH_SIZE=3, ES_RECOMMEND_MSEARCH_THREADS=2)
+    def test_iterate_recommendations_batches(self):
+        recommender = self.get_recommender(ElasticsearchContentBaseRecommender)
+
+        with patch.object(elasticsearch_factory, 'get_client', return_value=self.es_client):
+            results = list(recommender.iterate_recommendations())
+
+        self.assertEqual([profile_id for profile_id, search_result in results], self.profile_ids)
+
+        expected_batches = [self.profile_ids[index:index + 3] for index in range(0, len(self.profile_ids), 3)]
+        self.assertEqual(sorted(self.es_client.msearch_profile_batches), sorted(expected_batches))
+        # One recommendation search per profile that has a document
+        self.assertEqual(sum(self.es_client.msearch_search_counts), len(self.profile_sources))
+
+    def test_batch_recommendation_content_base(self):
+        recommender = self.get_recommender(ElasticsearchContentBaseRecommender)
+
+        with patch.object(elasticsearch_factory, 'get_client', return_value=self.es_client):
+            batch_results = recommender.batch_recommendation(self.profile_ids)
+            self.assertEqual([profile_id for profile_id, search_result in batch_results], self.profile_ids)
+
+            for profile_id, search_result in batch_results:
+                if profile_id in self.profile_sources:
+                    self.assertEqual(search_result, recommender.es_content_based_recommendation(profile_id, recommender.result_size))
+                else:
+                    self.assertIsNone(search_result)
+
+        # Every profile got its own search result
+        self.assertEqual(len(self.es_client.search_results), len(self.profile_sources))
+
+    def test_batch_recommendation_user_base(self):
+        recommender = self.get_recommender(ElasticsearchUserBaseRecommender)
+
+        with patch.object(elasticsearch_factory, 'get_client', return_value=self.es_client):
+            batch_results = recommender.batch_recommendation(list(reversed(self.profile_ids)))
+            self.assertEqual([profile_id for profile_id, search_result in batch_results], list(reversed(self.profile_ids)))
+
+            for profile_id, search_result in batch_results:
+                if profile_id in self.profile_sources:
+                    self.assertEqual(recommender.get_recommended_items(search_result), recommender.es_user_based_recommendation(profile_id))
+                else:
+                    self.assertEqual(recommender.get_recommended_items(search_result), [])
+
+    def test_msearch_error_response(self):
+        es_client = self.es_client
+
+        def msearch(body):
+            responses = StubElasticsearchClient.msearch(es_client, body)['responses']
+            responses[0] = {'error': {'type': 'search_phase_execution_exception'}}
+            return {'responses': responses}
+
+        with patch.object(self.es_client, 'msearch', side_effect=msearch):
+            with patch.object(elasticsearch_factory, 'get_client', return_value=self.es_client):
+                results = ElasticsearchRecommender.msearch([('index-a', {'query': {'match_all': {}}}),
+                                                            ('index-b', {'query': {'match_all': {}}})])
+
+        self.assertIsNone(results[0])
+        self.assertEqual(results[1]['hits']['total'], 1)
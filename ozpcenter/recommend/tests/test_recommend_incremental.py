@@ -0,0 +1,112 @@
+"""
+Make sure that the incremental recommendation run only recomputes changed profiles
+"""
+from unittest.mock import patch
+
+import msgpack
+from django.test import override_settings
+from django.test import TestCase
+
+from ozpcenter import models
+from ozpcenter.recommend import listing_similarity
+from ozpcenter.recommend.recommend import BaselineRecommender
+from ozpcenter.recommend.recommend import RecommenderDirectory
+from ozpcenter.scripts import sample_data_generator as data_gen
+
+
+@override_settings(ES_ENABLED=False)
+class RecommendIncrementalTest(TestCase):
+
+    def setUp(self):
+        """
+        setUp is invoked before each test method
+        """
+        models.RecommendationsDirtyEntry.objects.all().delete()
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test database for the whole TestCase (only run once for the TestCase)
+        """
+        data_gen.run()
+
+    def test_bookmark_marks_profile_and_listing_dirty(self):
+        profile = models.Profile.objects.get(user__username='bigbrother')
+        listing = models.Listing.objects.get(title='Air Mail')
+
+        entry = models.ApplicationLibraryEntry(listing=listing, owner=profile, folder=None)
+        entry.save()
+
+        dirty_entries = list(models.RecommendationsDirtyEntry.objects.values_list('profile_id', 'listing_id'))
+        self.assertEqual(dirty_entries, [(profile.id, listing.id)])
+
+        entry.delete()
+        self.assertEqual(models.RecommendationsDirtyEntry.objects.count(), 2)
+
+    def test_incremental_profile_ids(self):
+        profile = models.Profile.objects.get(user__username='bigbrother')
+        listing = models.Listing.objects.get(title='Air Mail')
+        models.ApplicationLibraryEntry(listing=listing, owner=profile, folder=None).save()
+
+        latest_dirty_entry_id = models.RecommendationsDirtyEntry.objects.order_by('-id').first().id
+        profile_ids = RecommenderDirectory.get_incremental_profile_ids(latest_dirty_entry_id)
+
+        bookmarked_profile_ids = set(models.ApplicationLibraryEntry.objects.filter(
+            listing=listing).values_list('owner_id', flat=True))
+
+        self.assertIn(profile.id, profile_ids)
+        self.assertTrue(bookmarked_profile_ids.issubset(profile_ids))
+
+    def test_incremental_recommend_consumes_dirty_entries(self):
+        profile = models.Profile.objects.get(user__username='bigbrother')
+        listing = models.Listing.objects.get(title='Air Mail')
+        models.ApplicationLibraryEntry(listing=listing, owner=profile, folder=None).save()
+
+        RecommenderDirectory().recommend('graph_cf', incremental=True)
+
+        self.assertEqual(models.RecommendationsDirtyEntry.objects.count(), 0)
+        self.assertEqual(models.RecommendationsEntry.objects.filter(target_profile=profile).count(), 1)
+
+    def test_incremental_listing_similarities(self):
+        listing_similarity.save_listing_similarities()
+        profile = models.Profile.objects.get(user__username='bigbrother')
+        listing = models.Listing.objects.get(title='Air Mail')
+        models.ApplicationLibraryEntry(listing=listing, owner=profile, folder=None).save()
+
+        latest_dirty_entry_id = models.RecommendationsDirtyEntry.objects.order_by('-id').first().id
+        dirty_listing_ids = listing_similarity.get_dirty_listing_ids(latest_dirty_entry_id)
+        self.assertIn(listing.id, dirty_listing_ids)
+
+        unchanged_entry_ids = set(models.ListingSimilarityEntry.objects.exclude(
+            listing_id__in=dirty_listing_ids).values_list('id', flat=True))
+        listing_similarity.save_listing_similarities(dirty_listing_ids)
+        incremental_similarities = self.get_listing_similarities()
+
+        # Rows of the other listings are kept
+        self.assertTrue(unchanged_entry_ids.issubset(set(models.ListingSimilarityEntry.objects.values_list('id', flat=True))))
+
+        # Same table as a full rebuild
+        listing_similarity.save_listing_similarities()
+        self.assertEqual(incremental_similarities, self.get_listing_similarities())
+
+    @staticmethod
+    def get_listing_similarities():
+        return {listing_id: msgpack.unpackb(bytes(similarity_data))
+                for listing_id, similarity_data in models.ListingSimilarityEntry.objects.values_list('listing_id', 'similarity_data')}
+
+    def test_recommender_shards_share_prepared_state(self):
+        recommender_directory = RecommenderDirectory()
+        recommender_obj = recommender_directory.get_recommender_class_obj('baseline')
+        recommender_obj.ensure_prepared()
+
+        profile_ids = sorted(models.Profile.objects.values_list('id', flat=True))
+        profile_id_ranges = [(profile_ids[0], profile_ids[1]), (profile_ids[2], profile_ids[-1])]
+
+        with patch.object(BaselineRecommender, 'get_global_rankings') as mock_get_global_rankings:
+            shard_results = {}
+            for profile_id_range in profile_id_ranges:
+                shard_results.update(recommender_obj.get_shard(profile_id_range).recommend())
+
+        self.assertFalse(mock_get_global_rankings.called)
+        self.assertEqual(recommender_obj.recommender_result_set, {})
+        self.assertEqual(shard_results, recommender_obj.recommend())
@@ -51,6 +51,22 @@ class UtilsTest(TestCase):
         results = recommend_utils.get_top_n_score(input_data, 2)
         self.assertEqual(results, expected_results)
 
+    def test_combine_recommendations(self):
+        input_data = {
+            'Baseline': {'weight': 1.0, 'recommendations': [[11, 8.5], [112, 8.0], [85, 7.0]]},
+            'Sample Data Gen': {'weight': 0.5, 'recommendations': [[85, 4.0], [1, 1.0]]}
+        }
+        results = recommend_utils.combine_recommendations(input_data, 3)
+        self.assertEqual(results, [[85, 9.0], [11, 8.5], [112, 8.0]])
+
+    def test_pack_top_n_scores(self):
+        listing_scores = [[85, 9.0], [11, 8.5], [112, 8.0], [1, 0.5]]
+        packed = recommend_utils.pack_top_n_scores(listing_scores)
+
+        self.assertEqual(len(packed), len(listing_scores) * recommend_utils.TOP_N_PAIR_SIZE)
+        self.assertEqual(recommend_utils.unpack_top_n_scores(packed), [(85, 9.0), (11, 8.5), (112, 8.0), (1, 0.5)])
+        self.assertEqual(recommend_utils.unpack_top_n_scores(recommend_utils.pack_top_n_scores([])), [])
+
     def test_map_numbers(self):
         input_num = 500
         in_min = 1
@@ -0,0 +1,28 @@
+"""
+Elasticsearch Listing Index Worker
+
+Listing saves/deletes add entries to the listing index outbox (ListingIndexOutboxEntry), this worker drains
+the outbox into Elasticsearch with bulk requests every ES_INDEX_OUTBOX_SECONDS seconds
+
+Example: ES_ENABLED=TRUE python manage.py runscript es_index_worker
+         ES_INDEX_WORKER_ONCE=TRUE python manage.py runscript es_index_worker  # Drain once and exit
+"""
+import logging
+import sys
+import os
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from ozpcenter.api.listing import model_access_es
+
+# Get an instance of a logger
+logger = logging.getLogger('ozp-center.' + str(__name__))
+
+
+def run():
+    """
+    Run the listing index worker
+    """
+    run_once = os.getenv('ES_INDEX_WORKER_ONCE', 'FALSE').upper() == 'TRUE'
+    logger.info('Starting listing index worker')
+    model_access_es.run_listing_index_worker(run_once=run_once)
@@ -8,6 +8,14 @@ recommendation_engines = ['ElasticsearchUserBaseRecommender', 'ElasticsearchCont
 
 os.getenv('RECOMMENDATION_ENGINE')
 
+os.getenv('RECOMMENDATION_SHARDS')
+    Number of profile shards to execute in parallel worker processes (default: 1, no worker processes)
+    Example: RECOMMENDATION_SHARDS=16 python manage.py runscript recommend
+
+os.getenv('RECOMMENDATION_INCREMENTAL')
+    True to only recompute the profiles affected by bookmark and review changes since the last run
+    Example: RECOMMENDATION_INCREMENTAL=True python manage.py runscript recommend
+
 
 ************************************WARNING************************************
 Running this script will delete existing Recommendations in database
@@ -30,6 +38,9 @@ if (settings.ES_ENABLED):
 else:
     RECOMMENDATION_ENGINE = os.getenv('RECOMMENDATION_ENGINE', 'baseline,graph_cf')
 
+RECOMMENDATION_SHARDS = int(os.getenv('RECOMMENDATION_SHARDS', 1))
+RECOMMENDATION_INCREMENTAL = bool(os.getenv('RECOMMENDATION_INCREMENTAL', False))
+
 # Get an instance of a logger
 logger = logging.getLogger('ozp-center.' + str(__name__))
 
@@ -39,6 +50,10 @@ def run():
     Run the Recommendation Engine
     """
     logger.info('RECOMMENDATION_ENGINE: {}'.format(RECOMMENDATION_ENGINE))
+    logger.info('RECOMMENDATION_SHARDS: {}'.format(RECOMMENDATION_SHARDS))
+    logger.info('RECOMMENDATION_INCREMENTAL: {}'.format(RECOMMENDATION_INCREMENTAL))
 
     recommender_wrapper_obj = RecommenderDirectory()
-    recommender_wrapper_obj.recommend(RECOMMENDATION_ENGINE)
+    recommender_wrapper_obj.recommend(RECOMMENDATION_ENGINE,
+                                      shard_count=RECOMMENDATION_SHARDS,
+                                      incremental=RECOMMENDATION_INCREMENTAL)
@@ -0,0 +1,27 @@
+"""
+Listing Rating Reconciliation
+
+The rating counters of listings (total_rate1..5, total_votes, total_reviews, total_review_responses, avg_rate)
+are updated incrementally when reviews change, this script recomputes them from the reviews and fixes
+the listings that drifted
+
+Example: python manage.py runscript reconcile_ratings
+"""
+import logging
+import sys
+import os
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from ozpcenter.api.listing import model_access as listing_model_access
+
+# Get an instance of a logger
+logger = logging.getLogger('ozp-center.' + str(__name__))
+
+
+def run():
+    """
+    Reconcile the listing rating counters
+    """
+    fixed_count = listing_model_access.reconcile_listing_ratings()
+    logger.info('Fixed the rating counters of {} listings'.format(fixed_count))
@@ -1,9 +1,10 @@
 """
 Reindex data script
 
-************************************WARNING************************************
-Running this script will delete existing data in elasticsearch
-************************************WARNING************************************
+Builds a new listing index and swaps the listing index alias to it when done (searches keep working while
+the new index is built), the previous index is then deleted
+
+Example: ES_ENABLED=TRUE python manage.py runscript reindex_es
 """
 import sys
 import os
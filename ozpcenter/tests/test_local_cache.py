@@ -0,0 +1,83 @@
+"""
+Local Cache tests
+"""
+import time
+
+from django.core.cache import cache
+from django.test import override_settings
+from django.test import TestCase
+
+from ozpcenter.local_cache import LocalCache
+
+
+@override_settings(ES_ENABLED=False)
+class LocalCacheTest(TestCase):
+
+    def setUp(self):
+        """
+        setUp is invoked before each test method
+        """
+        cache.delete('local_cache_version-test')
+        cache.delete('local_cache_version-test-a')
+        cache.delete('local_cache_version-test-b')
+
+    def test_local_cache_lru(self):
+        local_cache = LocalCache('local_cache_version-test', max_size=2)
+        local_cache.set('a', 1)
+        local_cache.set('b', 2)
+        self.assertEqual(local_cache.get('a'), 1)
+
+        # 'b' is the least recently used entry
+        local_cache.set('c', 3)
+        self.assertEqual(len(local_cache), 2)
+        self.assertEqual(local_cache.get('a'), 1)
+        self.assertIsNone(local_cache.get('b'))
+        self.assertEqual(local_cache.get('c'), 3)
+
+    def test_local_cache_timeout(self):
+        local_cache = LocalCache('local_cache_version-test', timeout=0.01)
+        local_cache.set('a', 1)
+        time.sleep(0.02)
+        self.assertIsNone(local_cache.get('a'))
+
+    def test_local_cache_invalidate_other_process(self):
+        local_cache = LocalCache('local_cache_version-test', version_check_seconds=0.01)
+        other_local_cache = LocalCache('local_cache_version-test', version_check_seconds=0.01)
+        local_cache.set('a', 1)
+        self.assertEqual(local_cache.get('a'), 1)
+
+        other_local_cache.invalidate()
+        time.sleep(0.02)
+        self.assertIsNone(local_cache.get('a'))
+
+    def test_local_cache_invalidate_key_other_process(self):
+        local_cache = LocalCache('local_cache_version-test', version_check_seconds=0.01)
+        other_local_cache = LocalCache('local_cache_version-test', version_check_seconds=0.01)
+        local_cache.set('a', 1)
+        local_cache.set('b', 2)
+        other_local_cache.set('a', 1)
+
+        other_local_cache.invalidate_key('a')
+        self.assertIsNone(other_local_cache.get('a'))
+        # Other processes see the invalidation after the version check delay
+        time.sleep(0.02)
+        self.assertIsNone(local_cache.get('a'))
+        # Other keys are kept
+        self.assertEqual(local_cache.get('b'), 2)
+
+        # Entries set after the invalidation are current
+        local_cache.set('a', 3)
+        time.sleep(0.02)
+        self.assertEqual(local_cache.get('a'), 3)
+
+        other_local_cache.invalidate_key('a')
+        time.sleep(0.02)
+        self.assertIsNone(local_cache.get('a'))
+
+    def test_local_cache_copy_values(self):
+        local_cache = LocalCache('local_cache_version-test', copy_values=True)
+        value = {'a': 1}
+        local_cache.set('key', value)
+        value['a'] = 2
+        local_cache.get('key')['a'] = 3
+        self.assertEqual(local_cache.get('key'), {'a': 1})
@@ -0,0 +1,74 @@
+"""
+User Context tests
+"""
+from django.test import override_settings
+from django.test import TestCase
+
+from ozpcenter import models
+from ozpcenter.middleware import RequestCacheMiddleware
+from ozpcenter.scripts import sample_data_generator as data_gen
+
+
+@override_settings(ES_ENABLED=False)
+class UserContextTest(TestCase):
+
+    def setUp(self):
+        """
+        setUp is invoked before each test method
+        """
+        pass
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Set up test data for the whole TestCase (only run once for the TestCase)
+        """
+        data_gen.run()
+
+    def test_user_context_exclude_orgs(self):
+        user_context = models.get_user_context('bigbrother')
+        self.assertEqual(user_context.highest_role, 'APPS_MALL_STEWARD')
+        self.assertIsNone(user_context.visible_org_ids)
+        self.assertEqual(user_context.exclude_organizations, [])
+
+        user_context = models.get_user_context('julia')
+        self.assertEqual(user_context.highest_role, 'ORG_STEWARD')
+        expected_exclude_titles = models.Agency.objects.exclude(
+            title__in=[agency.title for agency in user_context.profile.stewarded_organizations.all()]).values_list('title', flat=True)
+        self.assertEqual(sorted(agency.title for agency in user_context.exclude_organizations), sorted(expected_exclude_titles))
+
+        user_context = models.get_user_context('jones')
+        self.assertEqual(user_context.highest_role, 'USER')
+        expected_visible_ids = user_context.profile.organizations.values_list('id', flat=True)
+        self.assertEqual(sorted(user_context.visible_org_ids), sorted(expected_visible_ids))
+
+    def test_filter_private_listings(self):
+        for username in ['bigbrother', 'julia', 'jones']:
+            user_context = models.get_user_context(username)
+            exclude_orgs = user_context.exclude_organizations
+
+            expected_listing_ids = models.Listing.objects.exclude(is_private=True, agency__in=exclude_orgs).values_list('id', flat=True)
+            listing_ids = models.filter_private_listings(username, models.Listing.objects.all()).values_list('id', flat=True)
+            self.assertEqual(sorted(listing_ids), sorted(expected_listing_ids))
+
+    def test_user_context_request_scope(self):
+        self.assertIsNot(models.get_user_context('jones'), models.get_user_context('jones'))
+
+        middleware = RequestCacheMiddleware()
+        middleware.process_request(None)
+        try:
+            user_context = models.get_user_context('jones')
+            self.assertIs(models.get_user_context('jones'), user_context)
+            self.assertIs(models.get_user_context(user_context.profile), user_context)
+
+            highest_role = user_context.highest_role
+            with self.assertNumQueries(0):
+                self.assertEqual(models.get_user_context('jones').highest_role, highest_role)
+
+            # Saving the profile drops the memoized context
+            user_context.profile.save()
+            self.assertIsNot(models.get_user_context('jones'), user_context)
+        finally:
+            middleware.process_response(None, None)
+
+        self.assertIsNot(models.get_user_context('jones'), user_context)
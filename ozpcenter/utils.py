@@ -4,7 +4,9 @@ Utility functions
 import datetime
 import pytz
 import re
+import time
 
+from django.core.cache import cache
 from django.template import Context
 from django.template import Template
 
@@ -19,6 +21,31 @@ def make_keysafe(key):
     return re.sub(r'[^a-zA-Z0-9_."`-]+', '', key).lower()
 
 
+def get_cache_version(version_key):
+    """
+    Get a version counter stored in the cache, used to build cache keys that are invalidated by bumping the counter
+
+    A missing counter starts at the current time in milliseconds, so a counter lost from the cache never
+    goes back to a version that was already used
+    """
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, int(time.time() * 1000), timeout=None)
+        version = cache.get(version_key)
+    return version
+
+
+def bump_cache_version(version_key):
+    """
+    Increment a version counter stored in the cache (see get_cache_version)
+    """
+    try:
+        return cache.incr(version_key)
+    except ValueError:
+        # Counter is not in the cache
+        return get_cache_version(version_key)
+
+
 def find_between(s, start, end):
     """
     Return a string between two other strings
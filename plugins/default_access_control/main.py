@@ -22,8 +22,10 @@ This simple logic is this: for a user to have access:
     1. They must have a classification equal to or higher than that required
     2. They must have at least all controls that are required (in any order)
 """
+from functools import lru_cache
 import json
 import logging
+import sys
 import time
 
 from . import tokens as all_tokens
@@ -63,6 +65,43 @@ tokens_list = [
 ]
 
 
+# Number of distinct markings / user accesses kept compiled
+COMPILED_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def compile_marking(marking, delimiter='//'):
+    """
+    Compile a marking string into (required_clearance, frozenset(required_controls)), strings are interned
+
+    'SECRET//ABC//XYZ' => ('SECRET', frozenset({'ABC', 'XYZ'}))
+    """
+    markings = [sys.intern(current_marking) for current_marking in marking.split(delimiter)]
+    return markings[0], frozenset(markings[1:])
+
+
+@lru_cache(maxsize=COMPILED_CACHE_SIZE)
+def compile_user_accesses(user_accesses_json):
+    """
+    Compile the user accesses json (Profile.access_control) into (frozenset(clearances), frozenset(controls))
+    controls are the formal accesses and visas combined
+
+    The json string is the cache key, so an updated access_control is compiled again
+
+    Return:
+        None if the json can not be parsed
+    """
+    try:
+        user_accesses = json.loads(user_accesses_json)
+    except ValueError:
+        logger.error('Error parsing JSON data: {0!s}'.format(user_accesses_json))
+        return None
+
+    clearances = frozenset(sys.intern(clearance) for clearance in user_accesses['clearances'])
+    controls = frozenset(sys.intern(control) for control in user_accesses['formal_accesses'] + user_accesses['visas'])
+    return clearances, controls
+
+
 class PluginMain(object):
     plugin_name = 'default_access_control'
     plugin_description = 'DefaultAccessControlPlugin'
@@ -77,6 +116,17 @@ class PluginMain(object):
 
         self.tokens = [self._convert_dict_to_token(input) for input in tokens_list]
 
+        self.long_name_lookup = {}
+        for token in self.tokens:
+            self.long_name_lookup[token.long_name.upper()] = token
+
+        self.short_name_lookup = {}
+        for token in self.tokens:
+            self.short_name_lookup[token.short_name.upper()] = token
+
+        # Compiled token tuples of markings
+        self._compile_tokens = lru_cache(maxsize=COMPILED_CACHE_SIZE)(self._compile_tokens_uncached)
+
     def _convert_dict_to_token(self, input):
         """
         Converts Dictionary into Token
@@ -102,13 +152,14 @@ class PluginMain(object):
         """
         This method is responsible for converting a String into Tokens
         """
-        long_name_lookup = {}
-        for token in self.tokens:
-            long_name_lookup[token.long_name.upper()] = token
+        return list(self._compile_tokens(input_marking, delimiter))
 
-        short_name_lookup = {}
-        for token in self.tokens:
-            short_name_lookup[token.short_name.upper()] = token
+    def _compile_tokens_uncached(self, input_marking, delimiter):
+        """
+        Convert a String into a tuple of Tokens (cached by _compile_tokens)
+        """
+        long_name_lookup = self.long_name_lookup
+        short_name_lookup = self.short_name_lookup
 
         markings = input_marking.split(delimiter)
 
@@ -125,7 +176,7 @@ class PluginMain(object):
                     current_token = all_tokens.UnknownToken(long_name=marking)
 
             output_tokens.append(current_token)
-        return output_tokens
+        return tuple(output_tokens)
 
     def anonymize_identifiable_data(self, username):
         """
@@ -201,6 +252,17 @@ class PluginMain(object):
             return False
         return True
 
+    def has_access_many(self, username, markings):
+        """
+        Check the access of a user to many markings in one call
+
+        Return:
+            {marking: True/False}
+        """
+        # Timer used to simulate REST Service Call
+        time.sleep(0.1)
+        return {marking: username != 'pmurt' for marking in markings}
+
     # TODO: Get future_has_access method to work for unit tests (rivera 20160808)
     def future_has_access(self, username, marking):
         profile = model_access.get_profile(username)
@@ -225,37 +287,24 @@ class PluginMain(object):
         i.e.: a single classification followed by additional marking categories
         separated by //
 
+        The marking and the user accesses are compiled once (compile_marking, compile_user_accesses),
+        the check is a set containment
+
         Args:
             user_accesses_json (string): user accesses in json (clearances, formal_accesses, visas)
             marking: a valid (string): a valid security marking
         """
         if not marking:
             return False
-        markings = marking.split('//')
-        # get the user's access_control data
-        try:
-            user_accesses = json.loads(user_accesses_json)
-        except ValueError:
-            logger.error('Error parsing JSON data: {0!s}'.format(user_accesses_json))
-            return False
 
-        # check clearances
-        clearances = user_accesses['clearances']
-        required_clearance = markings[0]
-
-        if required_clearance not in clearances:
+        # get the user's access_control data
+        user_accesses = compile_user_accesses(user_accesses_json)
+        if user_accesses is None:
             return False
+        clearances, user_controls = user_accesses
 
-        # just combine all of the user's formal accesses and visas
-        user_controls = user_accesses['formal_accesses']
-        user_controls += user_accesses['visas']
-
-        required_controls = markings[1:]
-        missing_controls = [i for i in required_controls if i not in user_controls]
-        if not missing_controls:
-            return True
-        else:
-            return False
+        required_clearance, required_controls = compile_marking(marking)
+        return required_clearance in clearances and required_controls <= user_controls
 
     def validate_marking(self, marking):
         """
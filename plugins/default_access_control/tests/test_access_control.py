@@ -7,6 +7,8 @@ from django.test import override_settings
 from django.test import TestCase
 
 from ozpcenter.scripts import sample_data_generator as data_gen
+from plugins.default_access_control.main import compile_marking
+from plugins.default_access_control.main import compile_user_accesses
 from plugins.default_access_control.main import PluginMain
 
 
@@ -52,6 +54,23 @@ class AccessControlTest(TestCase):
 
         self.assertEquals(actual_value, expected_value)
 
+    def test_compile_marking(self):
+        self.assertEqual(compile_marking('SECRET//ABC//XYZ'), ('SECRET', frozenset(['ABC', 'XYZ'])))
+        self.assertEqual(compile_marking('UNCLASSIFIED'), ('UNCLASSIFIED', frozenset()))
+        # Compiled markings are cached
+        self.assertIs(compile_marking('SECRET//ABC//XYZ'), compile_marking('SECRET//ABC//XYZ'))
+
+        user_accesses_json = json.dumps(
+            {
+                "clearances": ["UNCLASSIFIED", "SECRET"],
+                "formal_accesses": ["ABC"],
+                "visas": ["XYZ"]
+            }
+        )
+        self.assertEqual(compile_user_accesses(user_accesses_json),
+                         (frozenset(['UNCLASSIFIED', 'SECRET']), frozenset(['ABC', 'XYZ'])))
+        self.assertIsNone(compile_user_accesses('invalid json'))
+
     def test_validate_marking(self):
         marking = 'UNCLASSIFIED'
         validated = self.access_control_instance.validate_marking(marking)
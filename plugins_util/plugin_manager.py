@@ -4,7 +4,6 @@ Plugin Manager
 from types import ModuleType
 import importlib
 import logging
-import hashlib
 import os
 import requests
 import traceback
@@ -12,6 +11,8 @@ import traceback
 from django.conf import settings
 from django.core.cache import cache
 
+from ozpcenter.local_cache import LocalCache
+
 logger = logging.getLogger('ozp-center.' + str(__name__))
 
 BASE_PLUGIN_DIRECTORY = '{0}/{1}'.format(os.path.realpath(os.path.join(os.path.dirname(__file__), '../')), 'plugins')
@@ -201,6 +202,10 @@ else:
     AUTHORIZATION_PLUGIN = 'default_authorization'
 
 
+# Access control results in front of the cache, the keys of a user are reset when their profile is saved (authorization update)
+access_control_local_cache = LocalCache('local_cache_version-access_control')
+
+
 def get_system_access_control_plugin():
     return plugin_manager_instance.get_plugin_instance(ACCESS_CONTROL_PLUGIN)
 
@@ -225,17 +230,71 @@ def system_has_access_control(username, security_marking):
         username (str): username
         user_accesses_json (str): user accesses in json (clearances, formal_accesses, visas)
         marking: a valid (str): a valid security marking
+
+    The access is read from the user's security markings access entry (see system_allowed_security_markings)
     """
-    data_hash = hashlib.sha224('{0!s}'.format(security_marking).encode('utf-8')).hexdigest()
-    key = 'system_has_access_control-{0!s}-{1!s}'.format(username, data_hash)
-    data = cache.get(key)
+    return security_marking in system_allowed_security_markings(username, [security_marking])
 
-    if data is not None:
-        return data
-    else:
-        results = get_system_access_control_plugin().has_access(username, security_marking)
-        cache.set(key, results, timeout=settings.GLOBAL_SECONDS_TO_CACHE_DATA)
-        return results
+
+def plugin_has_access_many(access_control_plugin, username, security_markings):
+    """
+    Check the access of a user to many security markings with one plugin call
+
+    Access control plugins can implement has_access_many(username, security_markings) to check all the
+    markings in a single request, otherwise has_access is called for each marking
+
+    Returns:
+        {security_marking: has_access}
+    """
+    if hasattr(access_control_plugin, 'has_access_many'):
+        return access_control_plugin.has_access_many(username, security_markings)
+    return {security_marking: access_control_plugin.has_access(username, security_marking) for security_marking in security_markings}
+
+
+def get_allowed_security_markings_key(username):
+    return 'system_allowed_security_markings-{0!s}'.format(username)
+
+
+def system_allowed_security_markings(username, security_markings):
+    """
+    Get the security markings in security_markings that the user has access to
+
+    The access of a user is kept as a single cache entry ({security_marking: has_access}) for all markings checked
+    so far, there are only a few distinct security markings so this replaces a cache lookup per object.
+    The entry is reset when the profile is saved (authorization update), it is also kept in
+    access_control_local_cache to avoid a cache round trip for every check
+
+    Args:
+        username (str): username
+        security_markings: iterable of security markings
+
+    Returns:
+        set of security markings the user has access to
+    """
+    security_markings = set(security_markings)
+    key = get_allowed_security_markings_key(username)
+
+    access_by_marking = access_control_local_cache.get(key)
+    if access_by_marking is None or not security_markings.issubset(access_by_marking):
+        access_by_marking = dict(cache.get(key) or {})
+
+        missing_security_markings = [security_marking for security_marking in security_markings if security_marking not in access_by_marking]
+        if missing_security_markings:
+            access_by_marking.update(plugin_has_access_many(get_system_access_control_plugin(), username, missing_security_markings))
+            cache.set(key, access_by_marking, timeout=settings.GLOBAL_SECONDS_TO_CACHE_DATA)
+
+        access_control_local_cache.set(key, access_by_marking)
+
+    return set(security_marking for security_marking in security_markings if access_by_marking[security_marking])
+
+
+def system_reset_allowed_security_markings(username):
+    """
+    Reset the cached security marking access of a user (see system_allowed_security_markings)
+    """
+    key = get_allowed_security_markings_key(username)
+    cache.delete(key)
+    access_control_local_cache.invalidate_key(key)
 
 
 def system_anonymize_identifiable_data(username):
@@ -243,14 +302,17 @@ def system_anonymize_identifiable_data(username):
     convenience method to check if username needs to anonymize identifiable data
     """
     key = 'system_anonymize_identifiable_data-{0!s}'.format(username)
-    data = cache.get(key)
-
+    data = access_control_local_cache.get(key)
     if data is not None:
         return data
-    else:
-        results = get_system_access_control_plugin().anonymize_identifiable_data(username)
-        cache.set(key, results, timeout=settings.GLOBAL_SECONDS_TO_CACHE_DATA)
-        return results
+
+    data = cache.get(key)
+    if data is None:
+        data = get_system_access_control_plugin().anonymize_identifiable_data(username)
+        cache.set(key, data, timeout=settings.GLOBAL_SECONDS_TO_CACHE_DATA)
+
+    access_control_local_cache.set(key, data)
+    return data
 
 
 def get_system_authorization_plugin():
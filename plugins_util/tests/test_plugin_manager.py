@@ -10,6 +10,8 @@ from django.test import TestCase
 # from plugins_util.plugin_manager import dynamic_importer
 # from plugins_util.plugin_manager import dynamic_mock_service_importer
 # from plugins_util.plugin_manager import plugin_manager_instance
+from plugins_util.plugin_manager import system_allowed_security_markings
+from plugins_util.plugin_manager import system_reset_allowed_security_markings
 
 
 TEST_PLUGIN_DIRECTORY = '{0}/{1}'.format(os.path.realpath(os.path.join(os.path.dirname(__file__), './')), 'plugins')
@@ -40,6 +42,17 @@ class PluginManagerTest(TestCase):
         """
         # data_gen.run()
 
+    def test_system_allowed_security_markings(self):
+        security_markings = ['UNCLASSIFIED', 'SECRET//FOUO', None]
+
+        system_reset_allowed_security_markings('wsmith')
+        self.assertEqual(system_allowed_security_markings('wsmith', security_markings), set(security_markings))
+        # Cached markings are reused, new markings are added to the same entry
+        self.assertEqual(system_allowed_security_markings('wsmith', ['UNCLASSIFIED', 'TOP SECRET']), {'UNCLASSIFIED', 'TOP SECRET'})
+
+        system_reset_allowed_security_markings('pmurt')
+        self.assertEqual(system_allowed_security_markings('pmurt', security_markings), set())
+
     # TODO FINISH UNIT TEST
     # def test_invalid_auth_cache(self):
     #     """